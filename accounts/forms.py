@@ -2,9 +2,14 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth import get_user_model
 from .models import SellerKYC, OTPVerification
+from . import uploads
 
 User = get_user_model()
 
+def upload_field(field_name):
+    """Name of the hidden field carrying the upload session id of a document"""
+    return f'{field_name}_upload'
+
 class CustomUserRegistrationForm(UserCreationForm):
     email = forms.EmailField(required=True)
     phone = forms.CharField(max_length=15, required=False)
@@ -88,8 +93,10 @@ class SellerKYCForm(forms.ModelForm):
             }),
         }
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, seller=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.seller = seller
+        self.uploads = []
         # Add required asterisk to labels
         required_fields = ['pan_card', 'aadhaar_card', 'ownership_proof', 'revenue_records', 'tax_receipt', 'encumbrance_certificate']
         for field_name in required_fields:
@@ -97,11 +104,29 @@ class SellerKYCForm(forms.ModelForm):
                 self.fields[field_name].required = True
                 if self.fields[field_name].label:
                     self.fields[field_name].label += ' *'
+        
+        # Documents sent ahead through the chunked upload API are referred to by session id
+        for field_name in self.Meta.fields:
+            self.fields[upload_field(field_name)] = forms.CharField(required=False, widget=forms.HiddenInput)
+            if self.data.get(upload_field(field_name)):
+                self.fields[field_name].required = False
     
     def clean(self):
         cleaned_data = super().clean()
         required_fields = ['pan_card', 'aadhaar_card', 'ownership_proof', 'revenue_records', 'tax_receipt', 'encumbrance_certificate']
         
+        ids = {field_name: cleaned_data.get(upload_field(field_name)) for field_name in self.Meta.fields}
+        ids = {field_name: value for field_name, value in ids.items() if value}
+        if ids:
+            completed = uploads.completed(self.seller, ids.values()) if self.seller else {}
+            for field_name, value in ids.items():
+                upload = completed.get(value)
+                if upload is None or upload.field != field_name:
+                    self.add_error(field_name, 'The uploaded file has expired; please upload it again.')
+                    continue
+                cleaned_data[field_name] = upload.stored_name
+                self.uploads.append(upload)
+        
         # Check required fields
         for field_name in required_fields:
             if not cleaned_data.get(field_name) and not getattr(self.instance, field_name, None):
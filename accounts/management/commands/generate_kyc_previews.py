@@ -0,0 +1,68 @@
+"""
+Render the previews of existing SellerKYC documents.
+
+Every distinct stored name across the KYC document fields is rendered
+once, in a thread pool (Pillow and PDFium do the work outside the GIL);
+the DocumentPreview rows are written from the main thread with one
+bulk_create per batch. Rows, and preview files, of documents no KYC
+points at any more are removed.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from accounts import previews
+from accounts.models import DocumentPreview, SellerKYC
+from accounts.signals import DOCUMENT_FIELDS
+
+
+def process(name):
+    return name, previews.render(name, default_storage)
+
+
+class Command(BaseCommand):
+    help = 'Create preview images, page counts and sizes for KYC documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of documents rendered at once')
+        parser.add_argument('--batch-size', type=int, default=200, help='Documents rendered and recorded per batch')
+        parser.add_argument('--force', action='store_true', help='Render documents that already have a preview')
+
+    def handle(self, *args, **options):
+        names = set()
+        for row in SellerKYC.objects.values_list(*DOCUMENT_FIELDS).iterator(chunk_size=5000):
+            names.update(name for name in row if name)
+
+        stale = [name for name in DocumentPreview.objects.values_list('name', flat=True) if name not in names]
+        for name in stale:
+            previews.delete(name, default_storage)
+
+        if options['force']:
+            pending = sorted(names)
+        else:
+            done_names = set(DocumentPreview.objects.values_list('name', flat=True))
+            pending = sorted(names - done_names)
+
+        done = 0
+        without_preview = 0
+        started = time.perf_counter()
+        size = options['batch_size']
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for start in range(0, len(pending), size):
+                batch = pending[start:start + size]
+                rows = [DocumentPreview(name=name, **values) for name, values in executor.map(process, batch)]
+                DocumentPreview.objects.filter(name__in=batch).delete()
+                DocumentPreview.objects.bulk_create(rows)
+
+                done += len(rows)
+                without_preview += sum(1 for row in rows if not row.preview)
+                self.stdout.write(f'{done} of {len(pending)} documents rendered')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {done} documents in {elapsed:.1f}s ({without_preview} without a preview, '
+            f'{len(stale)} stale previews removed)'
+        ))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:44
+
+from django.db import migrations, models
+from django.db.models import F, Q
+
+REQUIRED_DOCUMENTS = [
+    'pan_card', 'aadhaar_card', 'ownership_proof', 'revenue_records', 'tax_receipt', 'encumbrance_certificate',
+]
+
+
+def backfill_documents_mask(apps, schema_editor):
+    SellerKYC = apps.get_model('accounts', 'SellerKYC')
+    # One UPDATE per document and one per distinct mask, rather than one per row
+    for bit, field in enumerate(REQUIRED_DOCUMENTS):
+        uploaded = ~Q(**{field: ''}) & Q(**{f'{field}__isnull': False})
+        SellerKYC.objects.filter(uploaded).update(documents_mask=F('documents_mask').bitor(1 << bit))
+    for mask in SellerKYC.objects.values_list('documents_mask', flat=True).distinct():
+        SellerKYC.objects.filter(documents_mask=mask).update(missing_count=len(REQUIRED_DOCUMENTS) - mask.bit_count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_alter_sellerkyc_aadhaar_card_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sellerkyc',
+            name='documents_mask',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='One bit per uploaded required document'),
+        ),
+        migrations.AddField(
+            model_name='sellerkyc',
+            name='missing_count',
+            field=models.PositiveSmallIntegerField(default=6, editable=False, help_text='Required documents not uploaded yet'),
+        ),
+        migrations.AddIndex(
+            model_name='sellerkyc',
+            index=models.Index(fields=['status', 'missing_count', '-date_submitted'], name='kyc_status_missing_idx'),
+        ),
+        migrations.RunPython(backfill_documents_mask, migrations.RunPython.noop),
+    ]
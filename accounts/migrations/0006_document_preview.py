@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_sellerkyc_documents_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentPreview',
+            fields=[
+                ('name', models.CharField(help_text='Storage name of the document', max_length=255, primary_key=True, serialize=False)),
+                ('preview', models.FileField(blank=True, help_text='Downscaled JPEG of the photo or first PDF page, stored next to the document', upload_to='kyc/previews/')),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('page_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
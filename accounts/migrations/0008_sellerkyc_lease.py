@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_kyc_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sellerkyc',
+            name='lease_expires',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='sellerkyc',
+            name='leased_by',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='leased_kycs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='sellerkyc',
+            index=models.Index(fields=['status', 'missing_count', 'date_submitted'], name='kyc_review_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:11
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_sellerkyc_lease'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='sellerkyc',
+            name='kyc_status_missing_idx',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_remove_kyc_status_missing_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sellerkyc',
+            index=models.Index(fields=['status', 'date_submitted'], name='kyc_status_submitted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sellerkyc',
+            index=models.Index(fields=['date_submitted'], name='kyc_submitted_idx'),
+        ),
+    ]
@@ -1,9 +1,13 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth import get_user_model
 
+from safeestate.counters import CountedModelMixin
+
 # Custom User Model
-class CustomUser(AbstractUser):
+class CustomUser(CountedModelMixin, AbstractUser):
     ROLE_CHOICES = [
         ('buyer', 'Buyer'),
         ('seller', 'Seller'),
@@ -20,12 +24,25 @@ class CustomUser(AbstractUser):
         return f'{self.username} ({self.get_role_display()})'
 
 # Seller KYC Verification Model
-class SellerKYC(models.Model):
+class SellerKYC(CountedModelMixin, models.Model):
     VERIFICATION_STATUS = [
         ('pending', 'Pending'),
         ('approved', 'Approved'),
         ('rejected', 'Rejected'),
     ]
+    # Bit i of documents_mask is set when REQUIRED_DOCUMENTS[i] is uploaded
+    REQUIRED_DOCUMENTS = [
+        ('pan_card', 'PAN Card'),
+        ('aadhaar_card', 'Aadhaar Card'),
+        ('ownership_proof', 'Ownership Proof'),
+        ('revenue_records', 'Revenue Records'),
+        ('tax_receipt', 'Tax Receipt'),
+        ('encumbrance_certificate', 'Encumbrance Certificate'),
+    ]
+    OPTIONAL_DOCUMENTS = [
+        ('voter_id', 'Voter ID'),
+        ('additional_documents', 'Additional Documents'),
+    ]
     
     seller = models.OneToOneField('CustomUser', on_delete=models.CASCADE, related_name='kyc')
     
@@ -50,30 +67,116 @@ class SellerKYC(models.Model):
     date_submitted = models.DateTimeField(auto_now_add=True)
     date_verified = models.DateTimeField(null=True, blank=True)
     
+    # Derived from the document fields in save(), so the admin filters can use an index
+    documents_mask = models.PositiveSmallIntegerField(default=0, editable=False, help_text='One bit per uploaded required document')
+    missing_count = models.PositiveSmallIntegerField(default=len(REQUIRED_DOCUMENTS), editable=False, help_text='Required documents not uploaded yet')
+    
+    # Reviewer working on the submission, claimed through admin_panel.kyc_queue
+    leased_by = models.ForeignKey('CustomUser', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='leased_kycs')
+    lease_expires = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    class Meta:
+        indexes = [
+            # The kyc_verification list, newest first, with and without a status filter
+            models.Index(fields=['status', 'date_submitted'], name='kyc_status_submitted_idx'),
+            models.Index(fields=['date_submitted'], name='kyc_submitted_idx'),
+            # The review queue's order, see admin_panel.kyc_queue
+            models.Index(fields=['status', 'missing_count', 'date_submitted'], name='kyc_review_queue_idx'),
+        ]
+    
     def __str__(self):
         return f'KYC for {self.seller.username} - {self.get_status_display()}'
     
     def get_required_documents(self):
         """Return list of required documents for display"""
         return [
-            {'name': 'PAN Card', 'field': 'pan_card', 'uploaded': bool(self.pan_card)},
-            {'name': 'Aadhaar Card', 'field': 'aadhaar_card', 'uploaded': bool(self.aadhaar_card)},
-            {'name': 'Ownership Proof', 'field': 'ownership_proof', 'uploaded': bool(self.ownership_proof)},
-            {'name': 'Revenue Records', 'field': 'revenue_records', 'uploaded': bool(self.revenue_records)},
-            {'name': 'Tax Receipt', 'field': 'tax_receipt', 'uploaded': bool(self.tax_receipt)},
-            {'name': 'Encumbrance Certificate', 'field': 'encumbrance_certificate', 'uploaded': bool(self.encumbrance_certificate)},
+            {'name': name, 'field': field, 'uploaded': bool(self.documents_mask & 1 << bit)}
+            for bit, (field, name) in enumerate(self.REQUIRED_DOCUMENTS)
+        ]
+    
+    def get_documents(self):
+        """Every uploaded document with its DocumentPreview (None until rendered), read in one query"""
+        documents = [
+            {'name': name, 'field': field, 'required': required, 'file': getattr(self, field)}
+            for documents, required in ((self.REQUIRED_DOCUMENTS, True), (self.OPTIONAL_DOCUMENTS, False))
+            for field, name in documents
         ]
+        previews = DocumentPreview.objects.in_bulk([doc['file'].name for doc in documents if doc['file']])
+        for doc in documents:
+            doc['preview'] = previews.get(doc['file'].name)
+        return documents
+    
+    def get_missing_documents(self):
+        return [doc for doc in self.get_required_documents() if not doc['uploaded']]
     
     def is_complete(self):
         """Check if all required documents are uploaded"""
-        return all([
-            self.pan_card,
-            self.aadhaar_card,
-            self.ownership_proof,
-            self.revenue_records,
-            self.tax_receipt,
-            self.encumbrance_certificate,
-        ])
+        return self.missing_count == 0
+    
+    @classmethod
+    def document_bit(cls, field):
+        """The documents_mask bit of a required document field"""
+        return 1 << [name for name, label in cls.REQUIRED_DOCUMENTS].index(field)
+    
+    def save(self, *args, **kwargs):
+        # QuerySet.update() and bulk_update() skip this; recompute the mask when using them on documents
+        document_fields = {field for field, name in self.REQUIRED_DOCUMENTS}
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or document_fields & set(update_fields):
+            mask = 0
+            for bit, (field, name) in enumerate(self.REQUIRED_DOCUMENTS):
+                if getattr(self, field):
+                    mask |= 1 << bit
+            self.documents_mask = mask
+            self.missing_count = len(self.REQUIRED_DOCUMENTS) - mask.bit_count()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'documents_mask', 'missing_count'}
+        super().save(*args, **kwargs)
+
+class DocumentPreview(models.Model):
+    """Reviewer preview and facts of one stored KYC file, shared by every row that points at it"""
+    name = models.CharField(max_length=255, primary_key=True, help_text='Storage name of the document')
+    preview = models.FileField(upload_to='kyc/previews/', blank=True, help_text='Downscaled JPEG of the photo or first PDF page, stored next to the document')
+    content_type = models.CharField(max_length=100, blank=True)
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    size = models.BigIntegerField(default=0)
+    date_created = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f'Preview of {self.name}'
+    
+    @property
+    def is_pdf(self):
+        return self.content_type == 'application/pdf'
+
+class KYCUpload(models.Model):
+    """Resumable chunked upload of one KYC document, see accounts.uploads"""
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    seller = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='kyc_uploads')
+    field = models.CharField(max_length=30, help_text='SellerKYC document field the file is meant for')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    offset = models.BigIntegerField(default=0, help_text='Bytes received so far')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    stored_name = models.CharField(max_length=255, blank=True, help_text='Storage name once complete')
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_updated = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['seller', 'status'], name='kyc_upload_seller_idx'),
+            models.Index(fields=['date_updated'], name='kyc_upload_updated_idx'),
+        ]
+    
+    def __str__(self):
+        return f'Upload of {self.filename} for {self.seller.username} ({self.offset}/{self.size})'
 
 # OTP Model for simulation
 class OTPVerification(models.Model):
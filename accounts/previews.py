@@ -0,0 +1,167 @@
+"""
+Previews of KYC documents for the verification pages.
+
+When a SellerKYC file is uploaded (see accounts/signals.py) it is opened
+once and a small JPEG is written next to it under a ``derivatives/``
+folder: the photo scaled down, or the first page of a PDF rasterized at
+the preview size. The page count, byte size and type go into a
+DocumentPreview row keyed by the document's storage name, so identical
+uploads, which content-addressed storage stores once, are rendered once
+and the detail page can show every document with a single query and no
+file access.
+
+PDFs are rendered with pypdfium2. Without it installed PDFs still get
+their size and a page count read from the file's page tree, but no
+picture. Files that cannot be read get a row without a preview, so they
+are not retried on every upload of the same bytes; run the
+``generate_kyc_previews`` command to (re)build them.
+"""
+import mimetypes
+import posixpath
+import re
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .models import DocumentPreview
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    # Optional: PDFs then get a page count but no rendered preview
+    pdfium = None
+
+PREVIEW_SIZE = 640
+PREVIEW_QUALITY = 75
+PDF_MAGIC = b'%PDF-'
+RENDER_ERRORS = (OSError, ValueError, SyntaxError, Image.DecompressionBombError)
+if pdfium is not None:
+    RENDER_ERRORS += (pdfium.PdfiumError,)
+PAGE_RE = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+PAGE_TREE_COUNT_RE = re.compile(rb'/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b')
+
+
+def preview_size():
+    return getattr(settings, 'KYC_PREVIEW_SIZE', PREVIEW_SIZE)
+
+
+def preview_name(name):
+    """Storage name of the preview of a document, derived from the document's own"""
+    folder, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(folder, 'derivatives', f'{stem}_preview.jpg')
+
+
+def count_pages(data):
+    """Page count of a PDF from its page tree, or None when the objects are compressed out of reach"""
+    counts = [int(a or b) for a, b in PAGE_TREE_COUNT_RE.findall(data)]
+    if counts:
+        # The root of the page tree counts every page below it
+        return max(counts)
+    return len(PAGE_RE.findall(data)) or None
+
+
+def render_pdf(handle, box):
+    """Return (first page as a PIL image or None, page count) of a PDF file"""
+    if pdfium is None:
+        return None, count_pages(handle.read())
+    document = pdfium.PdfDocument(handle)
+    try:
+        pages = len(document)
+        if not pages:
+            return None, 0
+        page = document[0]
+        width, height = page.get_size()
+        # Sizes are in points; render straight to the preview box
+        image = page.render(scale=min(box / width, box / height)).to_pil()
+        page.close()
+    finally:
+        document.close()
+    return image, pages
+
+
+def render_image(handle, box):
+    """Return (the photo scaled into the preview box, its MIME type)"""
+    image = Image.open(handle)
+    content_type = Image.MIME.get(image.format, '')
+    # JPEG decodes straight to a reduced scale, which is much cheaper
+    image.draft('RGB', (box, box))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((box, box), Image.Resampling.LANCZOS)
+    return image, content_type
+
+
+def encode(image):
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=PREVIEW_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def render(name, storage):
+    """
+    Write the preview of one stored document and return the DocumentPreview
+    field values, without touching the database.
+    """
+    box = preview_size()
+    image = None
+    pages = None
+    content_type = mimetypes.guess_type(name)[0] or ''
+    try:
+        size = storage.size(name)
+    except OSError:
+        size = 0
+    try:
+        with storage.open(name, 'rb') as handle:
+            if handle.read(len(PDF_MAGIC)) == PDF_MAGIC:
+                handle.seek(0)
+                content_type = 'application/pdf'
+                image, pages = render_pdf(handle, box)
+            else:
+                handle.seek(0)
+                image, content_type = render_image(handle, box)
+                pages = 1
+    except RENDER_ERRORS:
+        # Unreadable or unsupported; the reviewer still gets the original
+        image = None
+
+    stored = ''
+    if image is not None:
+        stored = preview_name(name)
+        if storage.exists(stored):
+            storage.delete(stored)
+        # Content-addressed storage would rename the preview after its own digest
+        save = getattr(storage, 'save_exact', storage.save)
+        stored = save(stored, encode(image))
+    return {'preview': stored, 'content_type': content_type, 'page_count': pages, 'size': size}
+
+
+def generate(field_file, force=False):
+    """
+    Render the preview of a stored document and record its facts, unless
+    that file already has them; return the DocumentPreview.
+    """
+    if not force:
+        existing = DocumentPreview.objects.filter(name=field_file.name).first()
+        if existing is not None:
+            return existing
+    preview, created = DocumentPreview.objects.update_or_create(
+        name=field_file.name, defaults=render(field_file.name, field_file.storage),
+    )
+    return preview
+
+
+def delete(name, storage):
+    """Remove the preview of a document file that was deleted (a file_refs release hook)"""
+    for preview in DocumentPreview.objects.filter(name=name):
+        if preview.preview and storage.exists(preview.preview.name):
+            storage.delete(preview.preview.name)
+        preview.delete()
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from .models import SellerKYC
+from . import previews
+
+DOCUMENT_FIELDS = [field for field, name in SellerKYC.REQUIRED_DOCUMENTS + SellerKYC.OPTIONAL_DOCUMENTS]
+
+
+def _document_names(instance):
+    deferred = instance.get_deferred_fields()
+    return {field: getattr(instance, field).name for field in DOCUMENT_FIELDS if field not in deferred}
+
+
+@receiver(post_init, sender=SellerKYC)
+def remember_preview_sources(sender, instance, **kwargs):
+    instance._preview_sources = _document_names(instance)
+
+
+@receiver(post_save, sender=SellerKYC)
+def update_document_previews(sender, instance, created, **kwargs):
+    """Render previews of new or replaced documents; files shared with other rows already have one"""
+    previous = {} if created else getattr(instance, '_preview_sources', {})
+    current = _document_names(instance)
+    for field, name in current.items():
+        if name and (created or (field in previous and previous[field] != name)):
+            previews.generate(getattr(instance, field))
+    instance._preview_sources = current
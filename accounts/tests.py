@@ -1,3 +1,223 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from io import BytesIO, StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from admin_panel.models import StoredFile
+from properties.models import Property, PropertyImage
+from . import previews
+from .models import CustomUser, DocumentPreview, KYCUpload, SellerKYC
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_ACCEL=None, PROPERTY_IMAGE_DERIVATIVES_ON_UPLOAD=False)
+        self.override.enable()
+        self.seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        CustomUser.objects.create_user('other', password='pass', role='seller')
+        CustomUser.objects.create_user('admin', password='pass', role='admin')
+        kyc = SellerKYC(seller=self.seller)
+        kyc.pan_card.save('pan.pdf', ContentFile(b'%PDF-1.4 pan card'))
+        self.document_url = kyc.pan_card.url
+        listing = Property.objects.create(
+            title='Beach flat', description='Sea view', price=100, property_type='flat',
+            state='goa', city='Panaji', pincode='403001', address='Miramar', area=800, seller=self.seller,
+        )
+        image = PropertyImage(property=listing)
+        image.image.save('front.jpg', ContentFile(bytes(range(256)) * 4))
+        self.image_url = image.image.url
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_kyc_documents_are_limited_to_owner_and_admins(self):
+        self.assertEqual(self.client.get(self.document_url).status_code, 404)
+        self.client.login(username='other', password='pass')
+        self.assertEqual(self.client.get(self.document_url).status_code, 404)
+
+        for username in ('seller', 'admin'):
+            self.client.login(username=username, password='pass')
+            response = self.client.get(self.document_url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 pan card')
+            self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_property_images_are_cached_and_support_ranges(self):
+        response = self.client.get(self.image_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        etag = response['ETag']
+        response.close()
+
+        self.assertEqual(self.client.get(self.image_url, headers={'If-None-Match': etag}).status_code, 304)
+
+        response = self.client.get(self.image_url, headers={'Range': 'bytes=1020-'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 1020-1023/1024')
+        self.assertEqual(b''.join(response.streaming_content), bytes([252, 253, 254, 255]))
+
+        response = self.client.get(self.image_url, headers={'Range': 'bytes=5000-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+
+    @override_settings(MEDIA_ACCEL='nginx')
+    def test_transfer_is_handed_to_the_proxy(self):
+        self.client.login(username='seller', password='pass')
+        response = self.client.get(self.document_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.document_url[len('/media/'):])
+        self.assertEqual(response.content, b'')
+
+
+class DocumentPreviewTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, KYC_PREVIEW_SIZE=200)
+        self.override.enable()
+        admin = CustomUser.objects.create_user('admin', password='pass', role='admin')
+        self.client.force_login(admin)
+        self.seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def encoded(self, fmt, pages=1):
+        buffer = BytesIO()
+        page = Image.new('RGB', (1240, 1754), 'white')
+        if pages > 1:
+            page.save(buffer, fmt, save_all=True, append_images=[page] * (pages - 1))
+        else:
+            page.save(buffer, fmt)
+        return buffer.getvalue()
+
+    def test_previews_are_rendered_on_upload_and_shown_instead_of_originals(self):
+        kyc = SellerKYC(seller=self.seller)
+        kyc.pan_card.save('pan.pdf', ContentFile(self.encoded('PDF', pages=3)), save=False)
+        kyc.aadhaar_card.save('aadhaar.jpg', ContentFile(self.encoded('JPEG')), save=False)
+        kyc.save()
+
+        photo = DocumentPreview.objects.get(name=kyc.aadhaar_card.name)
+        self.assertEqual((photo.content_type, photo.page_count, photo.size), ('image/jpeg', 1, kyc.aadhaar_card.size))
+        with default_storage.open(photo.preview.name) as handle:
+            self.assertEqual(Image.open(handle).size, (141, 200))
+
+        pdf = DocumentPreview.objects.get(name=kyc.pan_card.name)
+        self.assertEqual((pdf.content_type, pdf.page_count), ('application/pdf', 3))
+        self.assertEqual(bool(pdf.preview), previews.pdfium is not None)
+
+        with self.assertNumQueries(4):
+            # Session, user, KYC with its seller and every preview at once
+            response = self.client.get(reverse('admin_panel:kyc_detail', args=[kyc.pk]))
+        self.assertContains(response, photo.preview.url)
+        self.assertNotContains(response, f'src="{kyc.aadhaar_card.url}"')
+        self.assertContains(response, '3 pages')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            kyc.delete()
+        self.assertFalse(DocumentPreview.objects.exists())
+        self.assertFalse(os.path.exists(photo.preview.path))
+
+    def test_page_count_without_renderer(self):
+        self.assertEqual(previews.count_pages(self.encoded('PDF', pages=4)), 4)
+        self.assertIsNone(previews.count_pages(b'%PDF-1.7 no page tree'))
+
+    @unittest.skipIf(previews.pdfium is None, 'pypdfium2 is not installed')
+    def test_command_renders_missing_previews(self):
+        kyc = SellerKYC.objects.create(seller=self.seller)
+        # Stored without signals, as rows created before previews existed
+        name = default_storage.save('kyc/pan/pan.pdf', ContentFile(self.encoded('PDF', pages=2)))
+        SellerKYC.objects.filter(pk=kyc.pk).update(pan_card=name)
+
+        call_command('generate_kyc_previews', stdout=StringIO())
+        preview = DocumentPreview.objects.get(name=name)
+        self.assertEqual(preview.page_count, 2)
+        self.assertTrue(default_storage.exists(preview.preview.name))
+
+
+@override_settings(KYC_PREVIEW_SIZE=50)
+class KYCUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        self.client.force_login(self.seller)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def start(self, field, content, sha256=None):
+        response = self.client.post(reverse('accounts:kyc_upload_start'), {
+            'field': field, 'filename': f'{field}.pdf', 'size': len(content),
+            'sha256': sha256 or hashlib.sha256(content).hexdigest(), 'content_type': 'application/pdf',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return reverse('accounts:kyc_upload', args=[response.json()['id']]), response.json()['id']
+
+    def put(self, url, content, first, last):
+        return self.client.put(
+            url, content[first:last + 1], content_type='application/octet-stream',
+            headers={'Content-Range': f'bytes {first}-{last}/{len(content)}'},
+        )
+
+    def test_interleaved_uploads_are_attached_on_submit(self):
+        pan = b'%PDF-1.4 pan card of the seller'
+        aadhaar = b'%PDF-1.4 aadhaar card'
+        pan_url, pan_id = self.start('pan_card', pan)
+        aadhaar_url, aadhaar_id = self.start('aadhaar_card', aadhaar)
+
+        self.assertEqual(self.put(pan_url, pan, 0, 9).json()['offset'], 10)
+        self.assertEqual(self.put(aadhaar_url, aadhaar, 0, 9).json()['offset'], 10)
+        # A resent chunk is refused with the offset to carry on from
+        response = self.put(pan_url, pan, 0, 9)
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 10))
+        self.assertEqual(self.put(aadhaar_url, aadhaar, 10, len(aadhaar) - 1).json()['status'], 'complete')
+        self.assertEqual(self.put(pan_url, pan, 10, len(pan) - 1).json()['status'], 'complete')
+        self.assertEqual(self.client.get(pan_url).json()['offset'], len(pan))
+
+        stored = KYCUpload.objects.get(pk=pan_id).stored_name
+        self.assertEqual(StoredFile.objects.get(name=stored).ref_count, 1)
+
+        data = {'pan_card_upload': pan_id, 'aadhaar_card_upload': aadhaar_id}
+        for field in ('ownership_proof', 'revenue_records', 'tax_receipt', 'encumbrance_certificate'):
+            data[field] = SimpleUploadedFile(f'{field}.pdf', f'%PDF-1.4 {field}'.encode(), 'application/pdf')
+        response = self.client.post(reverse('accounts:seller_kyc'), data)
+        self.assertRedirects(response, reverse('accounts:profile'), fetch_redirect_response=False)
+
+        kyc = SellerKYC.objects.get(seller=self.seller)
+        self.assertEqual(kyc.pan_card.name, stored)
+        self.assertEqual(kyc.aadhaar_card.read(), aadhaar)
+        self.assertTrue(kyc.is_complete())
+        self.assertFalse(KYCUpload.objects.exists())
+        # The session's hold is gone; only the KYC refers to the file
+        self.assertEqual(StoredFile.objects.get(name=stored).ref_count, 1)
+
+    def test_digest_mismatch_restarts_the_upload(self):
+        content = b'%PDF-1.4 tampered'
+        url, upload_id = self.start('voter_id', content, sha256='0' * 64)
+        response = self.put(url, content, 0, len(content) - 1)
+        self.assertEqual((response.status_code, response.json()['offset']), (422, 0))
+        self.assertEqual(KYCUpload.objects.get(pk=upload_id).status, 'uploading')
+
+        # Nobody else's session, and no id for a file that never completed
+        other = CustomUser.objects.create_user('other', password='pass', role='seller')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.client.post(reverse('accounts:seller_kyc'), {'voter_id_upload': upload_id})
+        self.assertContains(response, 'The uploaded file has expired')
 
-# Create your tests here.
@@ -0,0 +1,220 @@
+"""
+Resumable chunked uploads of KYC documents.
+
+The KYC page opens one upload session per document with the file's name,
+size and SHA-256 (start()), then sends the file in chunks, each with a
+Content-Range header (write_chunk()). A chunk is streamed to its offset
+in the session's own part file, and only then is the session's offset
+advanced with a conditional UPDATE. A chunk that does not start at the
+current offset, because it was resent or raced another request, is
+refused with that offset, and the client carries on from there after a
+dropped connection. Sessions share nothing but the folder, so a seller
+can upload several documents at once.
+
+When the last byte arrives the part file is hashed and compared with the
+declared digest, then moved into content-addressed storage (see
+safeestate.storage) and held with a file_refs reference. The KYC form
+then refers to the file by session id (see SellerKYCForm), and release()
+drops the hold once the KYC points at it. Sessions not updated for
+KYC_UPLOAD_EXPIRY are discarded by expire().
+"""
+import hashlib
+import os
+import posixpath
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from admin_panel import file_refs
+from .models import KYCUpload, SellerKYC
+
+FOLDER = 'kyc/uploads'
+CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_SIZE = 10 * 1024 * 1024
+MAX_OPEN_SESSIONS = 16
+EXPIRY = timedelta(hours=24)
+COPY_BLOCK_SIZE = 64 * 1024
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+DOCUMENT_FIELDS = [field for field, name in SellerKYC.REQUIRED_DOCUMENTS + SellerKYC.OPTIONAL_DOCUMENTS]
+
+
+class UploadError(ValueError):
+    """Request the upload session cannot accept; ``status`` is the HTTP status to answer with"""
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def max_size():
+    return getattr(settings, 'KYC_UPLOAD_MAX_SIZE', MAX_SIZE)
+
+
+def expiry():
+    return getattr(settings, 'KYC_UPLOAD_EXPIRY', EXPIRY)
+
+
+def part_path(upload, storage=default_storage):
+    return storage.path(posixpath.join(FOLDER, f'.{upload.pk.hex}.part'))
+
+
+def parse_content_range(header):
+    """Return (first byte, last byte, total) of a 'bytes a-b/n' header, or None"""
+    match = CONTENT_RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+    first, last, total = (int(value) for value in match.groups())
+    return (first, last, total) if first <= last < total else None
+
+
+def start(seller, field, filename, size, sha256, content_type=''):
+    """Open an upload session for one document of the seller"""
+    if field not in DOCUMENT_FIELDS:
+        raise UploadError('Unknown document.')
+    if not isinstance(filename, str):
+        filename = ''
+    extension = posixpath.splitext(filename or '')[1].lower()
+    if extension not in settings.ALLOWED_UPLOAD_EXTENSIONS:
+        raise UploadError('Only images (JPG, PNG, GIF) and PDF files are allowed.')
+    if content_type and content_type not in settings.ALLOWED_CONTENT_TYPES:
+        raise UploadError('Only images (JPG, PNG, GIF) and PDF files are allowed.')
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('The file is empty.')
+    if size > max_size():
+        raise UploadError(f'File size cannot exceed {max_size() // (1024 * 1024)}MB.', status=413)
+    sha256 = (sha256 or '').lower()
+    if not SHA256_RE.match(sha256):
+        raise UploadError('A SHA-256 digest of the file is required.')
+
+    expire(KYCUpload.objects.filter(seller=seller))
+    if KYCUpload.objects.filter(seller=seller).count() >= MAX_OPEN_SESSIONS:
+        raise UploadError('Too many uploads in progress; finish or cancel some first.', status=429)
+    return KYCUpload.objects.create(
+        seller=seller, field=field, filename=posixpath.basename(filename.replace('\\', '/')),
+        content_type=content_type, size=size, sha256=sha256,
+    )
+
+
+def write_chunk(upload, first, stream, length, storage=default_storage):
+    """
+    Write ``length`` bytes read from ``stream`` at offset ``first`` and
+    advance the session; the file is verified and stored once complete.
+    Return the session as it is afterwards.
+    """
+    if upload.status != 'uploading':
+        raise UploadError('The upload is already complete.', status=409, offset=upload.offset)
+    if first != upload.offset:
+        raise UploadError('The chunk does not start at the current offset.', status=409, offset=upload.offset)
+    if length > MAX_CHUNK_SIZE:
+        raise UploadError(f'Chunks cannot exceed {MAX_CHUNK_SIZE // (1024 * 1024)}MB.', status=413, offset=upload.offset)
+    if first + length > upload.size:
+        raise UploadError('The chunk runs past the end of the file.', offset=upload.offset)
+
+    path = part_path(upload, storage)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Created like FileSystemStorage creates files, and never truncated: chunks land at their offset
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o666)
+    received = 0
+    with os.fdopen(fd, 'wb') as handle:
+        handle.seek(first)
+        while received < length:
+            block = stream.read(min(COPY_BLOCK_SIZE, length - received))
+            if not block:
+                break
+            handle.write(block)
+            received += len(block)
+    if received != length:
+        # The connection dropped; the offset stays where it was
+        raise UploadError('The chunk was cut short.', offset=upload.offset)
+
+    advanced = KYCUpload.objects.filter(pk=upload.pk, status='uploading', offset=first).update(
+        offset=first + length, date_updated=timezone.now(),
+    )
+    if not advanced:
+        upload.refresh_from_db()
+        raise UploadError('The chunk does not start at the current offset.', status=409, offset=upload.offset)
+    upload.offset = first + length
+    if upload.offset == upload.size:
+        complete(upload, storage)
+    return upload
+
+
+def complete(upload, storage=default_storage):
+    """Check the assembled file against the declared digest and move it into storage"""
+    path = part_path(upload, storage)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(COPY_BLOCK_SIZE), b''):
+            digest.update(block)
+    if digest.hexdigest() != upload.sha256:
+        # Start over rather than keep bytes that cannot be trusted
+        os.remove(path)
+        KYCUpload.objects.filter(pk=upload.pk).update(offset=0, date_updated=timezone.now())
+        upload.offset = 0
+        raise UploadError('The file does not match its SHA-256 digest; upload it again.', status=422, offset=0)
+
+    field = SellerKYC._meta.get_field(upload.field)
+    name = field.generate_filename(None, upload.filename)
+    if hasattr(storage, 'adopt'):
+        name = storage.adopt(path, name, upload.sha256)
+    else:
+        with open(path, 'rb') as handle:
+            name = storage.save(name, File(handle))
+        os.remove(path)
+
+    with transaction.atomic():
+        # Held until the KYC form refers to it, so the media collector leaves it alone
+        file_refs.acquire([name])
+        KYCUpload.objects.filter(pk=upload.pk).update(status='complete', stored_name=name, date_updated=timezone.now())
+    upload.status = 'complete'
+    upload.stored_name = name
+    return upload
+
+
+def completed(seller, ids):
+    """Return the seller's complete sessions among the given ids, by id"""
+    valid = []
+    for value in ids:
+        try:
+            valid.append(KYCUpload._meta.pk.to_python(value))
+        except ValidationError:
+            continue
+    return {str(upload.pk): upload for upload in KYCUpload.objects.filter(seller=seller, status='complete', pk__in=valid)}
+
+
+def release(uploads):
+    """Close sessions whose files a KYC now refers to, dropping their holds"""
+    uploads = list(uploads)
+    if not uploads:
+        return
+    with transaction.atomic():
+        KYCUpload.objects.filter(pk__in=[upload.pk for upload in uploads]).delete()
+        file_refs.release([upload.stored_name for upload in uploads])
+
+
+def cancel(upload, storage=default_storage):
+    """Discard a session with whatever it received"""
+    path = part_path(upload, storage)
+    if os.path.exists(path):
+        os.remove(path)
+    with transaction.atomic():
+        upload.delete()
+        if upload.status == 'complete':
+            file_refs.release([upload.stored_name])
+
+
+def expire(queryset=None, storage=default_storage):
+    """Discard sessions, of the queryset if given, not updated for KYC_UPLOAD_EXPIRY; return how many"""
+    queryset = KYCUpload.objects.all() if queryset is None else queryset
+    stale = list(queryset.filter(date_updated__lt=timezone.now() - expiry()))
+    for upload in stale:
+        cancel(upload, storage)
+    return len(stale)
@@ -14,6 +14,8 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(next_page='/'), name='logout'),
     path('profile/', views.profile, name='profile'),
     path('seller-kyc/', views.seller_kyc, name='seller_kyc'),
+    path('seller-kyc/uploads/', views.kyc_upload_start, name='kyc_upload_start'),
+    path('seller-kyc/uploads/<uuid:pk>/', views.kyc_upload, name='kyc_upload'),
     path('generate-otp/', views.generate_otp, name='generate_otp'),
     path('verify-otp/', views.verify_otp, name='verify_otp'),
 ]
\ No newline at end of file
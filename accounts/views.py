@@ -5,8 +5,11 @@ from django.contrib import messages
 from django.utils import timezone
 from datetime import timedelta
 import random
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods, require_POST
 from .forms import CustomUserRegistrationForm, SellerKYCForm, OTPVerificationForm
-from .models import SellerKYC, OTPVerification
+from .models import SellerKYC, OTPVerification, KYCUpload
+from . import uploads
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -53,18 +56,89 @@ def seller_kyc(request):
         kyc = None
     
     if request.method == 'POST':
-        form = SellerKYCForm(request.POST, request.FILES, instance=kyc)
+        form = SellerKYCForm(request.POST, request.FILES, instance=kyc, seller=request.user)
         if form.is_valid():
             kyc = form.save(commit=False)
             kyc.seller = request.user
             kyc.status = 'pending'
             kyc.save()
+            # The KYC now holds the files sent ahead through the chunked upload API
+            uploads.release(form.uploads)
             messages.success(request, 'KYC documents submitted successfully! Please wait for admin approval.')
             return redirect('accounts:profile')
     else:
-        form = SellerKYCForm(instance=kyc)
+        form = SellerKYCForm(instance=kyc, seller=request.user)
     
-    return render(request, 'accounts/seller_kyc.html', {'form': form, 'kyc': kyc})
+    context = {
+        'form': form,
+        'kyc': kyc,
+        'upload_chunk_size': uploads.CHUNK_SIZE,
+        'upload_max_size': uploads.max_size(),
+    }
+    return render(request, 'accounts/seller_kyc.html', context)
+
+def upload_state(upload):
+    return {
+        'id': str(upload.pk),
+        'field': upload.field,
+        'offset': upload.offset,
+        'size': upload.size,
+        'status': upload.status,
+    }
+
+def upload_error(error):
+    data = {'success': False, 'message': str(error)}
+    if error.offset is not None:
+        data['offset'] = error.offset
+    return JsonResponse(data, status=error.status)
+
+@login_required
+@require_POST
+def kyc_upload_start(request):
+    """Open a chunked upload session for one KYC document"""
+    if request.user.role != 'seller':
+        return JsonResponse({'success': False, 'message': 'Only sellers can submit KYC documents.'}, status=403)
+    import json
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'message': 'Invalid request body.'}, status=400)
+    try:
+        upload = uploads.start(
+            request.user, data.get('field'), data.get('filename'), data.get('size'),
+            data.get('sha256'), data.get('content_type') or '',
+        )
+    except uploads.UploadError as error:
+        return upload_error(error)
+    return JsonResponse({'success': True, 'chunk_size': uploads.CHUNK_SIZE, **upload_state(upload)}, status=201)
+
+@login_required
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+def kyc_upload(request, pk):
+    """Report (GET), continue (PUT one chunk with a Content-Range header) or cancel (DELETE) an upload"""
+    upload = get_object_or_404(KYCUpload, pk=pk, seller=request.user)
+    
+    if request.method == 'DELETE':
+        uploads.cancel(upload)
+        return JsonResponse({'success': True})
+    
+    if request.method == 'PUT':
+        content_range = uploads.parse_content_range(request.headers.get('Content-Range'))
+        try:
+            length = int(request.headers.get('Content-Length') or -1)
+        except ValueError:
+            length = -1
+        if content_range is None or content_range[2] != upload.size or content_range[1] - content_range[0] + 1 != length:
+            return upload_error(uploads.UploadError('A Content-Range matching the body and the file size is required.', offset=upload.offset))
+        try:
+            # Read from the request stream, so the chunk is never held in memory as a whole
+            uploads.write_chunk(upload, content_range[0], request, length)
+        except uploads.UploadError as error:
+            return upload_error(error)
+    
+    return JsonResponse({'success': True, **upload_state(upload)})
 
 @login_required
 def generate_otp(request):
@@ -1,11 +1,11 @@
 """
 Admin actions for bulk property image management
 """
-import requests
 import uuid
 from django.contrib import messages
 from django.core.files.base import ContentFile
 from properties.models import PropertyImage
+from safeestate.fetcher import get_fetcher
 
 def bulk_assign_unique_images(modeladmin, request, queryset):
     """Assign unique images to selected properties"""
@@ -49,29 +49,30 @@ def bulk_assign_unique_images(modeladmin, request, queryset):
     success_count = 0
     error_count = 0
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
+    # Pick every image first so the downloads can run concurrently
+    plan = []
     for i, property_obj in enumerate(queryset):
+        # Select image based on property type and index for uniqueness
+        prop_type = property_obj.property_type
+        if prop_type in image_pool:
+            available_images = image_pool[prop_type] + special_images
+        else:
+            available_images = image_pool['house'] + special_images
+        
+        # Use index to ensure different images for each property
+        plan.append((property_obj, available_images[i % len(available_images)]))
+    
+    downloads = get_fetcher().fetch_many(image_url for property_obj, image_url in plan)
+    
+    for property_obj, image_url in plan:
         try:
+            content = downloads[image_url]
+            if isinstance(content, Exception):
+                raise content
+            
             # Remove existing images
             property_obj.images.all().delete()
             
-            # Select image based on property type and index for uniqueness
-            prop_type = property_obj.property_type
-            if prop_type in image_pool:
-                available_images = image_pool[prop_type] + special_images
-            else:
-                available_images = image_pool['house'] + special_images
-            
-            # Use index to ensure different images for each property
-            image_url = available_images[i % len(available_images)]
-            
-            # Download image
-            response = requests.get(image_url, headers=headers, timeout=15)
-            response.raise_for_status()
-            
             # Create PropertyImage
             filename = f"admin_bulk_{property_obj.id}_{uuid.uuid4().hex[:8]}.jpg"
             property_image = PropertyImage(
@@ -79,7 +80,7 @@ def bulk_assign_unique_images(modeladmin, request, queryset):
                 caption=f"Professional {property_obj.get_property_type_display().lower()} image for {property_obj.city}",
                 is_primary=True
             )
-            property_image.image.save(filename, ContentFile(response.content), save=True)
+            property_image.image.save(filename, ContentFile(content), save=True)
             success_count += 1
             
         except Exception as e:
@@ -110,16 +111,12 @@ def assign_placeholder_images(modeladmin, request, queryset):
     
     placeholder_url = "https://images.unsplash.com/photo-1560518883-ce09059eeffa?w=800&h=600&fit=crop"
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    
     assigned_count = 0
     for property_obj in queryset:
         if not property_obj.images.exists():
             try:
-                response = requests.get(placeholder_url, headers=headers, timeout=10)
-                response.raise_for_status()
+                # Downloaded once, then served from the fetcher cache
+                content = get_fetcher().fetch(placeholder_url)
                 
                 filename = f"placeholder_{property_obj.id}_{uuid.uuid4().hex[:6]}.jpg"
                 property_image = PropertyImage(
@@ -127,7 +124,7 @@ def assign_placeholder_images(modeladmin, request, queryset):
                     caption=f"Placeholder image for {property_obj.title}",
                     is_primary=True
                 )
-                property_image.image.save(filename, ContentFile(response.content), save=True)
+                property_image.image.save(filename, ContentFile(content), save=True)
                 assigned_count += 1
                 
             except Exception as e:
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AdminPanelConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'admin_panel'
+
+    def ready(self):
+        from safeestate import counters
+        from . import file_refs
+        counters.connect_signals()
+        file_refs.connect_signals()
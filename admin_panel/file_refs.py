@@ -0,0 +1,190 @@
+"""
+Reference counts for media files shared between rows.
+
+With content-addressed storage (safeestate.storage) identical uploads
+resolve to one file, so a file may only be deleted once no PropertyImage
+or SellerKYC field points at it any more. Each stored name has a
+StoredFile row whose ref_count is kept up to date by signal handlers on
+the models in TRACKED_FIELDS; when it drops to zero the file (and
+anything derived from it, see RELEASE_HOOKS) is deleted after the
+transaction commits. ``QuerySet.update()`` and ``bulk_create()`` bypass
+signals; run the ``dedupe_media`` management command to recount.
+
+A stored file handed out again for an identical upload has no reference
+until the row pointing at it is saved, possibly in a transaction that is
+still open. claim() covers that gap: the storage calls it through the
+file_reused signal, release() leaves claimed rows alone for
+CLAIM_TIMEOUT, and deleting a file first takes the database write lock,
+so it waits for a claim that has not committed yet.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, post_delete
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from safeestate.storage import file_reused
+
+from .models import StoredFile
+
+# model label -> file fields whose names are reference counted
+TRACKED_FIELDS = {
+    'properties.propertyimage': ['image'],
+    'accounts.sellerkyc': [
+        'pan_card', 'aadhaar_card', 'ownership_proof', 'revenue_records',
+        'tax_receipt', 'encumbrance_certificate', 'voter_id', 'additional_documents',
+    ],
+}
+
+# model label -> callable(name, storage) run when one of its files is deleted
+RELEASE_HOOKS = {
+    'properties.propertyimage': 'properties.images.delete',
+    'accounts.sellerkyc': 'accounts.previews.delete',
+}
+
+# How long a claimed file outlives its last reference while the new row is saved
+CLAIM_TIMEOUT = timedelta(hours=1)
+
+
+def file_size(name, storage=default_storage):
+    try:
+        return storage.size(name)
+    except OSError:
+        return 0
+
+
+def acquire(names, storage=default_storage):
+    """Add one reference to each name, creating the StoredFile rows as needed"""
+    names = [name for name in names if name]
+    if not names:
+        return
+    with transaction.atomic():
+        existing = set(StoredFile.objects.filter(name__in=names).values_list('name', flat=True))
+        missing = {name for name in names if name not in existing}
+        if missing:
+            StoredFile.objects.bulk_create(
+                [StoredFile(name=name, size=file_size(name, storage)) for name in missing],
+                ignore_conflicts=True,
+            )
+        # One UPDATE per distinct multiplicity rather than per name
+        by_count = {}
+        for name, count in Counter(names).items():
+            by_count.setdefault(count, []).append(name)
+        for count, group in by_count.items():
+            StoredFile.objects.filter(name__in=group).update(ref_count=F('ref_count') + count, date_claimed=None)
+
+
+def claim(sender, name, storage, **kwargs):
+    """Keep a stored file that is being reused from deletion until acquire() counts it"""
+    with transaction.atomic():
+        StoredFile.objects.bulk_create([StoredFile(name=name, size=file_size(name, storage))], ignore_conflicts=True)
+        StoredFile.objects.filter(name=name).update(date_claimed=timezone.now())
+
+
+def release(names, storage=default_storage, hook=None):
+    """Drop one reference to each name and delete files nobody points at any more"""
+    names = [name for name in names if name]
+    if not names:
+        return
+    with transaction.atomic():
+        for name in names:
+            StoredFile.objects.filter(name=name).update(ref_count=F('ref_count') - 1)
+        unused = list(
+            StoredFile.objects.filter(name__in=names, ref_count__lte=0)
+            .exclude(date_claimed__gt=timezone.now() - CLAIM_TIMEOUT)
+            .values_list('name', flat=True)
+        )
+        StoredFile.objects.filter(name__in=unused, ref_count__lte=0).delete()
+
+    def delete_files():
+        for name in unused:
+            with transaction.atomic():
+                # Writing first waits for a claim still being committed and keeps new
+                # ones out until the file is gone; a claimed or re-acquired name stays
+                if StoredFile.objects.filter(name=name).update(ref_count=F('ref_count')):
+                    continue
+                storage.delete(name)
+                if hook:
+                    hook(name, storage)
+
+    if unused:
+        transaction.on_commit(delete_files)
+
+
+def _names(instance, fields):
+    deferred = instance.get_deferred_fields()
+    return {field: getattr(instance, field).name for field in fields if field not in deferred}
+
+
+def _remember_names(sender, instance, **kwargs):
+    instance._file_ref_names = _names(instance, TRACKED_FIELDS[sender._meta.label_lower])
+
+
+def _hook(sender):
+    path = RELEASE_HOOKS.get(sender._meta.label_lower)
+    return import_string(path) if path else None
+
+
+def _refs_save(sender, instance, created, **kwargs):
+    fields = TRACKED_FIELDS[sender._meta.label_lower]
+    current = _names(instance, fields)
+    previous = {} if created else getattr(instance, '_file_ref_names', {})
+    added = []
+    removed = []
+    for field, name in current.items():
+        old = previous.get(field)
+        if created or (field in previous and old != name):
+            added.append(name)
+            removed.append(old)
+    acquire(added)
+    release(removed, hook=_hook(sender))
+    instance._file_ref_names = current
+
+
+def _refs_delete(sender, instance, **kwargs):
+    fields = TRACKED_FIELDS[sender._meta.label_lower]
+    # Prefer the names as loaded from the database over unsaved edits
+    previous = getattr(instance, '_file_ref_names', None) or {}
+    names = [previous[field] if field in previous else getattr(instance, field).name for field in fields]
+    release(names, hook=_hook(sender))
+
+
+def compute_refs(models):
+    """Count references from scratch; ``models`` maps labels in TRACKED_FIELDS to model classes"""
+    refs = {}
+    for label, fields in TRACKED_FIELDS.items():
+        for row in models[label].objects.values_list(*fields):
+            for name in row:
+                if name:
+                    refs[name] = refs.get(name, 0) + 1
+    return refs
+
+
+def reconcile(storage=default_storage):
+    """Rewrite the StoredFile table from the tracked fields and return the number of files"""
+    from django.apps import apps
+
+    refs = compute_refs({label: apps.get_model(label) for label in TRACKED_FIELDS})
+    sizes = dict(StoredFile.objects.values_list('name', 'size'))
+    with transaction.atomic():
+        StoredFile.objects.all().delete()
+        StoredFile.objects.bulk_create([
+            StoredFile(name=name, ref_count=count, size=sizes.get(name) or file_size(name, storage))
+            for name, count in refs.items()
+        ])
+    return len(refs)
+
+
+def connect_signals():
+    from django.apps import apps
+
+    for label in TRACKED_FIELDS:
+        model = apps.get_model(label)
+        post_init.connect(_remember_names, sender=model, dispatch_uid=f'file_refs_init_{label}')
+        post_save.connect(_refs_save, sender=model, dispatch_uid=f'file_refs_save_{label}')
+        post_delete.connect(_refs_delete, sender=model, dispatch_uid=f'file_refs_delete_{label}')
+    file_reused.connect(claim, dispatch_uid='file_refs_claim')
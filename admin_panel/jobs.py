@@ -0,0 +1,367 @@
+"""
+Background jobs for the bulk actions on the property image page.
+
+A request only validates its input and stores an ImageJob listing the
+items to process (property ids, or property id / file name pairs for
+uploads, whose files are saved to storage straight away); the
+``run_image_jobs`` worker then claims queued jobs with a conditional
+UPDATE and works through the items in chunks. A handler does a chunk's
+slow work (downloads, decoding, hashes and derivatives) first and returns
+the database writes, which are committed in one short transaction
+together with the job's cursor and progress counters, so a job
+interrupted by a restart resumes after the last finished chunk. A running
+job whose heartbeat is older than STALE_AFTER is assumed to belong to a
+dead worker and is claimed again.
+"""
+import os
+import posixpath
+import socket
+import uuid
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image
+
+from properties import duplicates, images
+from properties.models import Property, PropertyImage
+from safeestate.fetcher import get_fetcher
+from . import file_refs
+from .models import ImageJob, StoredFile
+
+CHUNK_SIZE = 20
+STALE_AFTER = 300
+MAX_ERRORS = 50
+
+UNIQUE_IMAGE_POOL = [
+    'https://images.unsplash.com/photo-1545324418-cc1a3fa10c00?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1502672260266-1c1ef2d93688?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1560448204-e02f11c3d0e2?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1570129477492-45c003edd2be?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1582268611958-ebfd161ef9cf?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1600585154340-be6161a56a0c?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1486406146926-c627a92ad1ab?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1560472354-b33ff0c44a43?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1497366216548-37526070297c?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1500382017468-9049fed747ef?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1500534314209-a25ddb2bd429?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1506905925346-21bda4d32df4?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1522708323590-d24dbb6b0267?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1564013799919-ab600027ffc6?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1481026469463-66327c86e544?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1442544213729-6a15f1611937?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1449824913935-59a10b8d2000?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1518780664697-55e3ad937233?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1571896349842-33c89424de2d?w=800&h=600&fit=crop',
+    'https://images.unsplash.com/photo-1572120360610-d971b9d7767c?w=800&h=600&fit=crop',
+]
+
+PLACEHOLDER_URL = 'https://images.unsplash.com/photo-1560518883-ce09059eeffa?w=800&h=600&fit=crop'
+
+
+class LeaseLost(Exception):
+    """Another worker claimed the job while this one was processing it"""
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enqueue(action, property_ids, user=None):
+    """Queue a property action for the selected listings that still exist"""
+    ids = list(Property.objects.filter(id__in=property_ids).values_list('id', flat=True))
+    return ImageJob.objects.create(action=action, items=ids, total=len(ids), created_by=user)
+
+
+def enqueue_upload(property_ids, uploaded_files, user=None):
+    """
+    Queue attaching the uploaded images, spread over the listings, and
+    return (job or None, per-file results). Files streamed to storage by
+    ContentAddressedUploadHandler are used as they are; others are saved now.
+    """
+    ids = list(Property.objects.filter(id__in=property_ids).values_list('id', flat=True))
+    streamed = [uploaded_file.stored_name for uploaded_file in uploaded_files if hasattr(uploaded_file, 'stored_name')]
+    if not ids:
+        discard(streamed)
+        return None, [{'name': uploaded_file.name, 'status': 'skipped', 'reason': 'No property selected.'} for uploaded_file in uploaded_files]
+
+    field = PropertyImage._meta.get_field('image')
+    items = []
+    results = []
+    for i, uploaded_file in enumerate(uploaded_files):
+        # Validate file type
+        if not (uploaded_file.content_type or '').startswith('image/'):
+            results.append({'name': uploaded_file.name, 'status': 'skipped', 'reason': 'Not an image.'})
+            continue
+        name = getattr(uploaded_file, 'stored_name', None)
+        if name is None:
+            name = default_storage.save(field.generate_filename(None, uploaded_file.name), uploaded_file)
+        items.append([ids[i % len(ids)], name])
+        results.append({'name': uploaded_file.name, 'status': 'queued', 'property_id': ids[i % len(ids)], 'stored_as': name})
+
+    if not items:
+        return None, results
+    with transaction.atomic():
+        # Hold the files until the job has attached them to listings
+        file_refs.acquire([name for property_id, name in items])
+        job = ImageJob.objects.create(action='upload', items=items, total=len(items), created_by=user)
+    return job, results
+
+
+def discard(names):
+    """Delete streamed uploads that ended up unused and are not referenced elsewhere"""
+    referenced = set(StoredFile.objects.filter(name__in=names).values_list('name', flat=True))
+    for name in set(names) - referenced:
+        default_storage.delete(name)
+
+
+def claim(worker, stale_after=STALE_AFTER):
+    """Take the oldest queued job, or one abandoned by a dead worker; None when idle"""
+    now = timezone.now()
+    claimable = ImageJob.objects.filter(
+        Q(status='queued') | Q(status='running', heartbeat__lt=now - timedelta(seconds=stale_after))
+    ).order_by('date_created')
+
+    for pk, status, owner in claimable.values_list('pk', 'status', 'worker')[:10]:
+        # Only one worker's UPDATE can still match the row as it was read
+        claimed = ImageJob.objects.filter(pk=pk, status=status, worker=owner).update(
+            status='running', worker=worker, heartbeat=now,
+        )
+        if claimed:
+            return ImageJob.objects.get(pk=pk)
+    return None
+
+
+def release_lease(job):
+    """Put a job this worker is still holding back in the queue, e.g. on shutdown"""
+    ImageJob.objects.filter(pk=job.pk, worker=job.worker, status='running').update(status='queued', worker='')
+
+
+def run(job, chunk_size=CHUNK_SIZE):
+    """Process the remaining items of a claimed job; False if the job was taken over"""
+    handler = HANDLERS[job.action]
+
+    while job.position < job.total:
+        chunk = job.items[job.position:job.position + chunk_size]
+        try:
+            # Downloads, decoding and derivatives happen here, outside the transaction
+            write = handler(chunk)
+            with transaction.atomic():
+                errors = write()
+                job.position += len(chunk)
+                job.failed += len(errors)
+                job.done += len(chunk) - len(errors)
+                job.errors = (job.errors + errors)[-MAX_ERRORS:]
+                job.heartbeat = timezone.now()
+                # Progress is committed with the chunk, and only while this worker holds the job
+                updated = ImageJob.objects.filter(pk=job.pk, worker=job.worker, status='running').update(
+                    position=job.position, done=job.done, failed=job.failed,
+                    errors=job.errors, heartbeat=job.heartbeat, date_updated=job.heartbeat,
+                )
+                if not updated:
+                    raise LeaseLost
+        except LeaseLost:
+            return False
+        except Exception as e:
+            job.errors = (job.errors + [f'Job stopped: {e}'])[-MAX_ERRORS:]
+            finish(job, 'failed')
+            return True
+
+    finish(job, 'done')
+    return True
+
+
+def finish(job, status):
+    with transaction.atomic():
+        updated = ImageJob.objects.filter(pk=job.pk, worker=job.worker, status='running').update(
+            status=status, errors=job.errors, date_updated=timezone.now(),
+        )
+        if updated and job.action == 'upload':
+            # Drop the hold taken at enqueue time; attached files keep their own references
+            file_refs.release([name for property_id, name in job.items], hook=images.delete)
+    job.status = status
+
+
+def progress(job):
+    """JSON-serialisable state of a job for the polling endpoint"""
+    finished = job.status in ('done', 'failed')
+    if job.status == 'queued':
+        message = f'Waiting for a worker ({job.total} items).'
+    elif not finished:
+        message = f'Processed {job.position} of {job.total} items.'
+    else:
+        message = f'{job.get_action_display()}: {job.done} succeeded, {job.failed} failed.'
+    return {
+        'id': job.pk,
+        'action': job.action,
+        'status': job.status,
+        'finished': finished,
+        'total': job.total,
+        'done': job.done,
+        'failed': job.failed,
+        'errors': job.errors[-10:],
+        'message': message,
+    }
+
+
+def _properties(ids):
+    found = Property.objects.in_bulk(ids)
+    return [(property_id, found.get(property_id)) for property_id in ids]
+
+
+def _prepare_image(name, source=None):
+    """
+    Hash a stored image and write its derivatives, the slow part of attaching
+    it to a listing; return the PropertyImage field values recording both.
+    """
+    field_file = PropertyImage(image=name).image
+    try:
+        if source is None:
+            source = images.load(field_file)
+        prepared = {'image': name, 'phash': duplicates.dhash(source)}
+        if images.generate_on_upload():
+            images.generate(field_file, source=source)
+            prepared['has_derivatives'] = True
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # Unreadable; pages fall back to the original file
+        return {'image': name}
+    return prepared
+
+
+def _attach(property_obj, caption, prepared):
+    """Save a prepared image as the listing's primary one; the save signals find the work done"""
+    property_image = PropertyImage.objects.create(property=property_obj, caption=caption, is_primary=True, **prepared)
+    if property_image.phash is not None:
+        duplicates.index.add(property_image.phash, property_image.pk, property_image.property_id)
+
+
+def assign_unique(chunk):
+    """Replace each listing's images with one downloaded stock photo"""
+    errors = []
+    properties = _properties(chunk)
+    # Stable per listing, so a resumed chunk picks the same photos
+    plan = [(property_id, property_obj, UNIQUE_IMAGE_POOL[property_id % len(UNIQUE_IMAGE_POOL)]) for property_id, property_obj in properties]
+    downloads = get_fetcher().fetch_many(image_url for property_id, property_obj, image_url in plan if property_obj)
+
+    field = PropertyImage._meta.get_field('image')
+    ready = []
+    for property_id, property_obj, image_url in plan:
+        if property_obj is None:
+            errors.append(f'Property {property_id} no longer exists.')
+            continue
+        content = downloads[image_url]
+        if isinstance(content, Exception):
+            errors.append(f'{property_obj.title}: {str(content)[:100]}')
+            continue
+        filename = f"admin_bulk_{property_obj.id}_{uuid.uuid4().hex[:8]}.jpg"
+        name = default_storage.save(field.generate_filename(None, filename), ContentFile(content))
+        ready.append((property_obj, _prepare_image(name)))
+
+    def write():
+        for property_obj, prepared in ready:
+            # Remove existing images
+            property_obj.images.all().delete()
+            _attach(property_obj, f"Professional image for {property_obj.title}", prepared)
+        return errors
+    return write
+
+
+def assign_placeholder(chunk):
+    """Give listings without images the placeholder photo"""
+    errors = []
+    field = PropertyImage._meta.get_field('image')
+    ready = []
+    for property_id, property_obj in _properties(chunk):
+        if property_obj is None:
+            errors.append(f'Property {property_id} no longer exists.')
+            continue
+        if property_obj.images.exists():
+            continue
+        try:
+            # Downloaded once, then served from the fetcher cache
+            content = get_fetcher().fetch(PLACEHOLDER_URL)
+        except Exception as e:
+            errors.append(f'{property_obj.title}: {str(e)[:100]}')
+            continue
+        filename = f"placeholder_{property_obj.id}_{uuid.uuid4().hex[:6]}.jpg"
+        name = default_storage.save(field.generate_filename(None, filename), ContentFile(content))
+        ready.append((property_obj, _prepare_image(name)))
+
+    def write():
+        for property_obj, prepared in ready:
+            # Checked again, in case images were added while the photo was prepared
+            if not property_obj.images.exists():
+                _attach(property_obj, f"Placeholder for {property_obj.title}", prepared)
+        return errors
+    return write
+
+
+def remove_all(chunk):
+    def write():
+        errors = []
+        for property_id, property_obj in _properties(chunk):
+            if property_obj is None:
+                errors.append(f'Property {property_id} no longer exists.')
+                continue
+            property_obj.images.all().delete()
+        return errors
+    return write
+
+
+def upload(chunk):
+    """Attach normalized copies of the files stored at enqueue time; a listing's first image becomes primary"""
+    errors = []
+    properties = dict(_properties({property_id for property_id, name in chunk}))
+
+    field = PropertyImage._meta.get_field('image')
+    ready = []
+    for property_id, name in chunk:
+        property_obj = properties[property_id]
+        if property_obj is None:
+            errors.append(f'Property {property_id} no longer exists.')
+            continue
+        try:
+            # The stored upload stays held by the job and is released when it finishes
+            with default_storage.open(name, 'rb') as handle:
+                normalized = images.normalize(handle, name)
+        except (OSError, images.InvalidImage) as e:
+            errors.append(f'{posixpath.basename(name)}: {e}')
+            continue
+        stored = default_storage.save(field.generate_filename(None, normalized.name), normalized)
+        ready.append((property_obj, _prepare_image(stored, normalized.image)))
+
+    def write():
+        # One query for the listings that already have a primary image
+        with_primary = set(
+            PropertyImage.objects.filter(property_id__in=properties, is_primary=True).values_list('property_id', flat=True)
+        )
+        new_images = []
+        for property_obj, prepared in ready:
+            new_images.append(PropertyImage(
+                property=property_obj,
+                caption=f"Uploaded image for {property_obj.title}",
+                is_primary=property_obj.pk not in with_primary,
+                **prepared,
+            ))
+            with_primary.add(property_obj.pk)
+        new_images = PropertyImage.objects.bulk_create(new_images)
+
+        # bulk_create() skips the post_save handlers, so do their work here
+        file_refs.acquire([image.image.name for image in new_images])
+        Property.refresh_primary_images({image.property_id for image in new_images})
+        for image in new_images:
+            if image.phash is not None:
+                duplicates.index.add(image.phash, image.pk, image.property_id)
+        return errors
+    return write
+
+
+HANDLERS = {
+    'assign_unique': assign_unique,
+    'remove_all': remove_all,
+    'assign_placeholder': assign_placeholder,
+    'upload': upload,
+}
@@ -0,0 +1,112 @@
+"""
+Approve or reject many SellerKYC submissions at once.
+
+decide() loads the requested rows in one query and, inside one
+transaction, writes status, remarks, verified_by and date_verified and
+clears the review lease (one UPDATE per group of rows given the same
+decision and remarks, and bulk_update() for the rest), sets the affected sellers' is_verified
+flags with one UPDATE per BATCH_SIZE rows and adjusts the status
+counters. None of these send save signals, so the counter deltas are
+applied here (see safeestate/counters.py); the document fields are not
+touched, so nothing else derived from a KYC changes.
+
+Every requested id gets a result: the new status, ``'remarks_updated'``
+when the KYC already had it but is given new remarks, ``'unchanged'``
+when it had both, ``'not_found'`` or ``'invalid'`` for an unknown action.
+"""
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from accounts.models import CustomUser, SellerKYC
+from safeestate import counters
+
+DECISIONS = ('approved', 'rejected')
+UPDATED_FIELDS = ['status', 'remarks', 'verified_by', 'date_verified', 'leased_by', 'lease_expires']
+# Sellers per is_verified UPDATE, keeping its parameters under SQLite's limit
+BATCH_SIZE = 450
+
+
+def decide(decisions, reviewer, remarks=''):
+    """
+    Apply (kyc id, action) or (kyc id, action, remarks) decisions, where
+    action is 'approved' or 'rejected'; return [{'id', 'result'}] in order.
+    """
+    requested = []
+    for decision in decisions:
+        pk, action, *rest = decision
+        requested.append((pk, action, rest[0] if rest else remarks))
+
+    results = {}
+    now = timezone.now()
+    prefix, fields = counters.COUNTED_FIELDS['accounts.sellerkyc']
+    with transaction.atomic():
+        ids = [pk for pk, action, note in requested if action in DECISIONS]
+        # Write before reading, like kyc_queue.lease_next(): the first write takes SQLite's
+        # write lock, where a read lock would have to be upgraded later and can fail at once
+        # with "database is locked"; elsewhere it locks the rows as select_for_update() would
+        for start in range(0, len(ids), BATCH_SIZE):
+            SellerKYC.objects.filter(pk__in=ids[start:start + BATCH_SIZE]).update(status=F('status'))
+        kycs = SellerKYC.objects.only('pk', 'seller_id', 'status', 'remarks').in_bulk(ids)
+
+        changed = {}
+        deltas = {}
+        for pk, action, note in requested:
+            if action not in DECISIONS:
+                results[pk] = 'invalid'
+                continue
+            kyc = kycs.get(pk)
+            if kyc is None:
+                results[pk] = 'not_found'
+                continue
+            if pk in changed:
+                # A second decision on the same row in one batch is not applied
+                continue
+            if kyc.status == action:
+                if not note or note == kyc.remarks:
+                    results[pk] = 'unchanged'
+                    continue
+                # The same decision again, with remarks to record; the counters stay as they are
+                results[pk] = 'remarks_updated'
+            else:
+                for name in counters.counter_names(prefix, fields, {'status': kyc.status})[1:]:
+                    deltas[name] = deltas.get(name, 0) - 1
+                for name in counters.counter_names(prefix, fields, {'status': action})[1:]:
+                    deltas[name] = deltas.get(name, 0) + 1
+                results[pk] = action
+            kyc.status = action
+            kyc.remarks = note
+            kyc.verified_by = reviewer
+            kyc.date_verified = now
+            # Decided, so off the review queue (see kyc_queue)
+            kyc.leased_by = None
+            kyc.lease_expires = None
+            changed[pk] = kyc
+
+        rows = list(changed.values())
+        # Rows decided alike differ only in their ids, so each such group is one plain
+        # UPDATE; bulk_update() builds a CASE over every row for each of the fields,
+        # which is only worth it for rows with remarks of their own
+        groups = {}
+        for kyc in rows:
+            groups.setdefault((kyc.status, kyc.remarks), []).append(kyc)
+        singles = []
+        for (status, note), group in groups.items():
+            if len(group) == 1:
+                singles.extend(group)
+                continue
+            for start in range(0, len(group), BATCH_SIZE):
+                SellerKYC.objects.filter(pk__in=[kyc.pk for kyc in group[start:start + BATCH_SIZE]]).update(
+                    status=status, remarks=note, verified_by=reviewer, date_verified=now,
+                    leased_by=None, lease_expires=None,
+                )
+        SellerKYC.objects.bulk_update(singles, UPDATED_FIELDS)
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            approved = [kyc.seller_id for kyc in batch if kyc.status == 'approved']
+            CustomUser.objects.filter(pk__in=[kyc.seller_id for kyc in batch]).update(
+                is_verified=Case(When(pk__in=approved, then=Value(True)), default=Value(False)),
+            )
+        counters.apply_deltas(deltas)
+
+    return [{'id': pk, 'result': results[pk]} for pk in dict.fromkeys(pk for pk, action, note in requested)]
@@ -0,0 +1,79 @@
+"""
+Hand pending SellerKYC submissions to reviewers one at a time.
+
+lease_next() gives a reviewer the most urgent pending KYC nobody else is
+working on: complete submissions before incomplete ones, then the oldest
+first. The row is claimed with one conditional UPDATE, which sets
+leased_by and lease_expires only while the KYC is still pending and its
+lease is free or expired. Reviewers pulling at the same time therefore
+get different rows without holding locks: on SQLite the UPDATEs simply
+run one after another, and elsewhere whoever loses the race updates no
+row and tries again with a fresh candidate.
+
+A reviewer holds one lease at a time. Taking the next KYC gives the
+previous one back, deciding a KYC clears its lease (see kyc_decisions),
+and a lease left alone lapses after KYC_LEASE_TIMEOUT, so abandoned work
+returns to the queue by itself.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Subquery
+from django.utils import timezone
+
+from accounts.models import SellerKYC
+
+LEASE_TIMEOUT = timedelta(minutes=15)
+# Lost races before giving up; only reached when every candidate is claimed under us
+ATTEMPTS = 10
+
+
+def lease_timeout():
+    return getattr(settings, 'KYC_LEASE_TIMEOUT', LEASE_TIMEOUT)
+
+
+def is_free(now):
+    return Q(lease_expires__isnull=True) | Q(lease_expires__lte=now)
+
+
+def queue(now=None):
+    """Pending KYCs nobody is working on, most urgent first"""
+    now = now or timezone.now()
+    return SellerKYC.objects.filter(is_free(now), status='pending').order_by('missing_count', 'date_submitted', 'pk')
+
+
+def lease_next(reviewer, skip=()):
+    """
+    Lease the next KYC in the queue to the reviewer, giving back the one
+    they held, and return it; None when nothing is left. KYCs in ``skip``
+    are passed over.
+    """
+    for attempt in range(ATTEMPTS):
+        now = timezone.now()
+        candidates = queue(now).exclude(pk__in=skip)
+        with transaction.atomic():
+            # Writing first takes SQLite's write lock up front, so the transaction never has to upgrade
+            SellerKYC.objects.filter(leased_by=reviewer).update(leased_by=None, lease_expires=None)
+            leased = SellerKYC.objects.filter(
+                is_free(now), status='pending', pk=Subquery(candidates.values('pk')[:1]),
+            ).update(leased_by=reviewer, lease_expires=now + lease_timeout())
+            if leased:
+                return SellerKYC.objects.select_related('seller').get(leased_by=reviewer)
+        if not candidates.exists():
+            return None
+    return None
+
+
+def renew(kyc, reviewer):
+    """Extend the reviewer's lease on a KYC; False if they no longer hold it"""
+    expires = timezone.now() + lease_timeout()
+    renewed = SellerKYC.objects.filter(pk=kyc.pk, leased_by=reviewer, status='pending').update(lease_expires=expires)
+    if renewed:
+        kyc.lease_expires = expires
+    return bool(renewed)
+
+
+def release(kyc, reviewer):
+    """Give a KYC back to the queue, if the reviewer holds it"""
+    SellerKYC.objects.filter(pk=kyc.pk, leased_by=reviewer).update(leased_by=None, lease_expires=None)
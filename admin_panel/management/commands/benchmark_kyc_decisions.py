@@ -0,0 +1,99 @@
+"""
+Time bulk KYC decisions against deciding the same number one at a time.
+
+Synthetic sellers with pending KYCs are created inside a transaction that
+is rolled back afterwards, so the command can be run against a development
+database without leaving data behind. "one by one" repeats what the KYC
+detail page used to do per submission: load it, save() it and save() its
+seller; "bulk" passes every decision to kyc_decisions.decide(), once with
+shared remarks and once with remarks of their own. Half of the decisions
+are approvals and half rejections.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser, SellerKYC
+from admin_panel import kyc_decisions
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark bulk KYC approval/rejection against per-row saves'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--decisions', type=int, default=1000, help='Number of KYCs decided by each method')
+
+    def handle(self, *args, **options):
+        count = options['decisions']
+        try:
+            with transaction.atomic():
+                reviewer = CustomUser.objects.create_user('kyc-benchmark-admin', role='admin')
+                one_by_one = self.seed('one', count)
+                bulk = self.seed('bulk', count)
+                noted = self.seed('noted', count)
+
+                elapsed, queries = self.measure(lambda: self.decide_one_by_one(one_by_one, reviewer))
+                self.report('one by one', elapsed, queries)
+                elapsed, queries = self.measure(lambda: kyc_decisions.decide(
+                    [(pk, self.action(i)) for i, pk in enumerate(bulk)], reviewer, 'Benchmark',
+                ))
+                self.report('bulk', elapsed, queries)
+                elapsed, queries = self.measure(lambda: kyc_decisions.decide(
+                    [(pk, self.action(i), f'Benchmark {i}') for i, pk in enumerate(noted)], reviewer,
+                ))
+                self.report('bulk, own remarks', elapsed, queries)
+
+                decided = SellerKYC.objects.filter(pk__in=bulk).exclude(status='pending').count()
+                verified = CustomUser.objects.filter(kyc__pk__in=bulk, is_verified=True).count()
+                self.stdout.write(f'{decided} bulk decisions stored, {verified} sellers verified')
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, label, count):
+        sellers = CustomUser.objects.bulk_create([
+            CustomUser(username=f'kyc-benchmark-{label}-{i}', role='seller', password='!') for i in range(count)
+        ])
+        kycs = SellerKYC.objects.bulk_create([
+            SellerKYC(seller=seller, pan_card=f'kyc/pan/benchmark-{label}-{i}.pdf', missing_count=5, documents_mask=1)
+            for i, seller in enumerate(sellers)
+        ])
+        return [kyc.pk for kyc in kycs]
+
+    def action(self, i):
+        return kyc_decisions.DECISIONS[i % 2]
+
+    def decide_one_by_one(self, pks, reviewer):
+        for i, pk in enumerate(pks):
+            with transaction.atomic():
+                kyc = SellerKYC.objects.get(pk=pk)
+                kyc.status = self.action(i)
+                kyc.remarks = 'Benchmark'
+                kyc.verified_by = reviewer
+                kyc.date_verified = timezone.now()
+                kyc.save()
+                kyc.seller.is_verified = kyc.status == 'approved'
+                kyc.seller.save()
+
+    def report(self, label, elapsed, queries):
+        self.stdout.write(f'{label:<18} {elapsed * 1000:8.1f} ms, {queries} queries')
+
+    def measure(self, func):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+        return elapsed, queries
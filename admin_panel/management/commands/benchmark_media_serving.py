@@ -0,0 +1,86 @@
+"""
+Compare throughput of safeestate.media.serve_media() with Django's static
+serve view, which used to serve MEDIA_URL in development.
+
+Both views are called directly with RequestFactory requests for files of
+a few sizes written to a temporary MEDIA_ROOT, and every response body is
+read to the end, so the numbers cover the view and the copy of the file
+but not the network or the WSGI server. Conditional and range requests,
+which only serve_media() answers, are reported on their own.
+"""
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+from django.test import RequestFactory, override_settings
+from django.views.static import serve
+
+from safeestate.media import serve_media
+
+SIZES = (16 * 1024, 512 * 1024, 8 * 1024 * 1024)
+
+
+def consume(response):
+    if response.streaming:
+        total = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        total = len(response.content)
+    response.close()
+    return total
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the media serving view against the debug static handler'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=2.0, help='Time spent on each case; the median of three rounds is reported')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        location = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=location, MEDIA_ACCEL=None):
+                for size in SIZES:
+                    name = f'properties/{size:x}.jpg'
+                    os.makedirs(os.path.join(location, 'properties'), exist_ok=True)
+                    with open(os.path.join(location, name), 'wb') as handle:
+                        handle.write(os.urandom(size))
+
+                    def request(**headers):
+                        request = factory.get(f'/media/{name}', headers=headers)
+                        request.user = AnonymousUser()
+                        return request
+
+                    full = serve_media(request(), name)
+                    etag = full['ETag']
+                    consume(full)
+                    cases = [
+                        ('static.serve', lambda: serve(request(), name, document_root=location)),
+                        ('serve_media', lambda: serve_media(request(), name)),
+                        ('serve_media 304', lambda: serve_media(request(If_None_Match=etag), name)),
+                        ('serve_media range', lambda: serve_media(request(Range='bytes=0-65535'), name)),
+                    ]
+                    self.stdout.write(f'{filesizeformat(size)} file:')
+                    for label, view in cases:
+                        rate, throughput = self.measure(view, options['seconds'])
+                        self.stdout.write(f'  {label:>18}: {rate:9.0f} req/s, {filesizeformat(throughput)}/s')
+        finally:
+            shutil.rmtree(location)
+
+    def measure(self, view, seconds):
+        rounds = []
+        for _ in range(3):
+            count = transferred = 0
+            started = time.perf_counter()
+            deadline = started + seconds / 3
+            while time.perf_counter() < deadline:
+                transferred += consume(view())
+                count += 1
+            elapsed = time.perf_counter() - started
+            rounds.append((count / elapsed, transferred / elapsed))
+        return statistics.median(rate for rate, _ in rounds), statistics.median(throughput for _, throughput in rounds)
@@ -0,0 +1,280 @@
+"""
+Delete or quarantine media files that no model field points at.
+
+Every FileField/ImageField value in the database, plus the names held in
+admin_panel.StoredFile, is loaded once into a set of extension-less
+names; an image derivative counts as referenced when its original does.
+MEDIA_ROOT is then walked one directory at a time on a thread pool with
+os.scandir, so memory grows with the number of referenced names and
+pending directories, never with the number of files. Files younger than
+--min-age are left alone, as they may belong to an upload in progress.
+
+A walk over millions of files takes long enough for an old orphan to be
+handed out again by ContentAddressedStorage.reuse() meanwhile. Reuse
+claims the StoredFile row and touches the file, so before anything is
+removed the candidates of each directory are checked again against
+StoredFile (one range query per directory) and their modification time.
+
+The directories still to visit are written to a checkpoint file every few
+seconds; an interrupted run picks up from there when started again with
+the same options. Re-visiting a directory is harmless.
+
+Chunked KYC uploads abandoned for longer than KYC_UPLOAD_EXPIRY are
+discarded first (see accounts/uploads.py), which drops the holds on their
+files so they are collected in the same run.
+"""
+import json
+import os
+import posixpath
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from django.template.defaultfilters import filesizeformat
+
+from accounts import uploads
+from admin_panel.models import StoredFile
+from properties import images
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_INTERVAL = 5
+DERIVATIVE_SUFFIXES = tuple(f'_{size}' for size in images.DERIVATIVE_SIZES)
+STAT_KEYS = ('directories', 'files', 'bytes', 'recent', 'orphans', 'orphan_bytes')
+
+
+def referenced_stems():
+    """Every stored file name without its extension, read in one pass per model"""
+    stems = set()
+    for model in apps.get_models():
+        fields = [field.attname for field in model._meta.concrete_fields if isinstance(field, models.FileField)]
+        if not fields:
+            continue
+        for row in model._base_manager.values_list(*fields).iterator(chunk_size=5000):
+            stems.update(posixpath.splitext(name)[0] for name in row if name)
+    # Files held by queued jobs are not attached to a row yet
+    stems.update(posixpath.splitext(name)[0] for name in StoredFile.objects.values_list('name', flat=True).iterator(chunk_size=5000))
+    return stems
+
+
+def stored_stems(relative, children):
+    """The StoredFile names that could reference files of one directory, without extensions"""
+    folder = posixpath.dirname(relative) if posixpath.basename(relative) == 'derivatives' else relative
+    if not folder:
+        names = StoredFile.objects.filter(name__in=children)
+    else:
+        # Every name under folder/: '0' is the character after '/'
+        names = StoredFile.objects.filter(name__gte=f'{folder}/', name__lt=f'{folder}0')
+    return {posixpath.splitext(name)[0] for name in names.values_list('name', flat=True)}
+
+
+def is_referenced(relative, stems):
+    stem = posixpath.splitext(relative)[0]
+    if stem in stems:
+        return True
+    folder, base = posixpath.split(stem)
+    if posixpath.basename(folder) == 'derivatives':
+        for suffix in DERIVATIVE_SUFFIXES:
+            if base.endswith(suffix):
+                return posixpath.join(posixpath.dirname(folder), base[:-len(suffix)]) in stems
+    return False
+
+
+class Command(BaseCommand):
+    help = 'Delete or quarantine media files that are not referenced by any model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+        parser.add_argument('--quarantine', metavar='DIR', help='Move orphans under DIR instead of deleting them')
+        parser.add_argument('--workers', type=int, default=8, help='Directories scanned in parallel')
+        parser.add_argument('--min-age', type=float, default=24, help='Hours since the last modification before a file may be removed')
+        parser.add_argument('--checkpoint', default=os.path.join(tempfile.gettempdir(), 'safeestate-media-gc.json'), help='Progress file used to resume an interrupted run')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start from the top')
+        parser.add_argument('--list', metavar='FILE', help='Write the path of every orphan to FILE')
+
+    def handle(self, *args, **options):
+        self.root = os.path.abspath(settings.MEDIA_ROOT)
+        if not os.path.isdir(self.root):
+            raise CommandError(f'MEDIA_ROOT {self.root} does not exist.')
+        self.action = 'report' if options['dry_run'] else 'quarantine' if options['quarantine'] else 'delete'
+        self.quarantine = os.path.abspath(options['quarantine']) if options['quarantine'] else None
+        if self.quarantine and os.path.commonpath([self.quarantine, self.root]) == self.root:
+            # Anything under MEDIA_ROOT can be served, and KYC documents are only protected at kyc/
+            raise CommandError('The quarantine directory must be outside MEDIA_ROOT.')
+        self.checkpoint = options['checkpoint']
+        # Never treat the command's own files as orphans
+        self.own_files = {os.path.abspath(path) for path in (self.checkpoint, options['list']) if path}
+
+        state = None if options['restart'] else self.load_checkpoint()
+        if state:
+            self.stdout.write(f'Resuming from {self.checkpoint}: {len(state["pending"])} directories left.')
+        else:
+            state = {'version': CHECKPOINT_VERSION, 'action': self.action, 'pending': [''], 'stats': {}, 'cutoff': time.time() - options['min_age'] * 3600}
+        self.cutoff = state['cutoff']
+        stats = state['stats']
+
+        if self.action != 'report':
+            expired = uploads.expire()
+            if expired:
+                self.stdout.write(f'{expired} abandoned KYC uploads discarded')
+
+        started = time.perf_counter()
+        self.stems = referenced_stems()
+        self.stdout.write(f'{len(self.stems)} referenced files loaded in {time.perf_counter() - started:.1f}s')
+
+        self.list_lock = threading.Lock()
+        self.listing = open(options['list'], 'a') if options['list'] else None
+        try:
+            self.walk(deque(state['pending']), stats, options['workers'])
+        finally:
+            if self.listing:
+                self.listing.close()
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        self.report(stats)
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint) as handle:
+                state = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if state.get('version') != CHECKPOINT_VERSION or state.get('action') != self.action:
+            self.stderr.write(f'Ignoring {self.checkpoint}: it was written by a run with different options.')
+            return None
+        return state
+
+    def save_checkpoint(self, pending, stats):
+        state = {'version': CHECKPOINT_VERSION, 'action': self.action, 'pending': pending, 'stats': stats, 'cutoff': self.cutoff}
+        directory = os.path.dirname(os.path.abspath(self.checkpoint))
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as handle:
+            json.dump(state, handle)
+        os.replace(temp_path, self.checkpoint)
+
+    def walk(self, pending, stats, workers):
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                self.drain(executor, pending, in_flight, stats, workers)
+            except BaseException:
+                # Interrupted or failed: keep what is left for the next run
+                self.save_checkpoint(list(in_flight.values()) + list(pending), stats)
+                raise
+
+    def drain(self, executor, pending, in_flight, stats, workers):
+        saved = time.monotonic()
+        while pending or in_flight:
+            # Keep a bounded number of directories queued on the pool
+            while pending and len(in_flight) < workers * 2:
+                relative = pending.popleft()
+                in_flight[executor.submit(self.scan, relative)] = relative
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                subdirectories, counts, candidates = future.result()
+                relative = in_flight.pop(future)
+                pending.extend(subdirectories)
+                if candidates:
+                    self.collect(relative, candidates, counts)
+                for folder, values in counts.items():
+                    totals = stats.setdefault(folder, dict.fromkeys(STAT_KEYS, 0))
+                    for key, value in values.items():
+                        totals[key] += value
+            if time.monotonic() - saved >= CHECKPOINT_INTERVAL:
+                # Directories still being scanned are redone after a restart
+                self.save_checkpoint(list(in_flight.values()) + list(pending), stats)
+                saved = time.monotonic()
+
+    def scan(self, relative):
+        """
+        List the files of one directory; return (subdirectories, {top folder:
+        counts}, [(name, path, size)] of files that look orphaned)
+        """
+        path = os.path.join(self.root, relative)
+        subdirectories = []
+        counts = {}
+        candidates = []
+        try:
+            entries = os.scandir(path)
+        except FileNotFoundError:
+            # Removed since it was listed
+            return subdirectories, counts, candidates
+        with entries:
+            for entry in entries:
+                child = posixpath.join(relative, entry.name) if relative else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(child)
+                    continue
+                if not entry.is_file(follow_symlinks=False) or entry.path in self.own_files:
+                    continue
+
+                folder = child.split('/', 1)[0] if '/' in child else '.'
+                values = counts.setdefault(folder, dict.fromkeys(STAT_KEYS, 0))
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                values['files'] += 1
+                values['bytes'] += stat.st_size
+                if is_referenced(child, self.stems):
+                    continue
+                if stat.st_mtime > self.cutoff:
+                    values['recent'] += 1
+                    continue
+                candidates.append((child, entry.path, stat.st_size))
+        counts.setdefault('.' if not relative else relative.split('/', 1)[0], dict.fromkeys(STAT_KEYS, 0))['directories'] += 1
+        return subdirectories, counts, candidates
+
+    def collect(self, relative, candidates, counts):
+        """Remove the candidates of one directory that are still unreferenced and old"""
+        stems = stored_stems(relative, [child for child, path, size in candidates])
+        for child, path, size in candidates:
+            values = counts[child.split('/', 1)[0] if '/' in child else '.']
+            if is_referenced(child, stems):
+                continue
+            try:
+                if os.stat(path).st_mtime > self.cutoff:
+                    values['recent'] += 1
+                    continue
+            except FileNotFoundError:
+                continue
+            values['orphans'] += 1
+            values['orphan_bytes'] += size
+            self.remove(child, path)
+
+    def remove(self, relative, path):
+        if self.listing:
+            with self.list_lock:
+                self.listing.write(relative + '\n')
+        try:
+            if self.action == 'delete':
+                os.remove(path)
+            elif self.action == 'quarantine':
+                target = os.path.join(self.quarantine, relative)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+        except FileNotFoundError:
+            # Removed by someone else in the meantime
+            pass
+
+    def report(self, stats):
+        verb = {'report': 'Would remove', 'delete': 'Deleted', 'quarantine': f'Moved to {self.quarantine}'}[self.action]
+        for folder, values in sorted(stats.items()):
+            if not values['files']:
+                continue
+            self.stdout.write(
+                f'  {folder}: {values["files"]} files ({filesizeformat(values["bytes"])}), '
+                f'{values["orphans"]} orphaned ({filesizeformat(values["orphan_bytes"])}), {values["recent"]} too recent to judge'
+            )
+        orphans = sum(values['orphans'] for values in stats.values())
+        orphan_bytes = sum(values['orphan_bytes'] for values in stats.values())
+        directories = sum(values['directories'] for values in stats.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {directories} directories. {verb} {orphans} orphaned files ({filesizeformat(orphan_bytes)}).'
+        ))
@@ -0,0 +1,115 @@
+"""
+Move existing uploads to content-addressed names and drop duplicate copies.
+
+Every file referenced by a field in admin_panel.file_refs.TRACKED_FIELDS
+is hashed once; rows are repointed at ``<folder>/<xx>/<sha256><ext>``,
+which is written only once per distinct content. Image derivatives are
+moved along with their originals. The StoredFile reference counts are
+then rebuilt and the old, now unreferenced files deleted.
+"""
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+
+from admin_panel import file_refs
+from properties import images
+from safeestate.storage import content_name, is_content_name, sha256_of
+
+
+class Command(BaseCommand):
+    help = 'Collapse byte-identical media files into single content-addressed copies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be reclaimed without changing anything')
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        dry_run = options['dry_run']
+        if not hasattr(storage, 'save_exact'):
+            raise CommandError('The default storage is not content-addressed; see STORAGES in settings.')
+
+        targets, sizes, updates, missing = self.hash_files(storage)
+
+        # One copy per distinct content
+        sources = {}
+        for name, target in targets.items():
+            sources.setdefault(target, name)
+        new_blobs = {target: name for target, name in sources.items() if not storage.exists(target)}
+
+        # Generated image copies follow their original
+        derivative_moves = {}
+        image_model = apps.get_model('properties.propertyimage')
+        with_derivatives = set(image_model.objects.filter(has_derivatives=True).values_list('image', flat=True))
+        for name in with_derivatives & set(targets):
+            for old, new in zip(images.derivative_names(name), images.derivative_names(targets[name])):
+                if new not in derivative_moves and storage.exists(old) and not storage.exists(new):
+                    derivative_moves[new] = old
+        old_derivatives = [
+            derivative for name in targets for derivative in images.derivative_names(name)
+            if storage.exists(derivative)
+        ]
+
+        removed = sum(sizes.values()) + sum(storage.size(name) for name in old_derivatives)
+        added = sum(sizes[name] for name in new_blobs.values()) + sum(storage.size(old) for old in derivative_moves.values())
+        self.stdout.write(
+            f'{len(targets)} files hashed, {len(sources)} distinct, '
+            f'{len(targets) - len(sources)} duplicates, {len(missing)} missing'
+        )
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f'Would reclaim {filesizeformat(removed - added)}.'))
+            return
+
+        for target, name in new_blobs.items():
+            with storage.open(name, 'rb') as handle:
+                storage.save_exact(target, handle)
+        for new, old in derivative_moves.items():
+            with storage.open(old, 'rb') as handle:
+                storage.save_exact(new, handle)
+
+        with transaction.atomic():
+            for (label, field, target), pks in updates.items():
+                apps.get_model(label).objects.filter(pk__in=pks).update(**{field: target})
+            # Rows whose copies could not be carried over get them regenerated later
+            incomplete = [
+                target for target in {targets[name] for name in with_derivatives & set(targets)}
+                if not all(storage.exists(name) for name in images.derivative_names(target))
+            ]
+            image_model.objects.filter(image__in=incomplete).update(has_derivatives=False)
+            file_refs.reconcile(storage)
+
+        # Nothing points at the old names any more
+        for name in [*targets, *old_derivatives]:
+            storage.delete(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Repointed {sum(len(pks) for pks in updates.values())} fields and reclaimed {filesizeformat(removed - added)}.'
+        ))
+
+    def hash_files(self, storage):
+        """Return ({old name: target}, {old name: size}, {(label, field, target): [pk]}, missing names)"""
+        targets = {}
+        sizes = {}
+        updates = defaultdict(list)
+        missing = set()
+
+        for label, fields in file_refs.TRACKED_FIELDS.items():
+            model = apps.get_model(label)
+            for pk, *names in model.objects.values_list('pk', *fields).iterator():
+                for field, name in zip(fields, names):
+                    if not name or is_content_name(name) or name in missing:
+                        continue
+                    if name not in targets:
+                        try:
+                            with storage.open(name, 'rb') as handle:
+                                targets[name] = content_name(name, sha256_of(handle))
+                            sizes[name] = storage.size(name)
+                        except OSError:
+                            missing.add(name)
+                            continue
+                    updates[(label, field, targets[name])].append(pk)
+
+        return targets, sizes, updates, missing
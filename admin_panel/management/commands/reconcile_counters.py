@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from safeestate import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the maintained listing and dashboard counters from the source tables'
+
+    def handle(self, *args, **options):
+        total = counters.reconcile()
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {total} counters.'))
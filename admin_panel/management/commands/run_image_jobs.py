@@ -0,0 +1,46 @@
+"""
+Worker for the bulk image jobs queued from the admin image page.
+
+Run one or more of these next to the web server; each claims queued jobs
+(and jobs left behind by a worker that died) and processes them chunk by
+chunk, see admin_panel.jobs.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from admin_panel import jobs
+
+
+class Command(BaseCommand):
+    help = 'Process queued bulk property image jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once no job is waiting instead of polling')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds to wait between checks for new jobs')
+        parser.add_argument('--chunk-size', type=int, default=jobs.CHUNK_SIZE, help='Items committed per progress update')
+        parser.add_argument('--stale-after', type=int, default=jobs.STALE_AFTER, help='Seconds without a heartbeat before a running job is taken over')
+
+    def handle(self, *args, **options):
+        worker = jobs.worker_name()
+        self.stdout.write(f'Worker {worker} started.')
+
+        while True:
+            job = jobs.claim(worker, stale_after=options['stale_after'])
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll'])
+                continue
+
+            self.stdout.write(f'{job}: resuming at item {job.position} of {job.total}.' if job.position else f'{job}: started.')
+            try:
+                finished = jobs.run(job, chunk_size=options['chunk_size'])
+            except KeyboardInterrupt:
+                # Let the next worker pick it up from the last committed chunk
+                jobs.release_lease(job)
+                raise
+            if finished:
+                self.stdout.write(self.style.SUCCESS(f'{job}: {job.done} succeeded, {job.failed} failed.'))
+            else:
+                self.stdout.write(self.style.WARNING(f'{job}: taken over by another worker.'))
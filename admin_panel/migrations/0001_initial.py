@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:19
+
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    from safeestate.counters import COUNTED_FIELDS, compute_counts
+
+    Counter = apps.get_model('admin_panel', 'Counter')
+    counts = compute_counts({label: apps.get_model(label) for label in COUNTED_FIELDS})
+    Counter.objects.bulk_create([Counter(name=name, value=value) for name, value in counts.items()])
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0004_alter_sellerkyc_aadhaar_card_and_more'),
+        ('properties', '0004_property_primary_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:58
+
+from django.db import migrations, models
+
+
+def populate_stored_files(apps, schema_editor):
+    from admin_panel.file_refs import TRACKED_FIELDS, compute_refs, file_size
+
+    StoredFile = apps.get_model('admin_panel', 'StoredFile')
+    refs = compute_refs({label: apps.get_model(label) for label in TRACKED_FIELDS})
+    StoredFile.objects.bulk_create([
+        StoredFile(name=name, ref_count=count, size=file_size(name)) for name, count in refs.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_alter_sellerkyc_aadhaar_card_and_more'),
+        ('admin_panel', '0001_initial'),
+        ('properties', '0008_propertyimage_has_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_stored_files, migrations.RunPython.noop),
+    ]
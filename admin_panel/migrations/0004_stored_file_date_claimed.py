@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0003_image_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedfile',
+            name='date_claimed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
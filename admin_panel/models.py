@@ -1,4 +1,66 @@
 from django.db import models
+from django.conf import settings
 
 # Admin panel uses existing models from accounts and properties apps
 # This file is kept for future admin-specific models if needed
+
+
+class Counter(models.Model):
+    """Named running total maintained by safeestate.counters"""
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f'{self.name} = {self.value}'
+
+
+class StoredFile(models.Model):
+    """Media file with the number of model fields pointing at it, see admin_panel.file_refs"""
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    # Set while an upload that reuses the file is being saved, see file_refs.claim()
+    date_claimed = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f'{self.name} ({self.ref_count} refs)'
+
+
+class ImageJob(models.Model):
+    """Bulk property image operation run by the run_image_jobs worker, see admin_panel.jobs"""
+    ACTION_CHOICES = [
+        ('assign_unique', 'Assign unique images'),
+        ('remove_all', 'Remove all images'),
+        ('assign_placeholder', 'Assign placeholder images'),
+        ('upload', 'Upload images'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # Property ids, or [property id, stored file name] pairs for uploads
+    items = models.JSONField(default=list)
+    position = models.PositiveIntegerField(default=0, help_text='Number of items already processed')
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list)
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='image_jobs')
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_updated = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['date_created']
+        indexes = [
+            models.Index(fields=['status', 'date_created'], name='image_job_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.get_action_display()} #{self.pk} ({self.status})'
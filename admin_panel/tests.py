@@ -1,3 +1,628 @@
-from django.test import TestCase
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, connections
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from accounts.models import CustomUser, SellerKYC
+from properties import duplicates, images
+from properties.models import Property, PropertyImage
+from safeestate import counters
+from safeestate.fetcher import ImageFetcher
+from safeestate.storage import is_content_name
+from .management.commands import collect_orphaned_media
+from .models import ImageJob, StoredFile
+from . import jobs, kyc_decisions, kyc_queue
+
+
+class CounterTests(TestCase):
+    def snapshot(self):
+        return counters.get_values(self.names)
+
+    def test_signals_match_reconcile(self):
+        self.names = [
+            'users', 'users:role:seller', 'users:role:buyer',
+            'properties', 'properties:status:available', 'properties:status:sold',
+            'properties:state:goa', 'properties:type:flat', 'properties:type:house',
+            'kycs', 'kycs:status:pending', 'kycs:status:approved',
+        ]
+        seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        CustomUser.objects.create_user('buyer', password='pass', role='buyer')
+        listing = Property.objects.create(
+            title='Beach flat', description='Sea view', price=100, property_type='flat',
+            state='goa', city='Panaji', pincode='403001', address='Miramar', area=800, seller=seller,
+        )
+        Property.objects.create(
+            title='Hill house', description='Pine view', price=200, property_type='house',
+            state='goa', city='Mapusa', pincode='403507', address='Hill road', area=1500, seller=seller,
+        )
+        kyc = SellerKYC.objects.create(seller=seller, pan_card='kyc/pan/pan.pdf')
+
+        listing = Property.objects.get(pk=listing.pk)
+        listing.status = 'sold'
+        listing.save()
+        kyc.status = 'approved'
+        kyc.save()
+        Property.objects.filter(property_type='house').delete()
+
+        maintained = self.snapshot()
+        self.assertEqual(maintained['properties'], 1)
+        self.assertEqual(maintained['properties:status:sold'], 1)
+        self.assertEqual(maintained['properties:status:available'], 0)
+        self.assertEqual(maintained['kycs:status:approved'], 1)
+
+        counters.reconcile()
+        self.assertEqual(self.snapshot(), maintained)
+
+    def test_failed_save_leaves_counters_unchanged(self):
+        self.names = ['users', 'users:role:seller']
+        before = self.snapshot()
+        apply_deltas = counters.apply_deltas
+
+        def apply_then_fail(deltas):
+            apply_deltas(deltas)
+            raise DatabaseError('disk I/O error')
+
+        with mock.patch.object(counters, 'apply_deltas', apply_then_fail):
+            with self.assertRaises(DatabaseError):
+                CustomUser.objects.create_user('seller', password='pass', role='seller')
+        self.assertFalse(CustomUser.objects.filter(username='seller').exists())
+        self.assertEqual(self.snapshot(), before)
+
+
+class ContentAddressedMediaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, PROPERTY_IMAGE_DERIVATIVES_ON_UPLOAD=False)
+        self.override.enable()
+        seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        self.listing = Property.objects.create(
+            title='Beach flat', description='Sea view', price=100, property_type='flat',
+            state='goa', city='Panaji', pincode='403001', address='Miramar', area=800, seller=seller,
+        )
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def add_image(self, name, content=b'same bytes'):
+        image = PropertyImage(property=self.listing)
+        image.image.save(name, ContentFile(content))
+        return image
+
+    def test_identical_uploads_share_one_counted_file(self):
+        first = self.add_image('a.jpg')
+        second = self.add_image('b.jpg')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(StoredFile.objects.get(name=first.image.name).ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(second.image.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(second.image.name))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_reused_file_survives_release_committing_before_acquire(self):
+        first = self.add_image('a.jpg')
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+
+        second = PropertyImage(property=self.listing)
+        second.image.save('b.jpg', ContentFile(b'same bytes'), save=False)
+        for callback in callbacks:
+            callback()
+        second.save()
+
+        self.assertTrue(default_storage.exists(second.image.name))
+        self.assertEqual(StoredFile.objects.get(name=second.image.name).ref_count, 1)
+
+    def test_dedupe_command_collapses_legacy_copies(self):
+        for name in ('properties/one.jpg', 'properties/two.jpg'):
+            os.makedirs(os.path.join(self.media_root, 'properties'), exist_ok=True)
+            with open(os.path.join(self.media_root, name), 'wb') as handle:
+                handle.write(b'x' * 1000)
+            PropertyImage.objects.create(property=self.listing, image=name)
+
+        output = StringIO()
+        call_command('dedupe_media', stdout=output)
+        self.assertIn('1 duplicates', output.getvalue())
+        self.assertIn('reclaimed 1000', output.getvalue())
+
+        names = set(PropertyImage.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertEqual(StoredFile.objects.get().ref_count, 2)
+        self.assertFalse(default_storage.exists('properties/one.jpg'))
+        self.assertTrue(default_storage.exists(names.pop()))
+
+
+class StandInImageHandler(BaseHTTPRequestHandler):
+    """Serves /image/<n>, fails /flaky twice with a 503 and 404s anything else"""
+    hits = {}
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.hits[self.path] = cls.hits.get(self.path, 0) + 1
+            hits = cls.hits[self.path]
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.active -= 1
+
+        if self.path.startswith('/image/') or (self.path == '/flaky' and hits > 2):
+            body = self.path.encode()
+            self.send_response(200)
+        elif self.path == '/flaky':
+            body = b'busy'
+            self.send_response(503)
+        else:
+            body = b'missing'
+            self.send_response(404)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ImageFetcherTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInImageHandler)
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StandInImageHandler.hits = {}
+        StandInImageHandler.max_active = 0
+        self.cache_dir = tempfile.mkdtemp()
+        self.fetcher = ImageFetcher(max_workers=8, per_host=3, backoff=0.01, cache_dir=self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_fetch_many_is_concurrent_bounded_and_cached(self):
+        urls = [f'{self.base_url}/image/{i % 10}' for i in range(30)]
+        results = self.fetcher.fetch_many(urls)
+        self.assertEqual(results[urls[3]], b'/image/3')
+        self.assertEqual(sum(StandInImageHandler.hits.values()), 10)
+        self.assertEqual(StandInImageHandler.max_active, 3)
+
+        # A fresh fetcher sharing the cache directory downloads nothing
+        ImageFetcher(cache_dir=self.cache_dir).fetch_many(urls)
+        self.assertEqual(sum(StandInImageHandler.hits.values()), 10)
+
+    def test_retries_transient_errors_and_reports_failures(self):
+        results = self.fetcher.fetch_many([f'{self.base_url}/flaky', f'{self.base_url}/gone'])
+        self.assertEqual(results[f'{self.base_url}/flaky'], b'/flaky')
+        self.assertEqual(StandInImageHandler.hits['/flaky'], 3)
+        self.assertIsInstance(results[f'{self.base_url}/gone'], Exception)
+        self.assertEqual(StandInImageHandler.hits['/gone'], 1)
+
+
+class ImageJobTests(TestCase):
+    def setUp(self):
+        # Drop what earlier tests loaded; their version counters were rolled back
+        duplicates.index.build()
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, PROPERTY_IMAGE_DERIVATIVES_ON_UPLOAD=False)
+        self.override.enable()
+        admin = CustomUser.objects.create_user('admin', password='pass', role='admin')
+        self.client.force_login(admin)
+        seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        self.listings = []
+        for i in range(3):
+            listing = Property.objects.create(
+                title=f'Flat {i}', description='Sea view', price=100, property_type='flat',
+                state='goa', city='Panaji', pincode='403001', address='Miramar', area=800, seller=seller,
+            )
+            PropertyImage(property=listing).image.save(f'{i}.jpg', ContentFile(f'image {i}'.encode()))
+            self.listings.append(listing)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_job_abandoned_by_dead_worker_resumes_from_cursor(self):
+        response = self.client.post(
+            reverse('admin_panel:bulk_assign_images'),
+            {'action': 'remove_all', 'property_ids': [listing.pk for listing in self.listings]},
+            content_type='application/json',
+        )
+        job = ImageJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual((job.status, job.total), ('queued', 3))
+        self.assertEqual(PropertyImage.objects.count(), 3)
+
+        # A worker finished the first item, then stopped sending heartbeats
+        self.assertEqual(jobs.claim('dead').pk, job.pk)
+        ImageJob.objects.filter(pk=job.pk).update(position=1, done=1)
+        self.assertIsNone(jobs.claim('other'))
+        ImageJob.objects.filter(pk=job.pk).update(heartbeat=timezone.now() - timedelta(seconds=jobs.STALE_AFTER + 1))
+
+        output = StringIO()
+        call_command('run_image_jobs', once=True, chunk_size=1, stdout=output)
+        self.assertIn('resuming at item 1 of 3', output.getvalue())
+
+        status = self.client.get(reverse('admin_panel:image_job_status', args=[job.pk])).json()
+        self.assertEqual((status['status'], status['done'], status['failed']), ('done', 3, 0))
+        first = job.items[0]
+        self.assertEqual(list(PropertyImage.objects.values_list('property_id', flat=True)), [first])
+
+    def test_upload_streams_files_to_storage_before_the_worker_attaches_them(self):
+        listing = self.listings[0]
+        photo = BytesIO()
+        Image.new('RGB', (64, 48), 'teal').save(photo, 'JPEG')
+        response = self.client.post(reverse('admin_panel:bulk_assign_images'), {
+            'action': 'upload',
+            'property_ids': str(listing.pk),
+            'images': [
+                SimpleUploadedFile('front.JPG', photo.getvalue(), content_type='image/jpeg'),
+                SimpleUploadedFile('notes.txt', b'text', content_type='text/plain'),
+                SimpleUploadedFile('back.jpg', b'not really a photo', content_type='image/jpeg'),
+            ],
+        })
+        data = response.json()
+        self.assertEqual([result['status'] for result in data['files']], ['queued', 'skipped', 'queued'])
+        front = data['files'][0]['stored_as']
+        self.assertTrue(is_content_name(front))
+        self.assertTrue(front.endswith('.jpg'))
+        self.assertTrue(default_storage.exists(front))
+        self.assertEqual(StoredFile.objects.get(name=front).ref_count, 1)
+        self.assertFalse([name for name in os.listdir(os.path.join(self.media_root, 'properties')) if name.endswith('.part')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.run(jobs.claim('worker'))
+        job = ImageJob.objects.get(pk=data['job_id'])
+        self.assertEqual((job.done, job.failed), (1, 1))
+        self.assertEqual(listing.images.count(), 2)
+        # Nothing was primary before, so the upload becomes the primary image
+        listing.refresh_from_db()
+        attached = listing.primary_image.image.name
+        self.assertNotEqual(attached, front)
+        # Hashed before the chunk's transaction, and indexed with the row
+        self.assertIsNotNone(listing.primary_image.phash)
+        self.assertEqual(duplicates.index.near(listing.primary_image.phash, 0)[0][1], listing.primary_image.pk)
+        self.assertEqual(StoredFile.objects.get(name=attached).ref_count, 1)
+        # The raw uploads were only held by the job
+        self.assertFalse(default_storage.exists(front))
+        self.assertFalse(StoredFile.objects.filter(name=front).exists())
+
+
+    def test_upload_refused_by_csrf_leaves_no_files(self):
+        def stored():
+            return sorted(os.path.join(root, name) for root, dirs, names in os.walk(self.media_root) for name in names)
+
+        before = stored()
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(CustomUser.objects.get(username='admin'))
+        # The form's token only turns out to be wrong after the body, files included, is parsed
+        client.cookies['csrftoken'] = 'a' * 32
+        photo = BytesIO()
+        Image.new('RGB', (64, 48), 'olive').save(photo, 'JPEG')
+        response = client.post(reverse('admin_panel:bulk_assign_images'), {
+            'csrfmiddlewaretoken': 'b' * 32, 'action': 'upload', 'property_ids': str(self.listings[0].pk),
+            'images': [SimpleUploadedFile('front.jpg', photo.getvalue(), content_type='image/jpeg')],
+        })
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(stored(), before)
+
+class OrphanedMediaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        listing = Property.objects.create(
+            title='Beach flat', description='Sea view', price=100, property_type='flat',
+            state='goa', city='Panaji', pincode='403001', address='Miramar', area=800, seller=seller,
+        )
+        photo = BytesIO()
+        Image.new('RGB', (64, 48), 'teal').save(photo, 'JPEG')
+        self.image = PropertyImage(property=listing)
+        self.image.image.save('kept.jpg', ContentFile(photo.getvalue()))
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def write(self, name, age_hours):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as handle:
+            handle.write(b'orphan')
+        stamp = time.time() - age_hours * 3600
+        os.utime(path, (stamp, stamp))
+        return path
+
+    def test_orphans_are_quarantined_and_referenced_files_kept(self):
+        kept = [self.image.image.name, *images.derivative_names(self.image.image.name)]
+        orphans = [
+            self.write('properties/old.jpg', 48),
+            self.write('properties/derivatives/old_card.webp', 48),
+            self.write('kyc/pan/replaced.pdf', 48),
+        ]
+        recent = self.write('properties/uploading.jpg', 1)
+        quarantine = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, quarantine)
+        checkpoint = os.path.join(tempfile.gettempdir(), f'media-gc-test-{os.getpid()}.json')
+
+        output = StringIO()
+        call_command('collect_orphaned_media', dry_run=True, checkpoint=checkpoint, stdout=output)
+        self.assertIn('Would remove 3 orphaned files', output.getvalue())
+        self.assertTrue(all(os.path.exists(path) for path in orphans))
+
+        call_command('collect_orphaned_media', quarantine=quarantine, checkpoint=checkpoint, workers=2, stdout=StringIO())
+        self.assertFalse(any(os.path.exists(path) for path in orphans))
+        self.assertTrue(os.path.exists(os.path.join(quarantine, 'kyc', 'pan', 'replaced.pdf')))
+        self.assertTrue(os.path.exists(recent))
+        self.assertTrue(all(default_storage.exists(name) for name in kept))
+        self.assertFalse(os.path.exists(checkpoint))
+
+        with self.assertRaisesMessage(CommandError, 'must be outside MEDIA_ROOT'):
+            call_command('collect_orphaned_media', quarantine=os.path.join(self.media_root, 'quarantine'), stdout=StringIO())
+
+    def test_file_claimed_during_the_walk_is_kept(self):
+        reused = self.write('properties/ab/reused.jpg', 48)
+        orphan = self.write('properties/ab/old.jpg', 48)
+        checkpoint = os.path.join(tempfile.gettempdir(), f'media-gc-test-{os.getpid()}.json')
+        # An upload reuses the file after the referenced names were loaded
+        StoredFile.objects.create(name='properties/ab/reused.jpg')
+        with mock.patch.object(collect_orphaned_media, 'referenced_stems', return_value=set()):
+            call_command('collect_orphaned_media', checkpoint=checkpoint, stdout=StringIO())
+        self.assertTrue(os.path.exists(reused))
+        self.assertFalse(os.path.exists(orphan))
+
+
+class KYCCompletenessTests(TestCase):
+    def setUp(self):
+        admin = CustomUser.objects.create_user('admin', password='pass', role='admin')
+        self.client.force_login(admin)
+        documents = {field: f'kyc/{field}.pdf' for field, name in SellerKYC.REQUIRED_DOCUMENTS}
+        self.complete = SellerKYC.objects.create(
+            seller=CustomUser.objects.create_user('complete', password='pass', role='seller'), **documents,
+        )
+        self.no_tax = SellerKYC.objects.create(
+            seller=CustomUser.objects.create_user('no_tax', password='pass', role='seller'),
+            **dict(documents, tax_receipt=''),
+        )
+        self.pan_only = SellerKYC.objects.create(
+            seller=CustomUser.objects.create_user('pan_only', password='pass', role='seller'), pan_card='kyc/pan.pdf',
+        )
+
+    def listed(self, **params):
+        response = self.client.get(reverse('admin_panel:kyc_verification'), params)
+        return {kyc.pk for kyc in response.context['page_obj']}
+
+    def test_mask_follows_saved_documents(self):
+        self.assertEqual((self.complete.documents_mask, self.complete.missing_count), (0b111111, 0))
+        self.assertEqual(self.pan_only.missing_count, 5)
+        self.assertEqual([doc['field'] for doc in self.no_tax.get_missing_documents()], ['tax_receipt'])
+
+        self.no_tax.tax_receipt = 'kyc/tax.pdf'
+        self.no_tax.save(update_fields=['tax_receipt'])
+        self.no_tax.refresh_from_db()
+        self.assertTrue(self.no_tax.is_complete())
+
+    def test_filters(self):
+        self.assertEqual(self.listed(completion='complete'), {self.complete.pk})
+        self.assertEqual(self.listed(completion='incomplete'), {self.no_tax.pk, self.pan_only.pk})
+        self.assertEqual(self.listed(missing='tax_receipt'), {self.no_tax.pk, self.pan_only.pk})
+        self.assertEqual(self.listed(missing='aadhaar_card'), {self.pan_only.pk})
+        self.assertEqual(self.listed(missing='pan_card', status='pending'), set())
+
+    def test_list_order_comes_from_an_index(self):
+        for queryset in (SellerKYC.objects.all(), SellerKYC.objects.filter(status='pending')):
+            plan = queryset.order_by('-date_submitted', '-pk').explain()
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+class KYCDecisionTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user('admin', password='pass', role='admin')
+        self.client.force_login(self.admin)
+        self.kycs = [
+            SellerKYC.objects.create(
+                seller=CustomUser.objects.create_user(f'seller{i}', password='pass', role='seller', is_verified=i == 2),
+                pan_card=f'kyc/pan/{i}.pdf',
+            )
+            for i in range(3)
+        ]
+
+    def test_json_decisions_report_each_row_and_keep_counters(self):
+        first, second, third = self.kycs
+        response = self.client.post(reverse('admin_panel:kyc_bulk_decision'), {
+            'decisions': [
+                {'id': first.pk, 'action': 'approved'},
+                {'id': second.pk, 'action': 'approved', 'remarks': 'Checked'},
+                {'id': third.pk, 'action': 'rejected'},
+                {'id': third.pk, 'action': 'approved'},
+                {'id': 999, 'action': 'approved'},
+                {'id': first.pk + 1000, 'action': 'delete'},
+            ],
+            'remarks': 'Drive',
+        }, content_type='application/json')
+        self.assertEqual(response.json()['results'], [
+            {'id': first.pk, 'result': 'approved'},
+            {'id': second.pk, 'result': 'approved'},
+            {'id': third.pk, 'result': 'rejected'},
+            {'id': 999, 'result': 'not_found'},
+            {'id': first.pk + 1000, 'result': 'invalid'},
+        ])
+
+        rows = {kyc.pk: kyc for kyc in SellerKYC.objects.select_related('seller')}
+        self.assertEqual(
+            [(rows[kyc.pk].status, rows[kyc.pk].remarks, rows[kyc.pk].seller.is_verified) for kyc in self.kycs],
+            [('approved', 'Drive', True), ('approved', 'Checked', True), ('rejected', 'Drive', False)],
+        )
+        self.assertEqual(rows[first.pk].verified_by, self.admin)
+        self.assertIsNotNone(rows[first.pk].date_verified)
+
+        names = ['kycs', 'kycs:status:pending', 'kycs:status:approved', 'kycs:status:rejected']
+        maintained = counters.get_values(names)
+        counters.reconcile()
+        self.assertEqual(counters.get_values(names), maintained)
+
+    def test_same_decision_records_new_remarks(self):
+        first = self.kycs[0]
+        kyc_decisions.decide([(first.pk, 'rejected', 'Blurred PAN card')], self.admin)
+        response = self.client.post(
+            reverse('admin_panel:kyc_detail', args=[first.pk]), {'action': 'rejected', 'remarks': 'PAN card expired'}, follow=True,
+        )
+        self.assertContains(response, 'Remarks for the rejected KYC of seller0 have been updated.')
+        self.assertEqual(SellerKYC.objects.get(pk=first.pk).remarks, 'PAN card expired')
+        self.assertEqual(kyc_decisions.decide([(first.pk, 'rejected')], self.admin), [{'id': first.pk, 'result': 'unchanged'}])
+        self.assertEqual(SellerKYC.objects.get(pk=first.pk).remarks, 'PAN card expired')
+
+    def test_form_decision_redirects_back(self):
+        next_url = reverse('admin_panel:kyc_verification') + '?status=pending'
+        response = self.client.post(reverse('admin_panel:kyc_bulk_decision'), {
+            'action': 'rejected', 'kyc_ids': [kyc.pk for kyc in self.kycs[:2]], 'next': next_url,
+        })
+        self.assertRedirects(response, next_url)
+        self.assertEqual(SellerKYC.objects.filter(status='rejected').count(), 2)
+        self.assertEqual(SellerKYC.objects.filter(status='pending').count(), 1)
+
+
+class KYCQueueTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user('admin', password='pass', role='admin')
+        self.other = CustomUser.objects.create_user('other', password='pass', role='admin')
+        self.client.force_login(self.admin)
+        now = timezone.now()
+        self.kycs = {}
+        # name: (missing documents, days since submission)
+        for name, missing, age in [('old_incomplete', 3, 9), ('new_complete', 0, 1), ('old_complete', 0, 5)]:
+            kyc = SellerKYC.objects.create(seller=CustomUser.objects.create_user(name, password='pass', role='seller'))
+            SellerKYC.objects.filter(pk=kyc.pk).update(missing_count=missing, date_submitted=now - timedelta(days=age))
+            self.kycs[name] = kyc.pk
+
+    def test_reviewers_get_disjoint_kycs_by_priority(self):
+        first = kyc_queue.lease_next(self.admin)
+        second = kyc_queue.lease_next(self.other)
+        self.assertEqual((first.pk, second.pk), (self.kycs['old_complete'], self.kycs['new_complete']))
+        self.assertEqual(first.leased_by, self.admin)
+
+        # Skipping gives the held KYC back; only the incomplete one is left for this reviewer
+        self.assertEqual(kyc_queue.lease_next(self.admin, skip=[first.pk]).pk, self.kycs['old_incomplete'])
+        self.assertEqual(SellerKYC.objects.filter(leased_by=self.admin).count(), 1)
+
+        # An expired lease returns to the queue
+        SellerKYC.objects.filter(pk=second.pk).update(lease_expires=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(kyc_queue.lease_next(self.admin).pk, self.kycs['old_complete'])
+        self.assertEqual(kyc_queue.lease_next(self.admin, skip=[self.kycs['old_complete']]).pk, second.pk)
+
+        # Deciding clears the lease and takes the KYC off the queue
+        kyc_decisions.decide([(second.pk, 'approved')], self.admin)
+        self.assertIsNone(SellerKYC.objects.get(pk=second.pk).leased_by)
+        self.assertNotIn(second.pk, kyc_queue.queue().values_list('pk', flat=True))
+
+    def test_next_view_leases_and_detail_renews(self):
+        response = self.client.post(reverse('admin_panel:kyc_next'))
+        self.assertRedirects(response, reverse('admin_panel:kyc_detail', args=[self.kycs['old_complete']]), fetch_redirect_response=False)
+        response = self.client.get(response.url)
+        self.assertTrue(response.context['lease_held'])
+
+        # Deciding from the queue moves on to the next KYC
+        response = self.client.post(response.wsgi_request.path, {'action': 'approved', 'queue': '1'})
+        self.assertRedirects(response, reverse('admin_panel:kyc_detail', args=[self.kycs['new_complete']]), fetch_redirect_response=False)
+
+        self.client.force_login(self.other)
+        response = self.client.get(reverse('admin_panel:kyc_detail', args=[self.kycs['new_complete']]))
+        self.assertTrue(response.context['leased_by_other'])
+        self.assertContains(response, 'admin is reviewing this submission')
+        response = self.client.post(reverse('admin_panel:kyc_next'), {'skip': []}, content_type='application/json')
+        self.assertEqual(response.json()['kyc']['id'], self.kycs['old_incomplete'])
+        response = self.client.post(reverse('admin_panel:kyc_next'), {'skip': [self.kycs['old_incomplete']]}, content_type='application/json')
+        self.assertIsNone(response.json()['kyc'])
+
+
+class KYCQueueConcurrencyTests(TransactionTestCase):
+    workers = 8
+    pending = 60
+
+    def setUp(self):
+        # The in-memory test database locks whole tables instead of waiting, so the
+        # workers run against a file copy of it, as the site runs against db.sqlite3
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'queue.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_workers(self, target, args):
+        connection.ensure_connection()
+        copy = sqlite3.connect(self.path)
+        connection.connection.backup(copy)
+        copy.close()
+        # Connections opened by the worker threads read their settings from here
+        with mock.patch.dict(connections.settings['default'], NAME=self.path):
+            threads = [threading.Thread(target=target, args=(arg,)) for arg in args]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+    def test_concurrent_reviewers_never_share_a_kyc(self):
+        reviewers = [CustomUser.objects.create_user(f'admin{i}', role='admin') for i in range(self.workers)]
+        sellers = CustomUser.objects.bulk_create([
+            CustomUser(username=f'seller{i}', role='seller', password='!') for i in range(self.pending)
+        ])
+        SellerKYC.objects.bulk_create([SellerKYC(seller=seller, missing_count=i % 3) for i, seller in enumerate(sellers)])
+
+        leased = []
+        errors = []
+        barrier = threading.Barrier(self.workers)
+
+        def review(reviewer):
+            try:
+                barrier.wait()
+                while True:
+                    kyc = kyc_queue.lease_next(reviewer)
+                    if kyc is None:
+                        break
+                    leased.append(kyc.pk)
+                    kyc_decisions.decide([(kyc.pk, 'approved')], reviewer)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        self.run_workers(review, reviewers)
+
+        self.assertEqual(errors, [])
+        # Each pending KYC was handed out exactly once, and all of them were decided
+        self.assertEqual(len(leased), self.pending)
+        self.assertEqual(len(set(leased)), self.pending)
+        with sqlite3.connect(self.path) as copy:
+            rows = copy.execute('SELECT status, COUNT(*) FROM accounts_sellerkyc GROUP BY status').fetchall()
+        self.assertEqual(rows, [('approved', self.pending)])
@@ -9,8 +9,12 @@ urlpatterns = [
     path('properties/', views.manage_properties, name='manage_properties'),
     path('kyc/', views.kyc_verification, name='kyc_verification'),
     path('kyc/<int:pk>/', views.kyc_detail, name='kyc_detail'),
+    path('kyc/next/', views.kyc_next, name='kyc_next'),
+    path('kyc/bulk-decision/', views.kyc_bulk_decision, name='kyc_bulk_decision'),
     path('user/<int:pk>/toggle-status/', views.toggle_user_status, name='toggle_user_status'),
     path('property/<int:pk>/toggle-status/', views.toggle_property_status, name='toggle_property_status'),
     path('images/', views.manage_property_images, name='manage_property_images'),
     path('images/bulk-assign/', views.bulk_assign_images, name='bulk_assign_images'),
+    path('images/jobs/<int:pk>/', views.image_job_status, name='image_job_status'),
+    path('images/duplicates/', views.duplicate_photos, name='duplicate_photos'),
 ]
\ No newline at end of file
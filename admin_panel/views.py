@@ -4,14 +4,24 @@ from django.contrib import messages
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.core.paginator import Paginator
+from safeestate.pagination import paginate
+from safeestate.storage import ContentAddressedUploadHandler
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse
+from django.urls import reverse
+from django.core.files.storage import default_storage
+from django.views.decorators.csrf import csrf_exempt
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.http import require_POST
+from django.utils.http import url_has_allowed_host_and_scheme
 from accounts.models import SellerKYC
 from properties.models import Property, VisitRequest, PropertyImage
-from django.db.models import Count, Q
-import requests
-import uuid
-from django.core.files.base import ContentFile
+from properties.search import keyword_search
+from properties import duplicates, search_cache
+from safeestate import counters
+from . import jobs, kyc_decisions, kyc_queue
+from .models import ImageJob
+from django.db.models import Count, F, Q
 
 User = get_user_model()
 
@@ -27,17 +37,22 @@ def admin_required(view_func):
 @login_required
 @admin_required
 def dashboard(request):
-    # Get statistics
-    total_users = User.objects.count()
-    total_buyers = User.objects.filter(role='buyer').count()
-    total_sellers = User.objects.filter(role='seller').count()
-    total_properties = Property.objects.count()
-    available_properties = Property.objects.filter(status='available').count()
+    # Get statistics (read from maintained counters in a single query)
+    stats = counters.get_values([
+        'users', 'users:role:buyer', 'users:role:seller',
+        'properties', 'properties:status:available',
+        'kycs:status:pending', 'kycs:status:approved', 'kycs:status:rejected',
+    ])
+    total_users = stats['users']
+    total_buyers = stats['users:role:buyer']
+    total_sellers = stats['users:role:seller']
+    total_properties = stats['properties']
+    available_properties = stats['properties:status:available']
     
     # KYC Statistics
-    pending_kycs = SellerKYC.objects.filter(status='pending').count()
-    approved_kycs = SellerKYC.objects.filter(status='approved').count()
-    rejected_kycs = SellerKYC.objects.filter(status='rejected').count()
+    pending_kycs = stats['kycs:status:pending']
+    approved_kycs = stats['kycs:status:approved']
+    rejected_kycs = stats['kycs:status:rejected']
     
     # Recent activities
     recent_users = User.objects.order_by('-date_joined')[:5]
@@ -45,6 +60,7 @@ def dashboard(request):
     recent_kycs = SellerKYC.objects.order_by('-date_submitted')[:5]
     
     context = {
+        'search_cache_stats': search_cache.get_stats(),
         'total_users': total_users,
         'total_buyers': total_buyers,
         'total_sellers': total_sellers,
@@ -96,9 +112,7 @@ def manage_users(request):
         )
     
     # Pagination
-    paginator = Paginator(users, 20)  # Show 20 users per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj, total_count = paginate(request, users, 20, 'date_joined')  # Show 20 users per page
     
     context = {
         'page_obj': page_obj,
@@ -107,7 +121,7 @@ def manage_users(request):
         'status_filter': status_filter,
         'verification_filter': verification_filter,
         'search_query': search_query,
-        'total_count': paginator.count,
+        'total_count': total_count,
     }
     
     return render(request, 'admin_panel/manage_users.html', context)
@@ -115,14 +129,15 @@ def manage_users(request):
 @login_required
 @admin_required
 def manage_properties(request):
-    properties = Property.objects.all().order_by('-date_created')
+    properties = Property.objects.select_related('primary_image').order_by('-date_created')
     
     # Get filter parameters
     status_filter = request.GET.get('status')
     property_type_filter = request.GET.get('property_type')
     state_filter = request.GET.get('state')
     city_filter = request.GET.get('city')
-    search_query = request.GET.get('search')
+    search_query = request.GET.get('q') or request.GET.get('search')
+    sort_order = request.GET.get('sort')
     seller_filter = request.GET.get('seller')
     min_price = request.GET.get('min_price')
     max_price = request.GET.get('max_price')
@@ -144,12 +159,7 @@ def manage_properties(request):
         properties = properties.filter(seller__username__icontains=seller_filter)
     
     if search_query and search_query.strip():
-        properties = properties.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(address__icontains=search_query) |
-            Q(city__icontains=search_query)
-        )
+        properties = keyword_search(properties, search_query, rank=sort_order == 'relevance')
     
     if min_price and min_price.strip():
         try:
@@ -168,9 +178,7 @@ def manage_properties(request):
     states = INDIAN_STATES
     
     # Pagination
-    paginator = Paginator(properties, 12)  # Show 12 properties per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj, total_count = paginate(request, properties, 12, 'date_created', keyset=sort_order != 'relevance')  # Show 12 properties per page
     
     context = {
         'page_obj': page_obj,
@@ -180,11 +188,12 @@ def manage_properties(request):
         'state_filter': state_filter,
         'city_filter': city_filter,
         'search_query': search_query,
+        'sort_order': sort_order,
         'seller_filter': seller_filter,
         'min_price': min_price,
         'max_price': max_price,
         'states': states,
-        'total_count': paginator.count,
+        'total_count': total_count,
     }
     
     return render(request, 'admin_panel/manage_properties.html', context)
@@ -197,6 +206,7 @@ def kyc_verification(request):
     # Get filter parameters
     status_filter = request.GET.get('status')
     completion_filter = request.GET.get('completion')
+    missing_filter = request.GET.get('missing')
     search_query = request.GET.get('search')
     date_filter = request.GET.get('date_filter')
     
@@ -204,27 +214,18 @@ def kyc_verification(request):
     if status_filter and status_filter != '':
         kycs = kycs.filter(status=status_filter)
     
-    if completion_filter and completion_filter != '':
-        if completion_filter == 'complete':
-            # Filter KYCs that have all required documents
-            kycs = kycs.exclude(
-                Q(pan_card='') | Q(pan_card__isnull=True) |
-                Q(aadhaar_card='') | Q(aadhaar_card__isnull=True) |
-                Q(ownership_proof='') | Q(ownership_proof__isnull=True) |
-                Q(revenue_records='') | Q(revenue_records__isnull=True) |
-                Q(tax_receipt='') | Q(tax_receipt__isnull=True) |
-                Q(encumbrance_certificate='') | Q(encumbrance_certificate__isnull=True)
-            )
-        elif completion_filter == 'incomplete':
-            # Filter KYCs that are missing required documents
-            kycs = kycs.filter(
-                Q(pan_card='') | Q(pan_card__isnull=True) |
-                Q(aadhaar_card='') | Q(aadhaar_card__isnull=True) |
-                Q(ownership_proof='') | Q(ownership_proof__isnull=True) |
-                Q(revenue_records='') | Q(revenue_records__isnull=True) |
-                Q(tax_receipt='') | Q(tax_receipt__isnull=True) |
-                Q(encumbrance_certificate='') | Q(encumbrance_certificate__isnull=True)
-            )
+    if completion_filter == 'complete':
+        kycs = kycs.filter(missing_count=0)
+    elif completion_filter == 'incomplete':
+        kycs = kycs.filter(missing_count__gt=0)
+    
+    document_fields = [field for field, name in SellerKYC.REQUIRED_DOCUMENTS]
+    if missing_filter in document_fields:
+        # missing_count narrows the rows through the index before the bit test
+        bit = SellerKYC.document_bit(missing_filter)
+        kycs = kycs.filter(missing_count__gt=0).alias(
+            missing_bit=F('documents_mask').bitand(bit)
+        ).filter(missing_bit=0)
     
     if search_query and search_query.strip():
         kycs = kycs.filter(
@@ -248,18 +249,19 @@ def kyc_verification(request):
             kycs = kycs.filter(date_submitted__date__gte=month_ago)
     
     # Pagination
-    paginator = Paginator(kycs, 15)  # Show 15 KYCs per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj, total_count = paginate(request, kycs, 15, 'date_submitted')  # Show 15 KYCs per page
     
     context = {
         'page_obj': page_obj,
         'kycs': page_obj,  # For backward compatibility
         'status_filter': status_filter,
         'completion_filter': completion_filter,
+        'missing_filter': missing_filter,
+        'required_documents': SellerKYC.REQUIRED_DOCUMENTS,
         'search_query': search_query,
         'date_filter': date_filter,
-        'total_count': paginator.count,
+        'total_count': total_count,
+        'now': timezone.now(),
     }
     
     return render(request, 'admin_panel/kyc_verification.html', context)
@@ -267,37 +269,118 @@ def kyc_verification(request):
 @login_required
 @admin_required
 def kyc_detail(request, pk):
-    kyc = get_object_or_404(SellerKYC, pk=pk)
+    kyc = get_object_or_404(SellerKYC.objects.select_related('seller', 'verified_by', 'leased_by'), pk=pk)
     
     if request.method == 'POST':
         action = request.POST.get('action')
         remarks = request.POST.get('remarks', '')
         
-        if action in ['approved', 'rejected']:
-            kyc.status = action
-            kyc.remarks = remarks
-            kyc.verified_by = request.user
-            kyc.date_verified = timezone.now()
-            kyc.save()
-            
-            # Update seller verification status
-            if action == 'approved':
-                kyc.seller.is_verified = True
-                kyc.seller.save()
-                messages.success(request, f'KYC for {kyc.seller.username} has been approved.')
+        if action in kyc_decisions.DECISIONS:
+            result = kyc_decisions.decide([(kyc.pk, action, remarks)], request.user)[0]['result']
+            if result == 'unchanged':
+                messages.info(request, f'KYC for {kyc.seller.username} was already {action}.')
+            elif result == 'remarks_updated':
+                messages.success(request, f'Remarks for the {action} KYC of {kyc.seller.username} have been updated.')
             else:
-                kyc.seller.is_verified = False
-                kyc.seller.save()
-                messages.success(request, f'KYC for {kyc.seller.username} has been rejected.')
+                messages.success(request, f'KYC for {kyc.seller.username} has been {action}.')
             
+            if request.POST.get('queue'):
+                # Reviewing from the queue: straight on to the next submission
+                return next_kyc_redirect(request)
             return redirect('admin_panel:kyc_verification')
     
+    # Keep the lease alive while its holder has the page open
+    now = timezone.now()
+    held = kyc.leased_by_id == request.user.pk and kyc_queue.renew(kyc, request.user)
+    
     context = {
         'kyc': kyc,
+        'documents': kyc.get_documents(),
+        'lease_held': held,
+        'leased_by_other': not held and kyc.leased_by_id is not None and kyc.lease_expires > now,
     }
     
     return render(request, 'admin_panel/kyc_detail.html', context)
 
+def next_kyc_redirect(request, skip=()):
+    kyc = kyc_queue.lease_next(request.user, skip)
+    if kyc is None:
+        messages.info(request, 'No pending KYC submissions are waiting for review.')
+        return redirect('admin_panel:kyc_verification')
+    return redirect('admin_panel:kyc_detail', pk=kyc.pk)
+
+@login_required
+@admin_required
+@require_POST
+def kyc_next(request):
+    """Lease the next pending KYC in the review queue to the reviewer, optionally passing one over"""
+    if request.content_type == 'application/json':
+        import json
+        try:
+            data = json.loads(request.body or '{}')
+            skip = [int(pk) for pk in data.get('skip', [])]
+        except (ValueError, TypeError, AttributeError):
+            return JsonResponse({'success': False, 'message': 'Invalid request body.'}, status=400)
+        kyc = kyc_queue.lease_next(request.user, skip)
+        if kyc is None:
+            return JsonResponse({'success': True, 'kyc': None})
+        return JsonResponse({'success': True, 'kyc': {
+            'id': kyc.pk,
+            'seller': kyc.seller.username,
+            'missing_count': kyc.missing_count,
+            'date_submitted': kyc.date_submitted.isoformat(),
+            'lease_expires': kyc.lease_expires.isoformat(),
+            'url': reverse('admin_panel:kyc_detail', args=[kyc.pk]),
+        }})
+    
+    skip = [int(pk) for pk in request.POST.getlist('skip') if pk.isdigit()]
+    return next_kyc_redirect(request, skip)
+
+@login_required
+@admin_required
+@require_POST
+def kyc_bulk_decision(request):
+    """Approve or reject the selected KYCs in one transaction and report the outcome of each"""
+    if request.content_type == 'application/json':
+        import json
+        try:
+            data = json.loads(request.body)
+            if 'decisions' in data:
+                # Remarks given per decision override the shared ones
+                decisions = [
+                    (int(item['id']), item.get('action'), *([str(item['remarks'] or '')] if 'remarks' in item else []))
+                    for item in data['decisions']
+                ]
+            else:
+                decisions = [(int(pk), data.get('action')) for pk in data.get('kyc_ids', [])]
+            remarks = str(data.get('remarks') or '')
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return JsonResponse({'success': False, 'message': 'Invalid request body.'}, status=400)
+        results = kyc_decisions.decide(decisions, request.user, remarks)
+        applied = sum(1 for row in results if row['result'] in kyc_decisions.DECISIONS)
+        return JsonResponse({
+            'success': True,
+            'message': f'{applied} of {len(results)} KYC submissions updated.',
+            'results': results,
+        })
+    
+    action = request.POST.get('action')
+    kyc_ids = [int(pk) for pk in request.POST.getlist('kyc_ids') if pk.isdigit()]
+    if action not in kyc_decisions.DECISIONS or not kyc_ids:
+        messages.error(request, 'Select at least one KYC submission and a decision.')
+    else:
+        results = kyc_decisions.decide([(pk, action) for pk in kyc_ids], request.user, request.POST.get('remarks', ''))
+        outcome = {}
+        for row in results:
+            outcome[row['result']] = outcome.get(row['result'], 0) + 1
+        summary = ', '.join(f'{count} {result.replace("_", " ")}' for result, count in outcome.items())
+        messages.success(request, f'Bulk decision applied: {summary}.')
+    
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('admin_panel:kyc_verification')
+
 @login_required
 @admin_required
 def toggle_user_status(request, pk):
@@ -330,7 +413,7 @@ def toggle_property_status(request, pk):
 @admin_required
 def manage_property_images(request):
     """Admin view for comprehensive property image management"""
-    properties = Property.objects.all().order_by('-date_created')
+    properties = Property.objects.prefetch_related('images').order_by('-date_created')
     
     # Apply filters
     property_type_filter = request.GET.get('property_type')
@@ -363,11 +446,14 @@ def manage_property_images(request):
     page_obj = paginator.get_page(page_number)
     
     # Get image statistics
-    total_properties = Property.objects.count()
+    total_properties = counters.get_value('properties')
     properties_with_images = Property.objects.filter(images__isnull=False).distinct().count()
     properties_without_images = total_properties - properties_with_images
     total_images = PropertyImage.objects.count()
     
+    # Jobs still in progress, so the page can keep reporting them after a reload
+    active_jobs = ImageJob.objects.filter(status__in=['queued', 'running']).values_list('pk', flat=True)
+    
     context = {
         'page_obj': page_obj,
         'properties': page_obj,
@@ -379,14 +465,73 @@ def manage_property_images(request):
         'properties_with_images': properties_with_images,
         'properties_without_images': properties_without_images,
         'total_images': total_images,
+        'active_jobs': list(active_jobs),
     }
     
     return render(request, 'admin_panel/manage_property_images.html', context)
 
+@login_required
+@admin_required
+def duplicate_photos(request):
+    """Report of photos used on more than one listing, grouped by perceptual similarity"""
+    scope = request.GET.get('scope')
+    groups = [group for group in duplicates.index.groups() if len({property_id for pk, property_id in group}) > 1]
+    
+    if scope == 'sellers':
+        # Only photos shared between different sellers, the usual sign of a copied listing
+        property_ids = {property_id for group in groups for pk, property_id in group}
+        sellers = dict(Property.objects.filter(pk__in=property_ids).values_list('pk', 'seller_id'))
+        groups = [group for group in groups if len({sellers.get(property_id) for pk, property_id in group}) > 1]
+    
+    paginator = Paginator(groups, 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    # Load only the images shown on this page
+    found = PropertyImage.objects.select_related('property__seller').in_bulk(
+        [pk for group in page_obj for pk, property_id in group]
+    )
+    report = []
+    for group in page_obj:
+        photos = [found[pk] for pk, property_id in group if pk in found]
+        report.append({
+            'photos': photos,
+            'listings': len({photo.property_id for photo in photos}),
+            'sellers': len({photo.property.seller_id for photo in photos}),
+        })
+    
+    context = {
+        'page_obj': page_obj,
+        'report': report,
+        'scope': scope,
+        'radius': duplicates.radius(),
+    }
+    
+    return render(request, 'admin_panel/duplicate_photos.html', context)
+
+@csrf_exempt
 @login_required
 @admin_required
 def bulk_assign_images(request):
-    """Handle bulk image operations and file uploads"""
+    """Queue bulk image operations and file uploads as background jobs"""
+    if request.method == 'POST' and request.content_type == 'multipart/form-data' and hasattr(default_storage, 'save_exact'):
+        # Stream uploaded images straight into media storage instead of buffering them;
+        # handlers must be set before the CSRF check below parses the body
+        request.upload_handlers.insert(0, ContentAddressedUploadHandler(
+            request, storage=default_storage, folder=PropertyImage._meta.get_field('image').upload_to, field_name='images',
+        ))
+    
+    # Checked here rather than by csrf_protect, so that images streamed in while looking for the
+    # form's token are removed when it is wrong; a token sent in the header is checked unread
+    csrf = CsrfViewMiddleware(lambda request: None)
+    csrf.process_request(request)
+    rejected = csrf.process_view(request, None, (), {})
+    if rejected is not None:
+        if hasattr(request, '_files'):
+            jobs.discard([f.stored_name for f in request.FILES.getlist('images') if hasattr(f, 'stored_name')])
+        return rejected
+    return _bulk_assign_images(request)
+
+def _bulk_assign_images(request):
     if request.method == 'POST':
         try:
             # Handle JSON requests (for bulk operations)
@@ -396,35 +541,12 @@ def bulk_assign_images(request):
                 action = data.get('action')
                 property_ids = data.get('property_ids', [])
                 
-                if action == 'assign_unique':
-                    properties = Property.objects.filter(id__in=property_ids)
-                    success_count = assign_unique_images_to_properties(properties)
-                    return JsonResponse({
-                        'success': True, 
-                        'message': f'Successfully assigned unique images to {success_count} properties.',
-                        'updated_count': success_count
-                    })
-                
-                elif action == 'remove_all':
-                    properties = Property.objects.filter(id__in=property_ids)
-                    total_removed = 0
-                    for prop in properties:
-                        count = prop.images.count()
-                        prop.images.all().delete()
-                        total_removed += count
+                if action in ('assign_unique', 'remove_all', 'assign_placeholder'):
+                    job = jobs.enqueue(action, property_ids, request.user)
                     return JsonResponse({
                         'success': True,
-                        'message': f'Removed {total_removed} images from {properties.count()} properties.',
-                        'updated_count': properties.count()
-                    })
-                
-                elif action == 'assign_placeholder':
-                    properties = Property.objects.filter(id__in=property_ids)
-                    success_count = assign_placeholder_images_to_properties(properties)
-                    return JsonResponse({
-                        'success': True,
-                        'message': f'Assigned placeholder images to {success_count} properties.',
-                        'updated_count': success_count
+                        'message': f'Queued {job.get_action_display().lower()} for {job.total} properties.',
+                        'job_id': job.pk
                     })
                 
                 elif action == 'remove_specific':
@@ -461,30 +583,19 @@ def bulk_assign_images(request):
                             'message': 'No properties selected or no files uploaded.'
                         })
                     
-                    properties = Property.objects.filter(id__in=property_ids)
-                    success_count = 0
-                    
-                    # Distribute images among selected properties
-                    for i, uploaded_file in enumerate(uploaded_files):
-                        property_obj = properties[i % len(properties)]
-                        
-                        # Validate file type
-                        if not uploaded_file.content_type.startswith('image/'):
-                            continue
-                        
-                        # Create PropertyImage
-                        property_image = PropertyImage(
-                            property=property_obj,
-                            caption=f"Uploaded image for {property_obj.title}",
-                            is_primary=not property_obj.images.exists()  # First image is primary
-                        )
-                        property_image.image.save(uploaded_file.name, uploaded_file, save=True)
-                        success_count += 1
-                    
+                    # Files are stored now; attaching them to the listings runs in the worker
+                    job, results = jobs.enqueue_upload(property_ids, uploaded_files, request.user)
+                    if job is None:
+                        return JsonResponse({
+                            'success': False,
+                            'message': 'No image files for the selected properties.',
+                            'files': results
+                        })
                     return JsonResponse({
                         'success': True,
-                        'message': f'Successfully uploaded {success_count} images.',
-                        'updated_count': len(properties)
+                        'message': f'Queued {job.total} of {len(results)} files for upload.',
+                        'job_id': job.pk,
+                        'files': results
                     })
         
         except Exception as e:
@@ -495,85 +606,9 @@ def bulk_assign_images(request):
     
     return JsonResponse({'success': False, 'message': 'Invalid request method.'})
 
-def assign_unique_images_to_properties(properties):
-    """Helper function to assign unique images to properties"""
-    image_pool = [
-        'https://images.unsplash.com/photo-1545324418-cc1a3fa10c00?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1502672260266-1c1ef2d93688?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1560448204-e02f11c3d0e2?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1570129477492-45c003edd2be?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1582268611958-ebfd161ef9cf?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1600585154340-be6161a56a0c?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1486406146926-c627a92ad1ab?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1560472354-b33ff0c44a43?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1497366216548-37526070297c?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1500382017468-9049fed747ef?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1500534314209-a25ddb2bd429?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1506905925346-21bda4d32df4?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1522708323590-d24dbb6b0267?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1564013799919-ab600027ffc6?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1481026469463-66327c86e544?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1442544213729-6a15f1611937?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1449824913935-59a10b8d2000?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1518780664697-55e3ad937233?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1571896349842-33c89424de2d?w=800&h=600&fit=crop',
-        'https://images.unsplash.com/photo-1572120360610-d971b9d7767c?w=800&h=600&fit=crop',
-    ]
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    
-    success_count = 0
-    for i, property_obj in enumerate(properties):
-        try:
-            # Remove existing images
-            property_obj.images.all().delete()
-            
-            # Select unique image
-            image_url = image_pool[i % len(image_pool)]
-            
-            # Download and save
-            response = requests.get(image_url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            filename = f"admin_bulk_{property_obj.id}_{uuid.uuid4().hex[:8]}.jpg"
-            property_image = PropertyImage(
-                property=property_obj,
-                caption=f"Professional image for {property_obj.title}",
-                is_primary=True
-            )
-            property_image.image.save(filename, ContentFile(response.content), save=True)
-            success_count += 1
-        except:
-            continue
-    
-    return success_count
-
-def assign_placeholder_images_to_properties(properties):
-    """Helper function to assign placeholder images to properties"""
-    placeholder_url = "https://images.unsplash.com/photo-1560518883-ce09059eeffa?w=800&h=600&fit=crop"
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    
-    success_count = 0
-    for property_obj in properties:
-        if not property_obj.images.exists():
-            try:
-                response = requests.get(placeholder_url, headers=headers, timeout=10)
-                response.raise_for_status()
-                
-                filename = f"placeholder_{property_obj.id}_{uuid.uuid4().hex[:6]}.jpg"
-                property_image = PropertyImage(
-                    property=property_obj,
-                    caption=f"Placeholder for {property_obj.title}",
-                    is_primary=True
-                )
-                property_image.image.save(filename, ContentFile(response.content), save=True)
-                success_count += 1
-            except:
-                continue
-    
-    return success_count
+@login_required
+@admin_required
+def image_job_status(request, pk):
+    """Progress of a bulk image job, polled by the image management page"""
+    job = get_object_or_404(ImageJob, pk=pk)
+    return JsonResponse(jobs.progress(job))
@@ -2,7 +2,6 @@
 import os
 import sys
 import django
-import requests
 from urllib.parse import urlparse
 import uuid
 
@@ -13,16 +12,16 @@ django.setup()
 
 from properties.models import Property, PropertyImage
 from django.core.files.base import ContentFile
+from safeestate.fetcher import get_fetcher
 
-def download_and_save_image(url, property_obj, caption):
-    """Download image from URL and save to property"""
+def download_and_save_image(url, property_obj, caption, content=None, replace=False):
+    """Download image from URL (unless already fetched) and save to property, replacing its images if asked"""
     try:
         # Download image
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+        if content is None:
+            content = get_fetcher().fetch(url)
+        elif isinstance(content, Exception):
+            raise content
         
         # Generate unique filename
         parsed_url = urlparse(url)
@@ -42,10 +41,14 @@ def download_and_save_image(url, property_obj, caption):
         # Save image content
         property_image.image.save(
             filename,
-            ContentFile(response.content),
+            ContentFile(content),
             save=True
         )
         
+        if replace:
+            # Only once the new image is saved, so a failed download keeps the old ones
+            property_obj.images.exclude(pk=property_image.pk).delete()
+        
         return True, f"Successfully downloaded and saved image for {property_obj.title}"
         
     except Exception as e:
@@ -114,10 +117,8 @@ def add_images_to_properties():
     success_count = 0
     error_count = 0
     
+    plan = []
     for i, property_obj in enumerate(properties):
-        # Remove existing images first
-        property_obj.images.all().delete()
-        
         # Determine image type based on property title and type
         image_type = 'house'  # default
         title_lower = property_obj.title.lower()
@@ -151,10 +152,16 @@ def add_images_to_properties():
         # Get appropriate image URL
         urls = image_urls.get(image_type, image_urls['house'])
         url = urls[i % len(urls)]  # Cycle through available URLs
-        
-        # Download and save image
+        plan.append((property_obj, url))
+    
+    # Download every image concurrently, each distinct URL once
+    print(f"⬇️  Downloading {len(set(url for _, url in plan))} distinct images...")
+    downloads = get_fetcher().fetch_many(url for _, url in plan)
+    
+    for property_obj, url in plan:
+        # Save downloaded image in place of the existing ones
         caption = f"Beautiful {property_obj.get_property_type_display()} in {property_obj.city}"
-        success, message = download_and_save_image(url, property_obj, caption)
+        success, message = download_and_save_image(url, property_obj, caption, downloads[url], replace=True)
         
         if success:
             success_count += 1
@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'safeestate.settings')
 django.setup()
 
+from properties.image_assignment import FilenameMatcher, assign
 from properties.models import Property, PropertyImage
 from django.core.files import File
 
@@ -84,55 +85,22 @@ def auto_assign_by_filename(available_images, properties):
     
     success_count = 0
     
-    for prop in properties:
-        best_match = None
-        best_score = 0
-        
-        # Create search terms from property info
-        search_terms = [
-            prop.city.lower().replace(' ', ''),
-            prop.get_property_type_display().lower(),
-            str(prop.id),
-            # Extract key words from title
-            *[word.lower() for word in prop.title.split() if len(word) > 3]
-        ]
-        
-        # Find best matching image
-        for img_file in available_images:
-            img_lower = img_file.lower()
-            score = 0
-            
-            for term in search_terms:
-                if term in img_lower:
-                    score += 1
-            
-            if score > best_score:
-                best_score = score
-                best_match = img_file
-        
-        # If no good match, try simple patterns
-        if best_score == 0:
-            for img_file in available_images:
-                img_lower = img_file.lower()
-                # Check for property ID in filename
-                if str(prop.id) in img_file:
-                    best_match = img_file
-                    break
-                # Check for sequential naming
-                elif f"property{prop.id}" in img_lower or f"prop{prop.id}" in img_lower:
-                    best_match = img_file
-                    break
-        
-        # Assign the best match
-        if best_match:
-            if assign_single_image(prop, best_match):
-                success_count += 1
-                # Remove from available list to avoid duplicates
-                available_images.remove(best_match)
+    # One token index over all properties instead of comparing every image with every property
+    matcher = FilenameMatcher.from_database(properties)
+    assignments, unmatched = assign(matcher, available_images)
+    properties_by_id = {prop.id: prop for prop in properties}
+    
+    # Assign the best matches
+    for image_file, property_id, score in assignments:
+        if assign_single_image(properties_by_id[property_id], image_file):
+            success_count += 1
+            # Remove from available list to avoid duplicates
+            available_images.remove(image_file)
     
     print(f"\nAutomatic assignment completed:")
     print(f"  Successfully assigned: {success_count}")
     print(f"  Total properties: {len(properties)}")
+    print(f"  Images without a good match: {len(unmatched)}")
 
 def assign_single_image(property_obj, image_filename):
     """Assign a single image to a property"""
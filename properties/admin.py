@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import Property, PropertyImage, VisitRequest, PropertySearch
+from .models import Property, PropertyImage, VisitRequest, PropertySearch, SavedSearchMatch
 
 # Import custom admin actions
 try:
@@ -27,7 +27,7 @@ class PropertyImageInline(admin.TabularInline):
         if obj.image:
             return format_html(
                 '<img src="{}" style="max-height: 100px; max-width: 150px; border-radius: 5px;"/>',
-                obj.image.url
+                obj.derivative_url('admin')
             )
         return "No Image"
     image_preview.short_description = "Preview"
@@ -65,9 +65,9 @@ class PropertyAdmin(admin.ModelAdmin):
     def assign_sample_images(self, request, queryset):
         """Assign sample images to selected properties"""
         from django.contrib import messages
-        import requests
         import uuid
         from django.core.files.base import ContentFile
+        from safeestate.fetcher import get_fetcher
         
         # Sample image URLs for different property types
         sample_images = {
@@ -93,24 +93,23 @@ class PropertyAdmin(admin.ModelAdmin):
             ]
         }
         
-        success_count = 0
+        # Pick every image first so the downloads can run concurrently
+        plan = []
         for i, property_obj in enumerate(queryset):
+            urls = sample_images.get(property_obj.property_type, sample_images['house'])
+            plan.append((property_obj, urls[i % len(urls)]))
+        downloads = get_fetcher().fetch_many(image_url for property_obj, image_url in plan)
+        
+        success_count = 0
+        for property_obj, image_url in plan:
             try:
+                content = downloads[image_url]
+                if isinstance(content, Exception):
+                    raise content
+                
                 # Remove existing images
                 property_obj.images.all().delete()
                 
-                # Get appropriate image URL
-                prop_type = property_obj.property_type
-                urls = sample_images.get(prop_type, sample_images['house'])
-                image_url = urls[i % len(urls)]
-                
-                # Download and save image
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-                response = requests.get(image_url, headers=headers, timeout=10)
-                response.raise_for_status()
-                
                 # Create PropertyImage
                 filename = f"admin_assigned_{property_obj.id}_{uuid.uuid4().hex[:8]}.jpg"
                 property_image = PropertyImage(
@@ -118,7 +117,7 @@ class PropertyAdmin(admin.ModelAdmin):
                     caption=f"Sample image for {property_obj.title}",
                     is_primary=True
                 )
-                property_image.image.save(filename, ContentFile(response.content), save=True)
+                property_image.image.save(filename, ContentFile(content), save=True)
                 success_count += 1
                 
             except Exception as e:
@@ -141,8 +140,8 @@ class PropertyAdmin(admin.ModelAdmin):
     remove_all_images.short_description = "Remove all images from selected properties"
 
 class PropertyImageAdmin(admin.ModelAdmin):
-    list_display = ('property_title', 'image_preview', 'caption', 'is_primary', 'file_size', 'date_uploaded')
-    list_filter = ('is_primary', 'date_uploaded', 'property__property_type')
+    list_display = ('property_title', 'image_preview', 'caption', 'is_primary', 'has_derivatives', 'file_size', 'date_uploaded')
+    list_filter = ('is_primary', 'has_derivatives', 'date_uploaded', 'property__property_type')
     search_fields = ('property__title', 'caption')
     readonly_fields = ('image_preview', 'file_size', 'date_uploaded')
     
@@ -154,7 +153,7 @@ class PropertyImageAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="max-height: 150px; max-width: 200px; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);"/>',
-                obj.image.url
+                obj.derivative_url('admin')
             )
         return "No Image"
     image_preview.short_description = "Image Preview"
@@ -183,7 +182,15 @@ class PropertySearchAdmin(admin.ModelAdmin):
     list_filter = ('property_type', 'state', 'date_saved')
     search_fields = ('user__username', 'name', 'city')
 
+class SavedSearchMatchAdmin(admin.ModelAdmin):
+    list_display = ('search', 'property', 'date_matched', 'date_notified')
+    list_filter = ('date_matched', 'date_notified')
+    search_fields = ('search__name', 'search__user__username', 'property__title')
+    list_select_related = ('search', 'search__user', 'property')
+    raw_id_fields = ('search', 'property')
+
 admin.site.register(Property, PropertyAdmin)
 admin.site.register(PropertyImage, PropertyImageAdmin)
 admin.site.register(VisitRequest, VisitRequestAdmin)
 admin.site.register(PropertySearch, PropertySearchAdmin)
+admin.site.register(SavedSearchMatch, SavedSearchMatchAdmin)
@@ -0,0 +1,145 @@
+"""
+In-memory prefix index for city and pincode autocomplete.
+
+The index holds one entry per distinct normalized city ("pune", "Pune "
+and "PUNE" collapse to one entry shown with its most common spelling)
+and per pincode, kept in sorted arrays so a prefix lookup is two bisects
+plus a slice. Results for hot prefixes are memoised in a small LRU.
+
+The index is built lazily from a single grouped query and rebuilt when
+its version counter, a database row (see safeestate.counters), changes.
+The Property signal handlers bump it when a listing is created, deleted
+or moves to another city, state or pincode; the process that created a
+listing adds it in place once the bump commits (see properties/signals.py).
+"""
+import bisect
+import heapq
+import threading
+from collections import Counter, OrderedDict
+
+from django.db import transaction
+from django.db.models import Count
+
+from safeestate import counters
+
+from .models import INDIAN_STATES, Property
+
+STATE_NAMES = dict(INDIAN_STATES)
+VERSION_COUNTER = 'versions:autocomplete'
+LRU_SIZE = 1024
+
+
+def normalize(text):
+    return ' '.join((text or '').split()).casefold()
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {'city': [], 'pincode': []}
+        self._entries = {'city': {}, 'pincode': {}}
+        self._lru = OrderedDict()
+        self._version = None
+
+    def _entry(self, kind, key):
+        entries = self._entries[kind]
+        if key not in entries:
+            bisect.insort(self._keys[kind], key)
+            entries[key] = {'spellings': Counter(), 'states': Counter(), 'cities': Counter(), 'count': 0}
+        return entries[key]
+
+    def _add(self, city, state, pincode, count=1):
+        city_key = normalize(city)
+        if city_key:
+            entry = self._entry('city', city_key)
+            entry['spellings'][' '.join(city.split())] += count
+            entry['states'][state] += count
+            entry['count'] += count
+        if pincode:
+            entry = self._entry('pincode', pincode.strip())
+            entry['cities'][' '.join((city or '').split())] += count
+            entry['states'][state] += count
+            entry['count'] += count
+        return city_key, (pincode or '').strip()
+
+    def build(self, version=None):
+        rows = Property.objects.order_by().values('city', 'state', 'pincode').annotate(total=Count('pk'))
+        with self._lock:
+            self._keys = {'city': [], 'pincode': []}
+            self._entries = {'city': {}, 'pincode': {}}
+            for row in rows:
+                self._add(row['city'], row['state'], row['pincode'], row['total'])
+            self._lru.clear()
+            self._version = version
+
+    def ensure_fresh(self):
+        version = counters.get_value(VERSION_COUNTER)
+        if version != self._version:
+            self.build(version)
+
+    def add_listing(self, city, state, pincode):
+        """Record a new listing without rebuilding the whole index"""
+        version = bump_version()
+
+        def add_in_place():
+            with self._lock:
+                if self._version is None or version != self._version + 1:
+                    # Never loaded, or someone else changed the listings too; the next lookup rebuilds
+                    return
+                keys = self._add(city, state, pincode)
+                # Drop memoised results for every prefix of the new keys
+                for lru_key in list(self._lru):
+                    kind, prefix, _ = lru_key
+                    if any(key.startswith(prefix) for key in keys if key):
+                        del self._lru[lru_key]
+                self._version = version
+
+        # A rolled back bump is handed out again, so only trust it once committed
+        transaction.on_commit(add_in_place)
+
+    def _search(self, kind, prefix, limit):
+        keys = self._keys[kind]
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + '\uffff', lo=start)
+        entries = self._entries[kind]
+        matches = heapq.nlargest(limit, keys[start:end], key=lambda key: entries[key]['count'])
+
+        results = []
+        for key in matches:
+            entry = entries[key]
+            state = entry['states'].most_common(1)[0][0]
+            if kind == 'city':
+                value = entry['spellings'].most_common(1)[0][0]
+                results.append({'type': 'city', 'value': value, 'state': state,
+                                'state_display': STATE_NAMES.get(state, state), 'count': entry['count']})
+            else:
+                results.append({'type': 'pincode', 'value': key, 'city': entry['cities'].most_common(1)[0][0],
+                                'state': state, 'state_display': STATE_NAMES.get(state, state),
+                                'count': entry['count']})
+        return results
+
+    def lookup(self, text, limit=8):
+        """Return up to ``limit`` cities (or pincodes for numeric input) starting with text"""
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        kind = 'pincode' if prefix.isdigit() else 'city'
+        self.ensure_fresh()
+
+        lru_key = (kind, prefix, limit)
+        with self._lock:
+            if lru_key in self._lru:
+                self._lru.move_to_end(lru_key)
+                return self._lru[lru_key]
+            results = self._search(kind, prefix, limit)
+            self._lru[lru_key] = results
+            if len(self._lru) > LRU_SIZE:
+                self._lru.popitem(last=False)
+            return results
+
+
+def bump_version():
+    return counters.increment(VERSION_COUNTER)
+
+
+index = PrefixIndex()
@@ -0,0 +1,220 @@
+"""
+Perceptual hashes of listing photos and a near-duplicate index over them.
+
+Every PropertyImage gets a 64-bit difference hash (dHash): the photo is
+shrunk to 9x8 grey pixels and each bit records whether a pixel is brighter
+than its right-hand neighbour. Re-encoding, resizing, mild cropping or
+colour changes flip only a few bits, so photos whose hashes differ in at
+most RADIUS bits (their Hamming distance) are treated as the same photo.
+
+Near matches are found by multi-index hashing (see HashTable) rather than
+a BK-tree: over 64-bit hashes a BK-tree query at radius 6 already visits
+most of the tree, while the chunk tables keep it to a few dozen dictionary
+lookups. Images sharing a hash share one entry, so a photo reused across
+many listings costs one entry.
+
+The table lives in process memory and is rebuilt when its version
+counter, a database row (see safeestate.counters), changes. A new hash
+bumps the counter in the transaction that stores it, and the process
+that computed it adds it in place once that commits; deleting an image
+only bumps it (see properties/signals.py).
+"""
+import threading
+from itertools import combinations
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from safeestate import counters
+
+from .models import PropertyImage
+
+VERSION_COUNTER = 'versions:photo_hashes'
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+RADIUS = 6
+MASK = (1 << 64) - 1
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def radius():
+    return getattr(settings, 'PROPERTY_PHOTO_DUPLICATE_RADIUS', RADIUS)
+
+
+def dhash(image):
+    """Return the 64-bit difference hash of a PIL image as a signed integer, as the column stores it"""
+    # reducing_gap lets Pillow shrink by whole factors first, which is cheap on big photos
+    small = image.resize((HASH_WIDTH, HASH_HEIGHT), Image.Resampling.LANCZOS, reducing_gap=2.0).convert('L')
+    pixels = small.tobytes()
+    value = 0
+    for row in range(HASH_HEIGHT):
+        offset = row * HASH_WIDTH
+        for column in range(HASH_WIDTH - 1):
+            value = value << 1 | (pixels[offset + column] > pixels[offset + column + 1])
+    return value - (1 << 64) if value >> 63 else value
+
+
+def distance(a, b):
+    return ((a ^ b) & MASK).bit_count()
+
+
+def load(field_file):
+    """Open a stored photo upright, decoded at the smallest scale the format allows"""
+    with field_file.storage.open(field_file.name, 'rb') as handle:
+        image = Image.open(handle)
+        image.draft('RGB', (HASH_WIDTH * 8, HASH_HEIGHT * 8))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    return image
+
+
+def chunks(value):
+    value &= MASK
+    return [value >> shift & CHUNK_MASK for shift in range(0, 64, CHUNK_BITS)]
+
+
+def neighbours(key, limit):
+    """Every CHUNK_BITS-bit value within limit bits of key, key first"""
+    found = [key]
+    for count in range(1, limit + 1):
+        for bits in combinations(range(CHUNK_BITS), count):
+            flipped = key
+            for bit in bits:
+                flipped ^= 1 << bit
+            found.append(flipped)
+    return found
+
+
+class HashTable:
+    """
+    Multi-index hashing: the distinct hashes are filed under each of their
+    four 16-bit chunks. A hash within ``limit`` bits of the query is within
+    ``limit // 4`` bits of it in at least one chunk, so a search only looks
+    up the chunk values that close to the query's in each table and checks
+    the full distance of what it finds there.
+    """
+
+    def __init__(self):
+        self._items = {}
+        self._tables = [{} for _ in range(64 // CHUNK_BITS)]
+
+    def add(self, value, item):
+        items = self._items.get(value)
+        if items is not None:
+            items.append(item)
+            return
+        self._items[value] = [item]
+        for table, key in zip(self._tables, chunks(value)):
+            table.setdefault(key, []).append(value)
+
+    def search(self, value, limit):
+        """Yield (distance, hash, items) for every stored hash within limit bits of value"""
+        seen = set()
+        chunk_limit = limit // len(self._tables)
+        for table, key in zip(self._tables, chunks(value)):
+            for probe in neighbours(key, chunk_limit):
+                for candidate in table.get(probe, ()):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    d = distance(value, candidate)
+                    if d <= limit:
+                        yield d, candidate, self._items[candidate]
+
+    def __iter__(self):
+        return iter(self._items.items())
+
+
+class PhotoIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._table = HashTable()
+
+    def build(self, version=None):
+        table = HashTable()
+        rows = PropertyImage.objects.exclude(phash=None).values_list('phash', 'pk', 'property_id')
+        for phash, pk, property_id in rows.iterator(chunk_size=5000):
+            table.add(phash, (pk, property_id))
+        with self._lock:
+            self._table = table
+            self._version = version
+
+    def ensure_fresh(self):
+        version = counters.get_value(VERSION_COUNTER)
+        if version != self._version:
+            self.build(version)
+
+    def add(self, phash, pk, property_id):
+        version = bump_version()
+
+        def add_in_place():
+            with self._lock:
+                if self._version is not None and version == self._version + 1:
+                    # Nobody else changed the hashes since this process last loaded them
+                    self._table.add(phash, (pk, property_id))
+                    self._version = version
+
+        # A rolled back bump is handed out again, so only trust it once committed
+        transaction.on_commit(add_in_place)
+
+    def near(self, phash, limit=None):
+        """Return [(distance, image id, property id)] for indexed photos within limit bits of the hash"""
+        self.ensure_fresh()
+        limit = radius() if limit is None else limit
+        with self._lock:
+            table = self._table
+            # The table is only changed in place under the lock
+            found = [(d, pk, property_id) for d, value, items in table.search(phash, limit) for pk, property_id in items]
+        return sorted(found)
+
+    def groups(self, limit=None):
+        """Return lists of (image id, property id) whose photos are chained together by near matches, largest first"""
+        self.ensure_fresh()
+        limit = radius() if limit is None else limit
+        with self._lock:
+            table = self._table
+            entries = list(table)
+            parent = {value: value for value, items in entries}
+
+            def find(value):
+                while parent[value] != value:
+                    parent[value] = parent[parent[value]]
+                    value = parent[value]
+                return value
+
+            for value, items in entries:
+                for d, other, other_items in table.search(value, limit):
+                    root, other_root = find(value), find(other)
+                    if root != other_root:
+                        parent[other_root] = root
+
+            clusters = {}
+            for value, items in entries:
+                clusters.setdefault(find(value), []).extend(items)
+        return sorted((group for group in clusters.values() if len(group) > 1), key=len, reverse=True)
+
+
+def bump_version():
+    return counters.increment(VERSION_COUNTER)
+
+
+def update_hash(property_image, source=None):
+    """Hash a saved image, store the hash without sending save signals and index it"""
+    property_image.phash = dhash(source if source is not None else load(property_image.image))
+    PropertyImage.objects.filter(pk=property_image.pk).update(phash=property_image.phash)
+    index.add(property_image.phash, property_image.pk, property_image.property_id)
+    return property_image.phash
+
+
+def reused_elsewhere(property_image):
+    """Images on other sellers' listings whose photo matches this one"""
+    if property_image.phash is None:
+        return PropertyImage.objects.none()
+    ids = [pk for d, pk, property_id in index.near(property_image.phash) if property_id != property_image.property_id]
+    return PropertyImage.objects.filter(pk__in=ids).exclude(property__seller_id=property_image.property.seller_id)
+
+
+index = PhotoIndex()
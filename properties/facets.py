@@ -0,0 +1,167 @@
+"""
+Facet counts for the property_list sidebar.
+
+All facets come from one grouped aggregate: the listings matching every
+filter except the faceted ones (state, property type, bedrooms, and the
+price bounds) are grouped by those three columns with a conditional
+count per price bucket and one for the selected price range. Each facet
+is then summed in Python from the grouped rows that agree with the other
+selected facets, so an option's count is the number of results you
+would get by picking it while keeping everything else. The grouped rows
+are bounded by the number of option combinations, not by the number of
+listings.
+
+The grouped rows are cached per normalized filter set under the global
+listing version from search_cache, which every listing write bumps.
+"""
+import hashlib
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from . import search_cache
+from .models import Property
+
+FACET_FIELDS = ('state', 'property_type', 'bedrooms')
+# Left out of the facet queryset too; the price facet replaces them
+PRICE_FIELDS = ('min_price', 'max_price')
+CACHE_PREFIX = 'property_facet_rows'
+
+# (min_price, max_price) in rupees; None is unbounded
+PRICE_BUCKETS = [
+    ('Under ₹25L', None, 2500000),
+    ('₹25L – ₹50L', 2500000, 5000000),
+    ('₹50L – ₹1Cr', 5000000, 10000000),
+    ('₹1Cr – ₹2Cr', 10000000, 20000000),
+    ('Above ₹2Cr', 20000000, None),
+]
+MAX_BEDROOMS = 5
+
+
+def price_bucket_filter(low, high):
+    bucket = Q()
+    if low is not None:
+        bucket &= Q(price__gte=low)
+    if high is not None:
+        bucket &= Q(price__lt=high)
+    return bucket
+
+
+def price_range_filter(cleaned_data):
+    """The selected min_price/max_price, inclusive like PropertySearchForm.build_filters"""
+    price_range = Q()
+    if cleaned_data.get('min_price'):
+        price_range &= Q(price__gte=cleaned_data['min_price'])
+    if cleaned_data.get('max_price'):
+        price_range &= Q(price__lte=cleaned_data['max_price'])
+    return price_range
+
+
+def grouped_counts(queryset, price_range=Q()):
+    """
+    Return [(state, property_type, bedrooms, count in price_range, counts per
+    price bucket)] in a single query
+    """
+    # Grouping on the raw columns follows property_facet_idx, so SQLite streams the
+    # groups off the covering index; the price counts are conditional counts per group.
+    buckets = {
+        f'price_{index}': Count('pk', filter=price_bucket_filter(low, high))
+        for index, (label, low, high) in enumerate(PRICE_BUCKETS)
+    }
+    in_range = Count('pk', filter=price_range) if price_range else Count('pk')
+    rows = []
+    for group in queryset.order_by().values('state', 'property_type', 'bedrooms').annotate(in_range=in_range, **buckets):
+        bedrooms = group['bedrooms']
+        if bedrooms is not None:
+            bedrooms = min(bedrooms, MAX_BEDROOMS)
+        rows.append((
+            group['state'], group['property_type'], bedrooms, group['in_range'],
+            tuple(group[f'price_{index}'] for index in range(len(PRICE_BUCKETS))),
+        ))
+    return rows
+
+
+def summarize(rows, selected):
+    """Fold grouped rows into {facet: {option: count}} honouring the other selections"""
+    facets = {name: defaultdict(int) for name in (*FACET_FIELDS, 'price')}
+    for state, property_type, bedrooms, in_range, buckets in rows:
+        values = {'state': state, 'property_type': property_type, 'bedrooms': bedrooms}
+        matches = {
+            name: selected.get(name) in (None, '') or selected[name] == values[name]
+            for name in FACET_FIELDS
+        }
+        for name in FACET_FIELDS:
+            if in_range and all(ok for other, ok in matches.items() if other != name):
+                facets[name][values[name]] += in_range
+        if all(matches.values()):
+            for price, total in enumerate(buckets):
+                if total:
+                    facets['price'][price] += total
+    return {name: dict(counts) for name, counts in facets.items()}
+
+
+def base_queryset(form):
+    """Listings matching a valid search form's filters except the facet fields and price bounds"""
+    return Property.objects.filter(form.build_filters(exclude=FACET_FIELDS + PRICE_FIELDS))
+
+
+def get_facets(cleaned_data, queryset, cached=True):
+    """
+    Return facet counts for a search. ``queryset`` must apply every filter
+    except the facet fields themselves and the price bounds (see
+    base_queryset()). Pass ``cached=False`` to always run the query.
+    """
+    # The grouped rows do not depend on the facet selections or the ordering
+    normalized = search_cache.normalize(cleaned_data)
+    for name in (*FACET_FIELDS, 'sort'):
+        normalized.pop(name, None)
+    version = search_cache.get_version(search_cache.GLOBAL_VERSION)
+    digest = hashlib.sha1(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+    key = f'{CACHE_PREFIX}:{version}:{digest}'
+
+    rows = cache.get(key) if cached else None
+    if rows is None:
+        rows = grouped_counts(queryset, price_range_filter(cleaned_data or {}))
+        cache.set(key, rows, search_cache.cache_timeout())
+
+    selected = {name: (cleaned_data or {}).get(name) for name in FACET_FIELDS}
+    if selected['bedrooms']:
+        selected['bedrooms'] = int(selected['bedrooms'])
+    return summarize(rows, selected)
+
+
+def label_choices(form, facet_counts):
+    """Append the facet count to each option of the form's facet fields"""
+    for name in FACET_FIELDS:
+        field = form.fields[name]
+        counts = facet_counts[name]
+        choices = []
+        for value, label in field.choices:
+            if value != '':
+                key = int(value) if name == 'bedrooms' else value
+                label = f'{label} ({counts.get(key, 0)})'
+            choices.append((value, label))
+        field.choices = choices
+
+
+def price_options(request, facet_counts):
+    """Return the price buckets as links that set min_price/max_price on the current search"""
+    options = []
+    for index, (label, low, high) in enumerate(PRICE_BUCKETS):
+        params = request.GET.copy()
+        for name in ('page', 'cursor', 'min_price', 'max_price'):
+            params.pop(name, None)
+        if low is not None:
+            params['min_price'] = low
+        if high is not None:
+            # Buckets are half-open, the max_price filter is inclusive
+            params['max_price'] = Decimal(high) - Decimal('0.01')
+        options.append({
+            'label': label,
+            'count': facet_counts['price'].get(index, 0),
+            'querystring': params.urlencode(),
+        })
+    return options
@@ -1,4 +1,6 @@
 from django import forms
+from django.db.models import Q
+from . import images
 from .models import Property, PropertyImage, VisitRequest, PropertySearch, INDIAN_STATES
 
 class PropertyForm(forms.ModelForm):
@@ -36,8 +38,25 @@ class PropertyImageForm(forms.ModelForm):
             'is_primary': forms.CheckboxInput(attrs={'class': 'rounded'}),
         }
 
+class NormalizedImageField(forms.FileField):
+    """Image upload cleaned to a bounded re-encoded copy by properties.images.normalize"""
+    def to_python(self, data):
+        f = super().to_python(data)
+        if f is None:
+            return None
+        try:
+            return images.normalize(f)
+        except images.InvalidImage as e:
+            raise forms.ValidationError(str(e), code='invalid_image') from e
+    
+    def widget_attrs(self, widget):
+        attrs = super().widget_attrs(widget)
+        if isinstance(widget, forms.FileInput) and 'accept' not in widget.attrs:
+            attrs.setdefault('accept', 'image/*')
+        return attrs
+
 class PropertyImageUploadForm(forms.Form):
-    image = forms.ImageField(
+    image = NormalizedImageField(
         widget=forms.FileInput(attrs={
             'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg',
             'accept': 'image/*'
@@ -45,6 +64,24 @@ class PropertyImageUploadForm(forms.Form):
     )
 
 class PropertySearchForm(forms.Form):
+    SORT_CHOICES = [
+        ('', 'Newest First'),
+        ('relevance', 'Best Match'),
+    ]
+    BEDROOM_CHOICES = [
+        ('', 'Any'),
+        ('1', '1'),
+        ('2', '2'),
+        ('3', '3'),
+        ('4', '4'),
+        ('5', '5+'),
+    ]
+    
+    q = forms.CharField(
+        required=False,
+        label='Keywords',
+        widget=forms.TextInput(attrs={'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500', 'placeholder': 'Title, description, address...'})
+    )
     property_type = forms.ChoiceField(
         choices=[('', 'Any Type')] + Property.PROPERTY_TYPES,
         required=False,
@@ -57,11 +94,16 @@ class PropertySearchForm(forms.Form):
     )
     city = forms.CharField(
         required=False,
-        widget=forms.TextInput(attrs={'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500', 'placeholder': 'Enter city name'})
+        widget=forms.TextInput(attrs={'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500', 'placeholder': 'Enter city name', 'list': 'city-suggestions', 'autocomplete': 'off'})
     )
     pincode = forms.CharField(
         required=False,
-        widget=forms.TextInput(attrs={'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500', 'placeholder': 'Enter pincode'})
+        widget=forms.TextInput(attrs={'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500', 'placeholder': 'Enter pincode', 'list': 'pincode-suggestions', 'autocomplete': 'off'})
+    )
+    bedrooms = forms.ChoiceField(
+        choices=BEDROOM_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500'})
     )
     min_price = forms.DecimalField(
         required=False,
@@ -80,6 +122,86 @@ class PropertySearchForm(forms.Form):
         widget=forms.NumberInput(attrs={'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500', 'placeholder': 'Max Area (sq ft)'})
     )
 
+    near_latitude = forms.DecimalField(
+        required=False,
+        min_value=-90,
+        max_value=90,
+        widget=forms.NumberInput(attrs={'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500', 'placeholder': 'Latitude', 'step': '0.000001'})
+    )
+    near_longitude = forms.DecimalField(
+        required=False,
+        min_value=-180,
+        max_value=180,
+        widget=forms.NumberInput(attrs={'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500', 'placeholder': 'Longitude', 'step': '0.000001'})
+    )
+    radius_km = forms.DecimalField(
+        required=False,
+        min_value=0.1,
+        max_value=500,
+        label='Radius (km)',
+        widget=forms.NumberInput(attrs={'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500', 'placeholder': 'Radius (km)'})
+    )
+    sort = forms.ChoiceField(
+        choices=SORT_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500'})
+    )
+    
+    DEFAULT_RADIUS_KM = 10
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        latitude = cleaned_data.get('near_latitude')
+        longitude = cleaned_data.get('near_longitude')
+        
+        if (latitude is None) != (longitude is None):
+            raise forms.ValidationError('Please provide both latitude and longitude for a nearby search.')
+        if latitude is not None and not cleaned_data.get('radius_km'):
+            cleaned_data['radius_km'] = self.DEFAULT_RADIUS_KM
+        
+        return cleaned_data
+    
+    def has_location(self):
+        return self.cleaned_data.get('near_latitude') is not None
+    
+    def build_filters(self, exclude=()):
+        """Build the Q filter for available properties matching the cleaned search data"""
+        data = {name: value for name, value in self.cleaned_data.items() if name not in exclude}
+        filters = Q(status='available')
+        
+        if data.get('property_type'):
+            filters &= Q(property_type=data['property_type'])
+        
+        if data.get('state'):
+            filters &= Q(state=data['state'])
+        
+        if data.get('bedrooms'):
+            bedrooms = int(data['bedrooms'])
+            if bedrooms >= 5:
+                filters &= Q(bedrooms__gte=bedrooms)
+            else:
+                filters &= Q(bedrooms=bedrooms)
+        
+        if data.get('city'):
+            filters &= Q(city__icontains=data['city'])
+        
+        if data.get('pincode'):
+            filters &= Q(pincode=data['pincode'])
+        
+        if data.get('min_price'):
+            filters &= Q(price__gte=data['min_price'])
+        
+        if data.get('max_price'):
+            filters &= Q(price__lte=data['max_price'])
+        
+        if data.get('min_area'):
+            filters &= Q(area__gte=data['min_area'])
+        
+        if data.get('max_area'):
+            filters &= Q(area__lte=data['max_area'])
+        
+        return filters
+
 class VisitRequestForm(forms.ModelForm):
     class Meta:
         model = VisitRequest
@@ -0,0 +1,180 @@
+"""
+Radius search over Property latitude/longitude without SpatiaLite.
+
+Every listing with coordinates stores a geohash (see Property.save). A
+radius query picks the finest geohash precision whose cells are at least
+as large as the search radius, so the circle is covered by the centre
+cell and its eight neighbours. Each cell is a contiguous range of the
+indexed ``(status, geohash)`` column, so the prefilter is at most nine
+index range scans plus a bounding-box check. The database then computes
+the exact haversine distance only for those candidates, and orders and
+slices the results, so a page of a wide search loads just its own rows.
+"""
+import math
+
+from django.core.paginator import Paginator
+from django.db.models import FloatField
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Return the geohash of a point"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = bits * 2 + 1
+                lng_range[0] = mid
+            else:
+                bits = bits * 2
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = bits * 2 + 1
+                lat_range[0] = mid
+            else:
+                bits = bits * 2
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Return (height, width) in degrees of a geohash cell at the given precision"""
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Return (min_lat, max_lat, min_lng, max_lng) enclosing the search circle"""
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    lng_delta = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return latitude - lat_delta, latitude + lat_delta, longitude - lng_delta, longitude + lng_delta
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """Return the geohash prefixes whose cells cover the search circle"""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    lat_delta = max_lat - latitude
+    lng_delta = max_lng - longitude
+
+    precision = GEOHASH_PRECISION
+    while precision > 1:
+        height, width = cell_size(precision)
+        if height >= lat_delta and width >= lng_delta:
+            break
+        precision -= 1
+
+    height, width = cell_size(precision)
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        for lng_step in (-1, 0, 1):
+            lat = min(max(latitude + lat_step * height, -90.0), 90.0)
+            lng = (longitude + lng_step * width + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, lng, precision))
+    return sorted(cells)
+
+
+def prefix_range(prefix):
+    """Return the [start, end) string range holding every geohash with the given prefix"""
+    return prefix, prefix + '~'
+
+
+def cell_queries(queryset, latitude, longitude, radius_km):
+    """
+    Return the prefilter: the queryset narrowed to the bounding box of the
+    circle, as one query per covering cell, to be combined with UNION ALL.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    candidates = queryset.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+    if -180.0 <= min_lng and max_lng <= 180.0:
+        candidates = candidates.filter(longitude__gte=min_lng, longitude__lte=max_lng)
+    candidates = candidates.order_by()
+
+    # One range scan per cell; SQLite will not use the index for an OR of ranges.
+    # Cells at the same precision are disjoint, so UNION ALL yields no duplicates.
+    queries = []
+    for prefix in covering_cells(latitude, longitude, radius_km):
+        start, end = prefix_range(prefix)
+        queries.append(candidates.filter(geohash__gte=start, geohash__lt=end))
+    return queries
+
+
+def distance_expression(latitude, longitude):
+    """haversine_km() from the point to each listing, as a database expression"""
+    lat1, lng1 = math.radians(latitude), math.radians(longitude)
+    lat2 = Radians(Cast('latitude', FloatField()))
+    lng2 = Radians(Cast('longitude', FloatField()))
+    a = Power(Sin((lat2 - lat1) / 2), 2) + math.cos(lat1) * Cos(lat2) * Power(Sin((lng2 - lng1) / 2), 2)
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a))
+
+
+def within(queryset, latitude, longitude, radius_km):
+    """
+    Return the primary keys of the listings within radius_km of the point,
+    as a query to filter on (``pk__in``): the cell scans, with the distance
+    checked by the database.
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    distance = distance_expression(latitude, longitude)
+    queries = [
+        query.alias(distance_km=distance).filter(distance_km__lte=radius_km).values('pk')
+        for query in cell_queries(queryset, latitude, longitude, radius_km)
+    ]
+    return queries[0].union(*queries[1:], all=True)
+
+
+def by_distance(queryset, latitude, longitude, radius_km):
+    """The listings of the queryset within radius_km, nearest first, each annotated with ``distance_km``"""
+    latitude, longitude = float(latitude), float(longitude)
+    return queryset.filter(pk__in=within(queryset, latitude, longitude, radius_km)).annotate(
+        distance_km=distance_expression(latitude, longitude),
+    ).order_by('distance_km', 'pk')
+
+
+def nearby(queryset, latitude, longitude, radius_km):
+    """
+    Return [(pk, distance_km)] for listings in the queryset within radius_km
+    of the point, nearest first.
+    """
+    return list(by_distance(queryset, latitude, longitude, radius_km).values_list('pk', 'distance_km'))
+
+
+def nearby_page(request, queryset, latitude, longitude, radius_km, per_page):
+    """
+    Return (page_obj, total_count) for a radius search, nearest first. Each
+    listing on the page gets a ``distance_km`` attribute.
+    """
+    paginator = Paginator(by_distance(queryset, latitude, longitude, radius_km), per_page)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    return page_obj, paginator.count
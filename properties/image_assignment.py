@@ -0,0 +1,167 @@
+"""
+Match image file names to the listings they most likely show.
+
+A FilenameMatcher reads every listing once and builds an inverted index
+from normalized tokens (title words, city with and without spaces, state,
+property type, pincode) to the listings containing them, weighted by
+TF-IDF and normalized per listing. A file name is tokenized the same way
+and scored against only the listings that share a token with it, by the
+cosine similarity of the two weight vectors, so a word that appears in
+most titles ("flat", a big city) counts for little and a rare locality
+name decides. Tokens are visited rarest first and every listing they
+bring up is scored in full. Once a listing holding none of the tokens
+read so far could not beat the scores already found, the remaining, more
+common tokens are not read at all (MaxScore pruning), and tokens
+found in more than MAX_POSTINGS listings never bring up candidates on
+their own. Names that spell out a listing id ("property_12.jpg", "prop-12") match it outright.
+
+assign() then hands out files to listings greedily by score, each file
+used once, which replaces the nested file x listing loops the assignment
+scripts used to run.
+"""
+import heapq
+import math
+import re
+from array import array
+from operator import itemgetter
+
+from .models import INDIAN_STATES, Property
+
+STATE_NAMES = dict(INDIAN_STATES)
+TYPE_NAMES = dict(Property.PROPERTY_TYPES)
+MAX_POSTINGS = 1000
+MIN_SCORE = 0.3
+# Scores above any cosine similarity, for names that refer to a listing id
+ID_SCORE = 2.0
+STOPWORDS = {
+    'a', 'an', 'and', 'at', 'for', 'in', 'of', 'on', 'the', 'to', 'with', 'near',
+    'img', 'image', 'photo', 'pic', 'dsc', 'copy', 'jpg', 'jpeg', 'png', 'gif', 'webp',
+}
+TOKEN_RE = re.compile(r'[a-z]+|\d+')
+ID_RE = re.compile(r'(?:^|[^a-z])(?:property|prop|listing|id)[\s_-]*(\d+)')
+
+
+def tokens(text):
+    """Lower-case words and pincode-length numbers of a text, singular, without stopwords"""
+    found = []
+    for token in TOKEN_RE.findall((text or '').casefold()):
+        if token.isdigit():
+            if len(token) == 6:
+                found.append(token)
+            continue
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        found.append(token)
+    return found
+
+
+def listing_tokens(title, city, state, pincode, property_type):
+    words = tokens(title) + tokens(city) + tokens(STATE_NAMES.get(state, state))
+    words += tokens(property_type) + tokens(TYPE_NAMES.get(property_type, ''))
+    words += tokens(pincode)
+    city_words = tokens(city)
+    if len(city_words) > 1:
+        # File names tend to run the words together: navi_mumbai or navimumbai
+        words.append(''.join(city_words))
+    return words
+
+
+class FilenameMatcher:
+    def __init__(self, listings):
+        """listings: iterable of (pk, title, city, state, pincode, property_type)"""
+        documents = {}
+        frequency = {}
+        for pk, title, city, state, pincode, property_type in listings:
+            counts = {}
+            for token in listing_tokens(title, city, state, pincode, property_type):
+                counts[token] = counts.get(token, 0) + 1
+            documents[pk] = counts
+            for token in counts:
+                frequency[token] = frequency.get(token, 0) + 1
+
+        total = len(documents)
+        self.idf = {token: math.log((1 + total) / count) + 1 for token, count in frequency.items()}
+        self.vectors = {}
+        postings = {}
+        self.max_weight = {}
+        for pk, counts in documents.items():
+            weights = {token: (1 + math.log(count)) * self.idf[token] for token, count in counts.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1
+            vector = {token: weight / norm for token, weight in weights.items()}
+            self.vectors[pk] = vector
+            for token, weight in vector.items():
+                postings.setdefault(token, []).append(pk)
+                if weight > self.max_weight.get(token, 0.0):
+                    self.max_weight[token] = weight
+        # Compact arrays keep the index small enough for very large catalogs
+        self.postings = {token: array('q', ids) for token, ids in postings.items()}
+
+    @classmethod
+    def from_database(cls, queryset=None):
+        queryset = Property.objects.all() if queryset is None else queryset
+        return cls(queryset.values_list('pk', 'title', 'city', 'state', 'pincode', 'property_type').iterator(chunk_size=5000))
+
+    def candidates(self, filename, limit=1):
+        """Return up to limit (score, property id) pairs for a file name, best first"""
+        stem = re.sub(r'\.[a-z0-9]+$', '', filename.casefold())
+        explicit = ID_RE.search(stem)
+        if explicit and int(explicit.group(1)) in self.vectors:
+            return [(ID_SCORE, int(explicit.group(1)))]
+
+        # Rarest tokens first; each listing they bring up is scored in full
+        terms = sorted(
+            ((token, self.idf[token]) for token in set(tokens(stem)) if token in self.postings),
+            key=lambda term: len(self.postings[term[0]]),
+        )
+        if not terms:
+            return []
+        norm = math.sqrt(sum(weight * weight for token, weight in terms))
+        remaining = sum(weight * self.max_weight[token] for token, weight in terms)
+
+        scores = {}
+        threshold = 0.0
+        for token, weight in terms:
+            ids = self.postings[token]
+            # A listing not scored yet has none of the rarer tokens, so it can reach at most remaining
+            if len(ids) > MAX_POSTINGS or remaining <= threshold:
+                break
+            for pk in ids:
+                if pk not in scores:
+                    vector = self.vectors[pk]
+                    scores[pk] = sum(query_weight * vector.get(term, 0.0) for term, query_weight in terms)
+            if len(scores) >= limit:
+                threshold = heapq.nlargest(limit, scores.values())[-1]
+            remaining -= weight * self.max_weight[token]
+
+        best = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        return [(score / norm, pk) for pk, score in best]
+
+
+def assign(matcher, filenames, per_property=1, min_score=MIN_SCORE, limit=1, existing=None):
+    """
+    Pair files with listings, best scores first, each file used once and each
+    listing given at most per_property files. A file only falls back to its
+    next best listing when limit allows more than one candidate; existing
+    maps property ids to the images they already have, which count against
+    per_property. Return (assignments as (filename, property id, score),
+    unmatched file names).
+    """
+    scored = []
+    for filename in filenames:
+        for score, pk in matcher.candidates(filename, limit):
+            if score >= min_score:
+                scored.append((-score, filename, pk))
+    scored.sort()
+
+    used = set()
+    given = dict(existing or {})
+    assignments = []
+    for negative_score, filename, pk in scored:
+        if filename in used or given.get(pk, 0) >= per_property:
+            continue
+        used.add(filename)
+        given[pk] = given.get(pk, 0) + 1
+        assignments.append((filename, pk, -negative_score))
+    return assignments, [filename for filename in filenames if filename not in used]
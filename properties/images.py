@@ -0,0 +1,202 @@
+"""
+Resized WebP and JPEG derivatives of PropertyImage uploads.
+
+Each derivative lives next to the original under a ``derivatives/``
+folder with a name derived from the original's, so its URL can be built
+without touching storage; PropertyImage.has_derivatives records whether
+the set has been generated. Templates use the tags in
+properties/templatetags/property_images.py to emit srcset attributes.
+
+normalize() is applied to uploads before they are stored: the header is
+checked against a pixel budget before anything is decoded, JPEGs are
+decoded at the smallest scale that still covers the largest derivative,
+the result is capped in size, the EXIF orientation is applied and the
+metadata dropped, and it is re-encoded with quality lowered until it fits
+a byte budget.
+"""
+import math
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Bounding boxes (width, height); images are only ever scaled down
+DERIVATIVE_SIZES = {
+    'admin': (200, 150),
+    'card': (480, 360),
+    'detail': (1200, 900),
+}
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+# Upload normalization defaults, overridable with the PROPERTY_IMAGE_* settings below
+UPLOAD_MAX_DIMENSION = 2048
+UPLOAD_MAX_SOURCE_PIXELS = 80_000_000
+UPLOAD_MAX_BYTES = 1_500_000
+UPLOAD_FORMAT = 'jpeg'
+UPLOAD_QUALITIES = (85, 78, 70, 62)
+UPLOAD_SOURCE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+# Plain encodings: the stored upload is mostly read back to make derivatives
+UPLOAD_FORMATS = {
+    'webp': ('WEBP', 'webp', {'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {}),
+}
+
+
+class InvalidImage(ValueError):
+    """Upload that is not a usable image"""
+
+
+def generate_on_upload():
+    return getattr(settings, 'PROPERTY_IMAGE_DERIVATIVES_ON_UPLOAD', True)
+
+
+def upload_limits():
+    """Return (max dimension, max source pixels, max bytes, format key) from settings"""
+    return (
+        getattr(settings, 'PROPERTY_IMAGE_MAX_DIMENSION', UPLOAD_MAX_DIMENSION),
+        getattr(settings, 'PROPERTY_IMAGE_MAX_SOURCE_PIXELS', UPLOAD_MAX_SOURCE_PIXELS),
+        getattr(settings, 'PROPERTY_IMAGE_MAX_BYTES', UPLOAD_MAX_BYTES),
+        getattr(settings, 'PROPERTY_IMAGE_UPLOAD_FORMAT', UPLOAD_FORMAT),
+    )
+
+
+def normalize(file, name=None):
+    """
+    Return the upload re-encoded as a bounded, metadata-free ContentFile;
+    raise InvalidImage for anything that cannot be used.
+    """
+    max_dimension, max_pixels, max_bytes, fmt = upload_limits()
+    pil_format, extension, options = UPLOAD_FORMATS[fmt]
+    name = name or getattr(file, 'name', None) or 'image'
+
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    try:
+        # Only the header is read here
+        image = Image.open(file)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise InvalidImage('Upload a valid image. The file you uploaded was either not an image or a corrupted image.') from e
+    if image.format not in UPLOAD_SOURCE_FORMATS:
+        raise InvalidImage(f'Unsupported image format {image.format}.')
+    width, height = image.size
+    if width * height > max_pixels:
+        raise InvalidImage(f'The image is too large ({width}x{height}); keep it under {max_pixels // 1_000_000} megapixels.')
+
+    # Decode no larger than needed to cover the biggest derivative; JPEG decodes
+    # straight to the smallest 1/2, 1/4 or 1/8 scale that still covers it
+    scale = min(1, largest_derivative() / max(width, height))
+    try:
+        image.draft('RGB', (math.ceil(width * scale), math.ceil(height * scale)))
+        image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise InvalidImage('The image file is truncated or corrupted.') from e
+
+    if image.mode == 'P':
+        # Palette images cannot be resampled smoothly
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    # Shrink before rotating so the rotation copies as few pixels as possible. After draft()
+    # and thumbnail's own reduce() the factor left is below 2, where Pillow's antialiased
+    # bilinear filter looks like LANCZOS at less than half the cost
+    image.thumbnail((max_dimension, max_dimension), Image.Resampling.BILINEAR)
+    ImageOps.exif_transpose(image, in_place=True)
+    if image.mode in ('RGBA', 'LA'):
+        # Flatten transparency onto white, as neither output keeps it reliably
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    # Step the quality down, then the size, until the encoding fits the budget
+    while True:
+        for quality in UPLOAD_QUALITIES:
+            buffer = BytesIO()
+            image.save(buffer, pil_format, quality=quality, **options)
+            if buffer.tell() <= max_bytes:
+                break
+        if buffer.tell() <= max_bytes or max(image.size) <= largest_derivative():
+            break
+        image.thumbnail((int(image.width * 0.8), int(image.height * 0.8)), Image.Resampling.BILINEAR)
+
+    stem = posixpath.splitext(posixpath.basename(name.replace('\\', '/')))[0] or 'image'
+    normalized = ContentFile(buffer.getvalue(), name=f'{stem}.{extension}')
+    normalized.content_type = Image.MIME[pil_format]
+    # Like Django's ImageField, keep the decoded image for whoever saves the file
+    normalized.image = image
+    return normalized
+
+
+def decoded(field_file):
+    """The image normalize() decoded for a file field that was assigned its output and not saved yet"""
+    return getattr(getattr(field_file, '_file', None), 'image', None)
+
+
+def derivative_name(name, size, fmt):
+    """Return the storage name of one derivative of the original image"""
+    folder, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    extension = DERIVATIVE_FORMATS[fmt][1]
+    return posixpath.join(folder, 'derivatives', f'{stem}_{size}.{extension}')
+
+
+def derivative_names(name):
+    return [derivative_name(name, size, fmt) for size in DERIVATIVE_SIZES for fmt in DERIVATIVE_FORMATS]
+
+
+def largest_derivative():
+    return max(max(box) for box in DERIVATIVE_SIZES.values())
+
+
+def load(field_file):
+    """Open the original decoded at no more than the largest derivative needs"""
+    largest = largest_derivative()
+    with field_file.storage.open(field_file.name, 'rb') as handle:
+        image = Image.open(handle)
+        # JPEG can decode straight to a reduced scale, which is much cheaper
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def generate(field_file, force=False, source=None):
+    """
+    Write every derivative of an image file, replacing existing ones when
+    forced; ``source`` is the already decoded, upright RGB image, if at hand.
+    """
+    storage = field_file.storage
+    names = derivative_names(field_file.name)
+    if not force and all(storage.exists(name) for name in names):
+        # Identical bytes were uploaded before and share one set of copies
+        return
+    # Content-addressed storage would rename the copies after their own digest
+    save = getattr(storage, 'save_exact', storage.save)
+    original = source if source is not None else load(field_file)
+
+    # Largest first so each smaller size is resampled from the previous one
+    source = original
+    for size, box in sorted(DERIVATIVE_SIZES.items(), key=lambda item: -item[1][0]):
+        resized = source.copy()
+        resized.thumbnail(box, Image.Resampling.LANCZOS)
+        for fmt, (pil_format, extension, options) in DERIVATIVE_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+            name = derivative_name(field_file.name, size, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            save(name, ContentFile(buffer.getvalue()))
+        source = resized
+
+
+def delete(name, storage):
+    for derivative in derivative_names(name):
+        if storage.exists(derivative):
+            storage.delete(derivative)
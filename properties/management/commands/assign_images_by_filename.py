@@ -0,0 +1,135 @@
+"""
+Attach a directory of image files to the listings their names describe.
+
+Names are matched with properties.image_assignment (a TF-IDF token index
+over every listing, built once), then all the new PropertyImage rows are
+written with bulk_create. Files already inside MEDIA_ROOT are referenced
+where they are; files elsewhere are copied into storage first. Files that
+some image already uses are skipped, so the command can be re-run on a
+growing directory.
+
+bulk_create() skips the save signals, so their bookkeeping is done here
+in batches; derivatives and perceptual hashes are left to
+generate_image_derivatives and hash_property_photos.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from admin_panel import file_refs
+from properties import image_assignment
+from properties.models import Property, PropertyImage
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+# Stay below SQLite's limit on query parameters
+BATCH_SIZE = 900
+# Assignments printed by --dry-run without --verbose-matches
+SHOWN = 50
+
+
+def batches(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = 'Assign image files to properties by matching their names against titles and locations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', nargs='?', default=os.path.join(settings.MEDIA_ROOT, 'properties'), help='Directory holding the image files')
+        parser.add_argument('--dry-run', action='store_true', help='Only print the assignments')
+        parser.add_argument('--min-score', type=float, default=image_assignment.MIN_SCORE, help='Lowest similarity accepted, between 0 and 1')
+        parser.add_argument('--per-property', type=int, default=1, help='Most images a listing may end up with')
+        parser.add_argument('--replace', action='store_true', help='Remove the current images of listings that receive a file instead of counting them')
+        parser.add_argument('--verbose-matches', action='store_true', help='Print every assignment with its score')
+
+    def handle(self, *args, **options):
+        directory = os.path.abspath(options['directory'])
+        if not os.path.isdir(directory):
+            raise CommandError(f'{directory} is not a directory.')
+        media_root = os.path.abspath(settings.MEDIA_ROOT)
+        in_media = os.path.commonpath([directory, media_root]) == media_root
+
+        started = time.perf_counter()
+        with os.scandir(directory) as entries:
+            filenames = sorted(
+                entry.name for entry in entries
+                if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        if in_media:
+            # Files referenced in place that an image already points at
+            folder = os.path.relpath(directory, media_root).replace(os.sep, '/')
+            prefix = '' if folder == '.' else folder + '/'
+            used = set()
+            for batch in batches(filenames):
+                used.update(PropertyImage.objects.filter(image__in=[prefix + name for name in batch]).values_list('image', flat=True))
+            filenames = [name for name in filenames if prefix + name not in used]
+
+        matcher = image_assignment.FilenameMatcher.from_database()
+        existing = None
+        if not options['replace']:
+            # Images a listing already has count towards --per-property
+            existing = dict(PropertyImage.objects.values('property_id').annotate(count=Count('pk')).values_list('property_id', 'count'))
+        indexed = time.perf_counter()
+        assignments, unmatched = image_assignment.assign(
+            matcher, filenames, per_property=options['per_property'], min_score=options['min_score'], existing=existing,
+        )
+        matched = time.perf_counter()
+        self.stdout.write(
+            f'{len(filenames)} files, {len(matcher.vectors)} listings: {len(assignments)} assigned, '
+            f'{len(unmatched)} without a good match (index {indexed - started:.2f}s, matching {matched - indexed:.2f}s)'
+        )
+        shown = assignments if options['verbose_matches'] else assignments[:SHOWN] if options['dry_run'] else []
+        titles = {}
+        for batch in batches({pk for filename, pk, score in shown}):
+            titles.update(Property.objects.filter(pk__in=batch).values_list('pk', 'title'))
+        for filename, pk, score in shown:
+            self.stdout.write(f'  {filename} -> {titles[pk]} ({score:.2f})')
+        if len(shown) < len(assignments) and options['dry_run']:
+            self.stdout.write(f'  ... and {len(assignments) - len(shown)} more; use --verbose-matches to list them all')
+        if options['dry_run'] or not assignments:
+            return
+
+        names = {}
+        for filename, pk, score in assignments:
+            if in_media:
+                names[filename] = prefix + filename
+            else:
+                field = PropertyImage._meta.get_field('image')
+                with open(os.path.join(directory, filename), 'rb') as handle:
+                    names[filename] = default_storage.save(field.generate_filename(None, filename), File(handle))
+
+        property_ids = {pk for filename, pk, score in assignments}
+        with transaction.atomic():
+            if options['replace']:
+                for batch in batches(property_ids):
+                    PropertyImage.objects.filter(property_id__in=batch).delete()
+            with_primary = set()
+            for batch in batches(property_ids):
+                with_primary.update(
+                    PropertyImage.objects.filter(property_id__in=batch, is_primary=True).values_list('property_id', flat=True)
+                )
+
+            new_images = []
+            for filename, pk, score in assignments:
+                new_images.append(PropertyImage(property_id=pk, image=names[filename], is_primary=pk not in with_primary))
+                with_primary.add(pk)
+            PropertyImage.objects.bulk_create(new_images, batch_size=BATCH_SIZE)
+
+            # The work of the post_save handlers skipped by bulk_create()
+            for batch in batches(names.values()):
+                file_refs.acquire(batch)
+            for batch in batches(property_ids):
+                Property.refresh_primary_images(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Attached {len(new_images)} images in {time.perf_counter() - started:.1f}s. '
+            'Run generate_image_derivatives and hash_property_photos to finish processing them.'
+        ))
@@ -0,0 +1,132 @@
+"""
+Compare upload handling of large photos before and after normalization.
+
+"before" validates with Django's ImageField, stores the original bytes
+and generates the derivatives from them; "after" runs
+properties.images.normalize() and does the same with its output. Each
+run happens in a forked child process so its peak resident memory can be
+read in isolation (VmHWM on Linux, ru_maxrss elsewhere). Files are
+written to a temporary directory that is removed afterwards.
+"""
+import math
+import multiprocessing
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+from types import SimpleNamespace
+
+from django import forms
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageChops
+
+from properties import images
+from properties.forms import NormalizedImageField
+
+
+def make_photo(megapixels, fmt):
+    """Return the bytes of a synthetic 3:2 photo with a camera orientation tag"""
+    width = int(math.sqrt(megapixels * 1_000_000 * 1.5))
+    height = int(width / 1.5)
+    # A gradient under noise compresses roughly like a real photo
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 12)
+    image = Image.merge('RGB', (gradient, ImageChops.add(gradient, noise, 2), noise))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = BytesIO()
+    image.save(buffer, fmt, exif=exif, **({'quality': 92} if fmt == 'JPEG' else {}))
+    return buffer.getvalue()
+
+
+def reset_peak_memory():
+    try:
+        with open('/proc/self/clear_refs', 'w') as handle:
+            handle.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_memory(reset):
+    """Peak resident set size in bytes since reset_peak_memory()"""
+    if reset:
+        with open('/proc/self/status') as handle:
+            for line in handle:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def handle_upload(variant, data, name, storage):
+    """One upload as the view would process it; returns (validate seconds, total seconds, stored bytes)"""
+    upload = SimpleUploadedFile(name, data, content_type='image/jpeg')
+    started = time.perf_counter()
+    if variant == 'before':
+        cleaned = forms.ImageField().clean(upload)
+        cleaned.seek(0)
+        content = ContentFile(cleaned.read())
+    else:
+        content = NormalizedImageField().clean(upload)
+    validated = time.perf_counter()
+
+    stored = storage.save(f'properties/{content.name if variant == "after" else name}', content)
+    # As PropertyImage.generate_derivatives(), which reuses the image normalize() decoded
+    images.generate(SimpleNamespace(storage=storage, name=stored), force=True, source=getattr(content, 'image', None) if variant == 'after' else None)
+    finished = time.perf_counter()
+    return validated - started, finished - started, storage.size(stored)
+
+
+def run_child(variant, data, name, location, connection):
+    reset = reset_peak_memory()
+    baseline = peak_memory(reset)
+    result = handle_upload(variant, data, name, FileSystemStorage(location=location))
+    connection.send(result + (peak_memory(reset) - baseline,))
+    connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark latency and peak memory of property photo uploads before and after normalization'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=float, default=24, help='Size of the synthetic photo')
+        parser.add_argument('--format', choices=['JPEG', 'PNG'], default='JPEG', help='Encoding of the synthetic photo')
+        parser.add_argument('--repeat', type=int, default=5, help='Uploads per variant; medians are reported')
+
+    def handle(self, *args, **options):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('This benchmark needs the fork start method to measure each upload in isolation.')
+        context = multiprocessing.get_context('fork')
+
+        data = make_photo(options['megapixels'], options['format'])
+        name = 'photo.jpg' if options['format'] == 'JPEG' else 'photo.png'
+        width, height = Image.open(BytesIO(data)).size
+        self.stdout.write(f'Synthetic {options["format"]} photo {width}x{height}, {filesizeformat(len(data))}')
+
+        location = tempfile.mkdtemp()
+        try:
+            for variant in ('before', 'after'):
+                runs = []
+                for _ in range(options['repeat']):
+                    receiver, sender = context.Pipe(duplex=False)
+                    child = context.Process(target=run_child, args=(variant, data, name, location, sender))
+                    child.start()
+                    sender.close()
+                    runs.append(receiver.recv())
+                    child.join()
+
+                validate, total, size, peak = (statistics.median(column) for column in zip(*runs))
+                self.stdout.write(
+                    f'{variant:>6}: validate {validate * 1000:7.1f} ms, upload incl. derivatives {total * 1000:7.1f} ms, '
+                    f'peak memory +{filesizeformat(peak)}, stored {filesizeformat(size)}'
+                )
+        finally:
+            shutil.rmtree(location)
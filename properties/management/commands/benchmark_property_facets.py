@@ -0,0 +1,107 @@
+"""
+Time the property_list facet counts against per-option COUNT queries.
+
+With --listings N the command seeds N synthetic available listings inside
+a transaction that is rolled back afterwards, so it can be run against a
+development database without leaving data behind.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import CustomUser
+from properties import facets
+from properties.forms import PropertySearchForm
+from properties.models import INDIAN_STATES, Property
+
+# Filter sets to benchmark, as submitted by the search form
+SCENARIOS = {
+    'no filters': {},
+    'state': {'state': 'maharashtra'},
+    'state + type + price': {'state': 'maharashtra', 'property_type': 'flat', 'min_price': '2000000'},
+    'area range': {'min_area': '800', 'max_area': '1600'},
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark facet computation for the property search sidebar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=0, help='Seed this many synthetic listings first')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per scenario; the best time is reported')
+        parser.add_argument('--naive', action='store_true', help='Also time one COUNT query per option')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['listings']:
+                    self.seed(options['listings'])
+                self.run(options['repeat'], options['naive'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        seller = CustomUser.objects.create_user('facet-benchmark-seller', role='seller')
+        states = [value for value, label in INDIAN_STATES]
+        types = [value for value, label in Property.PROPERTY_TYPES]
+        rng = random.Random(0)
+        started = time.perf_counter()
+
+        batch = []
+        for i in range(count):
+            batch.append(Property(
+                title=f'Benchmark listing {i}', description='Synthetic listing', address='-',
+                price=rng.randint(5, 500) * 100000, property_type=rng.choice(types),
+                state=rng.choice(states), city='Benchmark', pincode=f'{rng.randint(100000, 999999)}',
+                area=rng.randint(300, 5000), bedrooms=rng.choice([None, 1, 2, 3, 4, 5, 6]), seller=seller,
+            ))
+            if len(batch) == 5000:
+                Property.objects.bulk_create(batch)
+                batch = []
+        Property.objects.bulk_create(batch)
+        self.stdout.write(f'Seeded {count} listings in {time.perf_counter() - started:.1f}s')
+
+    def run(self, repeat, naive):
+        total = Property.objects.filter(status='available').count()
+        self.stdout.write(f'{total} available listings')
+
+        for name, data in SCENARIOS.items():
+            form = PropertySearchForm(data)
+            form.is_valid()
+            queryset = facets.base_queryset(form)
+
+            grouped = self.best_of(repeat, lambda: facets.get_facets(form.cleaned_data, queryset, cached=False))
+            line = f'{name:<24} grouped: {grouped * 1000:8.1f} ms'
+            if naive:
+                per_option = self.best_of(1, lambda: self.count_per_option(form))
+                line += f'   per-option COUNTs: {per_option * 1000:8.1f} ms'
+            self.stdout.write(line)
+
+    def count_per_option(self, form):
+        for name in facets.FACET_FIELDS:
+            base = Property.objects.filter(form.build_filters(exclude=(name,)))
+            for value, label in form.fields[name].choices:
+                if value != '':
+                    base.filter(**{name: value}).count()
+        for label, low, high in facets.PRICE_BUCKETS:
+            queryset = Property.objects.filter(form.build_filters(exclude=facets.PRICE_FIELDS))
+            if low is not None:
+                queryset = queryset.filter(price__gte=low)
+            if high is not None:
+                queryset = queryset.filter(price__lt=high)
+            queryset.count()
+
+    def best_of(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
@@ -0,0 +1,89 @@
+"""
+Run EXPLAIN QUERY PLAN for every PropertySearchForm filter combination and
+report the ones that still fall back to a full table scan.
+"""
+from itertools import combinations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from properties.forms import PropertySearchForm
+from properties.models import Property
+
+# Representative values for each search field
+SAMPLE_VALUES = {
+    'property_type': 'flat',
+    'state': 'maharashtra',
+    'city': 'pune',
+    'pincode': '411001',
+    'min_price': '1000000',
+    'max_price': '5000000',
+    'min_area': '500',
+    'max_area': '2000',
+}
+
+
+class Command(BaseCommand):
+    help = 'Report the SQLite query plan of every property_list filter combination'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Print the full plan for every combination, not only the scanning ones',
+        )
+        parser.add_argument(
+            '--fail-on-scan', action='store_true',
+            help='Exit with an error if any combination scans the property table',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN is only supported on SQLite.')
+
+        table = Property._meta.db_table
+        fields = list(SAMPLE_VALUES)
+        scanning = []
+        total = 0
+
+        for size in range(len(fields) + 1):
+            for combo in combinations(fields, size):
+                form = PropertySearchForm({name: SAMPLE_VALUES[name] for name in combo})
+                if not form.is_valid():
+                    raise CommandError(f'Sample values rejected for {combo}: {form.errors.as_text()}')
+
+                queryset = Property.objects.filter(form.build_filters()).order_by('-date_created')
+                plan = self.explain(queryset)
+                total += 1
+
+                label = ', '.join(combo) or '(no filters)'
+                scans = any(detail.startswith(f'SCAN {table}') for detail in plan)
+                temp_sort = any('TEMP B-TREE' in detail for detail in plan)
+
+                if scans:
+                    scanning.append(label)
+                if scans or options['verbose_plans']:
+                    status = 'SCAN' if scans else 'ok'
+                    if temp_sort:
+                        status += ' +sort'
+                    self.stdout.write(f'[{status}] {label}')
+                    for detail in plan:
+                        self.stdout.write(f'    {detail}')
+
+        self.stdout.write('')
+        if scanning:
+            self.stdout.write(self.style.WARNING(
+                f'{len(scanning)} of {total} filter combinations scan {table}.'
+            ))
+            if options['fail_on_scan']:
+                raise CommandError('Full table scans detected.')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'All {total} filter combinations use an index.'
+            ))
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            # Rows are (id, parent, notused, detail)
+            return [row[-1] for row in cursor.fetchall()]
@@ -0,0 +1,66 @@
+"""
+Generate the resized WebP/JPEG copies for existing PropertyImage rows.
+
+Images are decoded and encoded in a thread pool (Pillow releases the GIL
+while it works), and the has_derivatives flag is set with one UPDATE per
+batch.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from properties import images
+from properties.models import PropertyImage
+
+
+def process(image, force):
+    try:
+        images.generate(image.image, force=force)
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+        return image.pk, str(error)
+    return image.pk, None
+
+
+class Command(BaseCommand):
+    help = 'Create thumbnail and WebP derivatives for property images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of images processed at once')
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows loaded and flagged per batch')
+        parser.add_argument('--force', action='store_true', help='Regenerate images that already have derivatives')
+
+    def handle(self, *args, **options):
+        queryset = PropertyImage.objects.exclude(image='').only('pk', 'image').order_by('pk')
+        if not options['force']:
+            queryset = queryset.filter(has_derivatives=False)
+
+        done = 0
+        failed = 0
+        last_pk = 0
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                batch = list(queryset.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                succeeded = []
+                for pk, error in executor.map(process, batch, [options['force']] * len(batch)):
+                    if error:
+                        failed += 1
+                        self.stderr.write(f'Image {pk}: {error}')
+                    else:
+                        succeeded.append(pk)
+                PropertyImage.objects.filter(pk__in=succeeded).update(has_derivatives=True)
+
+                done += len(succeeded)
+                self.stdout.write(f'{done} images processed, {failed} failed')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated derivatives for {done} images in {elapsed:.1f}s ({failed} failed)'
+        ))
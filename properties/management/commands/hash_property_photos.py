@@ -0,0 +1,79 @@
+"""
+Compute the perceptual hash of existing PropertyImage rows and list the
+photos reused across listings.
+
+Files are decoded in a thread pool at the smallest scale the format
+allows; rows that share a stored file (identical uploads) are hashed
+once. Hashes are written with bulk_update per batch, and the duplicate
+index version is bumped once at the end so running processes reload it.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from properties import duplicates
+from properties.models import PropertyImage
+
+
+def process(image):
+    try:
+        return image.image.name, duplicates.dhash(duplicates.load(image.image)), None
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+        return image.image.name, None, str(error)
+
+
+class Command(BaseCommand):
+    help = 'Compute perceptual hashes of property photos and report near-duplicates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of files decoded at once')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows loaded and updated per batch')
+        parser.add_argument('--force', action='store_true', help='Recompute hashes that are already stored')
+        parser.add_argument('--radius', type=int, help='Differing bits still counted as the same photo')
+
+    def handle(self, *args, **options):
+        queryset = PropertyImage.objects.exclude(image='').only('pk', 'image', 'phash').order_by('pk')
+        if not options['force']:
+            queryset = queryset.filter(phash=None)
+
+        done = 0
+        failed = 0
+        last_pk = 0
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                batch = list(queryset.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                # One decode per stored file, however many rows point at it
+                files = {image.image.name: image for image in batch}
+                hashes = {}
+                for name, phash, error in executor.map(process, files.values()):
+                    if error:
+                        failed += 1
+                        self.stderr.write(f'{name}: {error}')
+                    else:
+                        hashes[name] = phash
+                updated = [image for image in batch if image.image.name in hashes]
+                for image in updated:
+                    image.phash = hashes[image.image.name]
+                PropertyImage.objects.bulk_update(updated, ['phash'])
+
+                done += len(updated)
+                self.stdout.write(f'{done} images hashed, {failed} files failed')
+
+        duplicates.bump_version()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Hashed {done} images in {elapsed:.1f}s ({failed} files failed)'))
+
+        groups = duplicates.index.groups(options['radius'])
+        reused = [group for group in groups if len({property_id for pk, property_id in group}) > 1]
+        self.stdout.write(
+            f'{len(reused)} photos are used on more than one listing '
+            f'({sum(len(group) for group in reused)} images); see the duplicate photo report in the admin panel.'
+        )
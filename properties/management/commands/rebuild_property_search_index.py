@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from properties import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the keyword search index from the property table'
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            raise CommandError('The keyword search index is only available on SQLite.')
+
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} properties.'))
@@ -0,0 +1,190 @@
+"""
+Match new or changed listings against users' saved searches.
+
+Saved searches are bucketed by their most selective discrete filter
+(pincode, else state, else property type, else a catch-all bucket). Each
+bucket holds two centered interval trees over the searches' price and
+area ranges, with missing bounds treated as unbounded. Matching a listing
+probes at most four buckets, stabs both trees with the listing's price
+and area, and checks the remaining filters only for searches that pass
+both, so the work grows with the number of matches rather than with the
+number of saved searches.
+
+The index lives in process memory and is rebuilt when the version
+counter changes; the PropertySearch signal handlers bump it. The counter
+is a database row (see safeestate.counters), so every process sees a
+bump once the change commits, and it never goes back to a value some
+process has already loaded.
+"""
+import math
+import threading
+
+from safeestate import counters
+
+from .models import PropertySearch, SavedSearchMatch
+
+VERSION_COUNTER = 'versions:saved_searches'
+MATCH_FIELDS = ('status', 'price', 'area', 'property_type', 'state', 'city', 'pincode')
+
+
+class IntervalTree:
+    """Static centered interval tree answering "which intervals contain x" queries"""
+
+    def __init__(self, intervals):
+        self.root = self._build(list(intervals))
+
+    def _build(self, intervals):
+        if not intervals:
+            return None
+        points = sorted(p for low, high, _ in intervals for p in (low, high) if math.isfinite(p))
+        center = points[len(points) // 2] if points else 0.0
+
+        left, right, overlapping = [], [], []
+        for interval in intervals:
+            if interval[1] < center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                overlapping.append(interval)
+
+        return (
+            center,
+            sorted(overlapping, key=lambda interval: interval[0]),
+            sorted(overlapping, key=lambda interval: interval[1], reverse=True),
+            self._build(left),
+            self._build(right),
+        )
+
+    def stab(self, point):
+        """Return the values of every interval containing point"""
+        found = []
+        node = self.root
+        while node is not None:
+            center, by_low, by_high, left, right = node
+            if point < center:
+                for low, high, value in by_low:
+                    if low > point:
+                        break
+                    found.append(value)
+                node = left
+            elif point > center:
+                for low, high, value in by_high:
+                    if high < point:
+                        break
+                    found.append(value)
+                node = right
+            else:
+                found.extend(value for _, _, value in by_low)
+                break
+        return found
+
+
+def bounds(low, high):
+    return (
+        float(low) if low is not None else -math.inf,
+        float(high) if high is not None else math.inf,
+    )
+
+
+def bucket_key(pincode, state, property_type):
+    if pincode:
+        return ('pincode', pincode)
+    if state:
+        return ('state', state)
+    if property_type:
+        return ('type', property_type)
+    return ('any',)
+
+
+class SavedSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._searches = {}
+        self._buckets = {}
+
+    def build(self, version=None):
+        rows = PropertySearch.objects.values_list(
+            'pk', 'user_id', 'property_type', 'state', 'city', 'pincode',
+            'min_price', 'max_price', 'min_area', 'max_area',
+        )
+        searches = {}
+        grouped = {}
+        for pk, user_id, property_type, state, city, pincode, min_price, max_price, min_area, max_area in rows:
+            searches[pk] = (user_id, property_type, state, city.strip().casefold(), pincode.strip())
+            price_range = bounds(min_price, max_price)
+            area_range = bounds(min_area, max_area)
+            bucket = grouped.setdefault(bucket_key(pincode.strip(), state, property_type), ([], []))
+            bucket[0].append((*price_range, pk))
+            bucket[1].append((*area_range, pk))
+
+        with self._lock:
+            self._searches = searches
+            self._buckets = {
+                key: (IntervalTree(prices), IntervalTree(areas))
+                for key, (prices, areas) in grouped.items()
+            }
+            self._version = version
+
+    def ensure_fresh(self):
+        version = counters.get_value(VERSION_COUNTER)
+        if version != self._version:
+            self.build(version)
+
+    def match(self, property_obj):
+        """Return the ids of saved searches the listing satisfies, excluding the seller's own"""
+        self.ensure_fresh()
+        price = float(property_obj.price)
+        area = float(property_obj.area)
+        city = (property_obj.city or '').casefold()
+        pincode = (property_obj.pincode or '').strip()
+
+        with self._lock:
+            buckets = self._buckets
+            searches = self._searches
+
+        matched = []
+        for key in {bucket_key(pincode, None, None), bucket_key(None, property_obj.state, None),
+                    bucket_key(None, None, property_obj.property_type), ('any',)}:
+            if key not in buckets:
+                continue
+            price_tree, area_tree = buckets[key]
+            candidates = set(price_tree.stab(price))
+            if not candidates:
+                continue
+            for pk in area_tree.stab(area):
+                if pk not in candidates:
+                    continue
+                user_id, property_type, state, search_city, search_pincode = searches[pk]
+                if user_id == property_obj.seller_id:
+                    continue
+                if property_type and property_type != property_obj.property_type:
+                    continue
+                if state and state != property_obj.state:
+                    continue
+                if search_pincode and search_pincode != pincode:
+                    continue
+                if search_city and search_city not in city:
+                    continue
+                matched.append(pk)
+        return matched
+
+
+def bump_version():
+    return counters.increment(VERSION_COUNTER)
+
+
+def record_matches(property_obj):
+    """Store a SavedSearchMatch for every saved search an available listing satisfies"""
+    if property_obj.status != 'available':
+        return []
+    search_ids = index.match(property_obj)
+    SavedSearchMatch.objects.bulk_create(
+        [SavedSearchMatch(search_id=pk, property=property_obj) for pk in search_ids],
+        ignore_conflicts=True,
+    )
+    return search_ids
+
+
+index = SavedSearchIndex()
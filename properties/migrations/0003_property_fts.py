@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS properties_property_fts '
+        'USING fts5(title, description, address, city)'
+    )
+    schema_editor.execute(
+        'INSERT INTO properties_property_fts (rowid, title, description, address, city) '
+        'SELECT id, title, description, address, city FROM properties_property'
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS properties_property_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0002_property_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_geohashes(apps, schema_editor):
+    from properties.geo import encode
+
+    Property = apps.get_model('properties', 'Property')
+    located = Property.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for property_obj in located.only('pk', 'latitude', 'longitude').iterator():
+        geohash = encode(property_obj.latitude, property_obj.longitude)
+        Property.objects.filter(pk=property_obj.pk).update(geohash=geohash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0004_property_primary_image'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, help_text='Derived from latitude/longitude for radius search', max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['status', 'geohash'], name='property_status_geohash_idx'),
+        ),
+        migrations.RunPython(backfill_geohashes, migrations.RunPython.noop),
+    ]
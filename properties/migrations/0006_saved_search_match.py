@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0005_property_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearchMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_matched', models.DateTimeField(auto_now_add=True)),
+                ('date_notified', models.DateTimeField(blank=True, null=True)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_search_matches', to='properties.property')),
+                ('search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='properties.propertysearch')),
+            ],
+            options={
+                'ordering': ['-date_matched'],
+                'indexes': [models.Index(fields=['date_notified', 'date_matched'], name='saved_match_pending_idx')],
+                'constraints': [models.UniqueConstraint(fields=('search', 'property'), name='unique_saved_search_match')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0006_saved_search_match'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['status', 'state', 'property_type', 'bedrooms', 'price'], name='property_facet_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0007_property_facet_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertyimage',
+            name='has_derivatives',
+            field=models.BooleanField(default=False, editable=False, help_text='Resized WebP/JPEG copies have been generated'),
+        ),
+    ]
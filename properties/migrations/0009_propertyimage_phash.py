@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0008_propertyimage_has_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertyimage',
+            name='phash',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Perceptual hash of the photo, used to find reused photos', null=True),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from safeestate.counters import CountedModelMixin
+from . import geo, images
 
 User = get_user_model()
 
@@ -36,7 +38,7 @@ INDIAN_STATES = [
     ('delhi', 'Delhi'),
 ]
 
-class Property(models.Model):
+class Property(CountedModelMixin, models.Model):
     PROPERTY_TYPES = [
         ('plot', 'Plot'),
         ('flat', 'Flat'),
@@ -65,6 +67,7 @@ class Property(models.Model):
     # Optional Location Coordinates
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, editable=False, help_text='Derived from latitude/longitude for radius search')
     
     # Property Details
     area = models.DecimalField(max_digits=10, decimal_places=2, help_text='Area in square feet')
@@ -75,6 +78,12 @@ class Property(models.Model):
     seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='properties')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='available')
     
+    # Denormalized first image (primary first, then oldest) for listing cards
+    primary_image = models.ForeignKey(
+        'PropertyImage', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', editable=False
+    )
+    
     # Timestamps
     date_created = models.DateTimeField(auto_now_add=True)
     date_updated = models.DateTimeField(auto_now=True)
@@ -82,18 +91,50 @@ class Property(models.Model):
     class Meta:
         verbose_name_plural = 'Properties'
         ordering = ['-date_created']
+        # Composite indexes for the filter shapes produced by PropertySearchForm
+        indexes = [
+            models.Index(fields=['status', '-date_created'], name='property_status_created_idx'),
+            models.Index(fields=['status', 'state', 'property_type', '-date_created'], name='property_state_type_idx'),
+            models.Index(fields=['status', 'property_type', '-date_created'], name='property_type_created_idx'),
+            models.Index(fields=['status', 'price'], name='property_status_price_idx'),
+            models.Index(fields=['status', 'area'], name='property_status_area_idx'),
+            models.Index(fields=['status', 'pincode'], name='property_status_pincode_idx'),
+            models.Index(fields=['status', 'geohash'], name='property_status_geohash_idx'),
+            # Covering index for the grouped facet counts (see properties/facets.py)
+            models.Index(fields=['status', 'state', 'property_type', 'bedrooms', 'price'], name='property_facet_idx'),
+        ]
     
     def __str__(self):
         return f'{self.title} - {self.city}, {self.get_state_display()}'
     
     def get_absolute_url(self):
         return reverse('properties:property_detail', kwargs={'pk': self.pk})
+    
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def refresh_primary_images(cls, property_ids):
+        """Recompute primary_image for the given properties in one UPDATE"""
+        first_image = PropertyImage.objects.filter(
+            property=models.OuterRef('pk')
+        ).order_by('-is_primary', 'date_uploaded', 'pk').values('pk')[:1]
+        cls.objects.filter(pk__in=property_ids).update(primary_image=models.Subquery(first_image))
 
 class PropertyImage(models.Model):
     property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='properties/')
     caption = models.CharField(max_length=200, blank=True)
     is_primary = models.BooleanField(default=False)
+    has_derivatives = models.BooleanField(default=False, editable=False, help_text='Resized WebP/JPEG copies have been generated')
+    phash = models.BigIntegerField(null=True, blank=True, editable=False, help_text='Perceptual hash of the photo, used to find reused photos')
     date_uploaded = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -101,6 +142,27 @@ class PropertyImage(models.Model):
     
     def __str__(self):
         return f'Image for {self.property.title}'
+    
+    def derivative_url(self, size, fmt='jpeg'):
+        """URL of a resized copy, or of the original until the copies exist"""
+        if not self.has_derivatives:
+            return self.image.url
+        return self.image.storage.url(images.derivative_name(self.image.name, size, fmt))
+    
+    def derivative_srcset(self, fmt='jpeg'):
+        if not self.has_derivatives:
+            return ''
+        return ', '.join(
+            f'{self.derivative_url(size, fmt)} {width}w'
+            for size, (width, height) in sorted(images.DERIVATIVE_SIZES.items(), key=lambda item: item[1][0])
+        )
+    
+    def generate_derivatives(self, source=None):
+        """Create the resized copies and flag the row without re-sending save signals"""
+        images.generate(self.image, source=source)
+        PropertyImage.objects.filter(pk=self.pk).update(has_derivatives=True)
+        self.has_derivatives = True
+        self._derivatives_source = self.image.name
 
 class VisitRequest(models.Model):
     STATUS_CHOICES = [
@@ -148,3 +210,22 @@ class PropertySearch(models.Model):
     
     def __str__(self):
         return f'{self.name} - {self.user.username}'
+
+class SavedSearchMatch(models.Model):
+    """A listing that matched a saved search, waiting to be notified"""
+    search = models.ForeignKey(PropertySearch, on_delete=models.CASCADE, related_name='matches')
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='saved_search_matches')
+    date_matched = models.DateTimeField(auto_now_add=True)
+    date_notified = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-date_matched']
+        constraints = [
+            models.UniqueConstraint(fields=['search', 'property'], name='unique_saved_search_match'),
+        ]
+        indexes = [
+            models.Index(fields=['date_notified', 'date_matched'], name='saved_match_pending_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.property.title} matched {self.search.name}'
@@ -0,0 +1,100 @@
+"""
+Keyword search for property listings backed by an SQLite FTS5 index.
+
+The index lives in a separate virtual table (see migration
+0003_property_fts) holding a copy of title, description, address and city,
+keyed by the property id. It is kept in sync by the signal handlers in
+properties/signals.py and can be rebuilt with the
+``rebuild_property_search_index`` management command. On other databases
+keyword search falls back to ``icontains`` lookups.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'properties_property_fts'
+FTS_COLUMNS = ('title', 'description', 'address', 'city')
+
+# BM25 column weights, in FTS_COLUMNS order
+BM25_WEIGHTS = (10.0, 1.0, 2.0, 5.0)
+
+
+def fts_available():
+    """Return True if the FTS5 index can be used on the current database"""
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 MATCH expression of quoted prefix terms"""
+    tokens = re.findall(r'\w+', text or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def keyword_search(queryset, text, rank=False):
+    """Filter a Property queryset by keywords, optionally ordered by BM25 rank"""
+    match = build_match_query(text)
+    if not match:
+        return queryset
+
+    if not fts_available():
+        for token in re.findall(r'\w+', text):
+            queryset = queryset.filter(
+                Q(title__icontains=token) |
+                Q(description__icontains=token) |
+                Q(address__icontains=token) |
+                Q(city__icontains=token)
+            )
+        return queryset
+
+    queryset = queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    )
+    if rank:
+        table = queryset.model._meta.db_table
+        weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+        queryset = queryset.annotate(
+            search_rank=RawSQL(
+                f'SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+                [match],
+            )
+        ).order_by('search_rank', '-date_created')
+    return queryset
+
+
+def index_property(property_obj):
+    """Insert or refresh the index row for a property"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [property_obj.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, {", ".join(FTS_COLUMNS)}) VALUES (%s, %s, %s, %s, %s)',
+            [property_obj.pk] + [getattr(property_obj, column) for column in FTS_COLUMNS],
+        )
+
+
+def unindex_property(pk):
+    """Remove a property from the index"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+
+
+def rebuild_index():
+    """Repopulate the whole index from the property table and return the row count"""
+    from .models import Property
+
+    table = Property._meta.db_table
+    columns = ', '.join(FTS_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {columns} FROM {table}'
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
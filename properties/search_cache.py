@@ -0,0 +1,135 @@
+"""
+Result cache for property_list searches.
+
+A cached entry holds only the ordered primary keys of one result page
+(plus the navigation state needed to render it), keyed on the normalized
+search form data and the requested page or cursor. Every key embeds a
+version number for the narrowest bucket the search depends on: its state,
+else its property type, else a global bucket. When a listing is created,
+deleted or saved, the signal handlers in properties/signals.py bump the
+versions of the buckets it belonged to before and after the change, so
+only searches that could have included it miss.
+
+The versions are counters in the database (see safeestate.counters),
+bumped in the transaction that changes the listing, so every worker
+process sees them as soon as the change commits and no earlier. The
+pages themselves stay in the default, per-process cache. Hits and misses
+are tallied in memory and added to their counters at most once every
+STATS_FLUSH_SECONDS per process, so serving a page never writes.
+"""
+import hashlib
+import json
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+from safeestate import counters
+from safeestate.pagination import page_state, paginate, restore_page
+
+CACHE_PREFIX = 'property_search'
+VERSION_PREFIX = 'versions:search'
+GLOBAL_VERSION = f'{VERSION_PREFIX}:all'
+STATS_COUNTERS = {'hits': 'search_cache:hits', 'misses': 'search_cache:misses'}
+STATS_FLUSH_SECONDS = 60
+
+
+def cache_timeout():
+    return getattr(settings, 'PROPERTY_SEARCH_CACHE_TIMEOUT', 300)
+
+
+def normalize(cleaned_data):
+    """Return the non-empty search values in a canonical, hashable form"""
+    normalized = {}
+    for name, value in (cleaned_data or {}).items():
+        if value in (None, ''):
+            continue
+        if isinstance(value, Decimal):
+            value = str(value.normalize())
+        elif isinstance(value, str):
+            value = ' '.join(value.lower().split())
+        normalized[name] = value
+    return normalized
+
+
+def version_key(normalized):
+    if normalized.get('state'):
+        return f'{VERSION_PREFIX}:state:{normalized["state"]}'
+    if normalized.get('property_type'):
+        return f'{VERSION_PREFIX}:type:{normalized["property_type"]}'
+    return GLOBAL_VERSION
+
+
+def get_version(name):
+    return counters.get_value(name)
+
+
+def invalidate(buckets):
+    """Invalidate searches over the given (state, property_type) buckets, as part of the current transaction"""
+    names = {GLOBAL_VERSION}
+    for state, property_type in buckets:
+        names.add(f'{VERSION_PREFIX}:state:{state}')
+        names.add(f'{VERSION_PREFIX}:type:{property_type}')
+    counters.apply_deltas(dict.fromkeys(names, 1))
+
+
+class Stats:
+    """Hit/miss tally of this process not yet added to the counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pending = dict.fromkeys(STATS_COUNTERS, 0)
+        self.flushed = time.monotonic()
+
+    def record(self, outcome):
+        with self._lock:
+            self.pending[outcome] += 1
+            if time.monotonic() - self.flushed < STATS_FLUSH_SECONDS:
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            deltas = {STATS_COUNTERS[name]: count for name, count in self.pending.items()}
+            self.pending = dict.fromkeys(STATS_COUNTERS, 0)
+            self.flushed = time.monotonic()
+        counters.apply_deltas(deltas)
+
+
+def record(outcome):
+    stats.record(outcome)
+
+
+def get_stats():
+    """Return hit/miss totals: every process's flushed counts plus this one's pending ones"""
+    values = counters.get_values(STATS_COUNTERS.values())
+    return {name: values[counter] + stats.pending[name] for name, counter in STATS_COUNTERS.items()}
+
+
+def get_page(request, cleaned_data, queryset, per_page, field, keyset=True):
+    """Return (page_obj, total_count) like paginate(), served from the cache when possible"""
+    normalized = normalize(cleaned_data)
+    version = version_key(normalized)
+    payload = json.dumps({
+        'search': normalized,
+        'page': request.GET.get('page'),
+        'cursor': request.GET.get('cursor'),
+        'keyset': keyset,
+    }, sort_keys=True)
+    digest = hashlib.sha1(payload.encode()).hexdigest()
+    key = f'{CACHE_PREFIX}:page:{get_version(version)}:{digest}'
+
+    state = cache.get(key)
+    if state is not None:
+        record('hits')
+        return restore_page(state, queryset, request, per_page, field)
+
+    record('misses')
+    page_obj, total_count = paginate(request, queryset, per_page, field, keyset=keyset)
+    cache.set(key, page_state(page_obj, total_count), cache_timeout())
+    return page_obj, total_count
+
+
+stats = Stats()
@@ -0,0 +1,151 @@
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+from django.dispatch import receiver
+from PIL import Image
+
+from .models import Property, PropertyImage, PropertySearch
+from . import autocomplete, duplicates, images, matching, search, search_cache
+
+
+@receiver(post_save, sender=Property)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """Keep the keyword search index in step with the listing text"""
+    if update_fields is not None and not set(update_fields) & set(search.FTS_COLUMNS):
+        return
+    search.index_property(instance)
+
+
+@receiver(post_delete, sender=Property)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.unindex_property(instance.pk)
+
+
+@receiver(post_save, sender=PropertyImage)
+@receiver(post_delete, sender=PropertyImage)
+def update_primary_image(sender, instance, **kwargs):
+    """Keep Property.primary_image pointing at the first image of the listing"""
+    Property.refresh_primary_images([instance.property_id])
+
+
+@receiver(post_init, sender=Property)
+def remember_search_bucket(sender, instance, **kwargs):
+    deferred = instance.get_deferred_fields()
+    if 'state' not in deferred and 'property_type' not in deferred:
+        instance._search_bucket = (instance.state, instance.property_type)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def invalidate_search_cache(sender, instance, **kwargs):
+    """Expire cached searches that could have included this listing before or after the change"""
+    buckets = {(instance.state, instance.property_type)}
+    previous = getattr(instance, '_search_bucket', None)
+    if previous:
+        buckets.add(previous)
+    search_cache.invalidate(buckets)
+    instance._search_bucket = (instance.state, instance.property_type)
+
+
+@receiver(post_init, sender=Property)
+def remember_autocomplete_key(sender, instance, **kwargs):
+    if not {'city', 'state', 'pincode'} & instance.get_deferred_fields():
+        instance._autocomplete_key = (instance.city, instance.state, instance.pincode)
+
+
+@receiver(post_save, sender=Property)
+def update_autocomplete_index(sender, instance, created, update_fields=None, **kwargs):
+    """Make a new listing's city and pincode suggestible straight away, and expire edited ones"""
+    key = (instance.city, instance.state, instance.pincode)
+    previous = getattr(instance, '_autocomplete_key', None)
+    if created:
+        autocomplete.index.add_listing(*key)
+    elif previous is None:
+        # Loaded with the location deferred, so a change cannot be ruled out
+        if update_fields is None or {'city', 'state', 'pincode'} & set(update_fields):
+            autocomplete.bump_version()
+    elif previous != key:
+        autocomplete.bump_version()
+    instance._autocomplete_key = key
+
+
+@receiver(post_delete, sender=Property)
+def forget_autocomplete_entry(sender, instance, **kwargs):
+    autocomplete.bump_version()
+
+
+@receiver(post_save, sender=Property)
+def match_saved_searches(sender, instance, update_fields=None, **kwargs):
+    """Record saved searches that the new or changed listing now satisfies"""
+    if update_fields is not None and not set(update_fields) & set(matching.MATCH_FIELDS):
+        return
+    matching.record_matches(instance)
+
+
+@receiver(post_save, sender=PropertySearch)
+@receiver(post_delete, sender=PropertySearch)
+def invalidate_saved_search_index(sender, instance, **kwargs):
+    matching.bump_version()
+
+
+@receiver(post_init, sender=PropertyImage)
+def remember_derivatives_source(sender, instance, **kwargs):
+    if 'image' not in instance.get_deferred_fields():
+        instance._derivatives_source = instance.image.name
+
+
+@receiver(pre_save, sender=PropertyImage)
+def keep_decoded_upload(sender, instance, **kwargs):
+    """Hold on to the image normalize() decoded; saving the file replaces it with a plain name"""
+    if 'image' not in instance.get_deferred_fields():
+        instance._decoded_upload = images.decoded(instance.image)
+
+
+@receiver(post_init, sender=PropertyImage)
+def remember_hash_source(sender, instance, **kwargs):
+    if 'image' not in instance.get_deferred_fields():
+        instance._hash_source = instance.image.name
+
+
+# Connected before update_image_derivatives, which consumes the decoded upload
+@receiver(post_save, sender=PropertyImage)
+def update_photo_hash(sender, instance, **kwargs):
+    """Hash a new or replaced photo for the duplicate photo index"""
+    if instance.phash is not None and getattr(instance, '_hash_source', None) == instance.image.name:
+        return
+    instance._hash_source = instance.image.name
+    if not instance.image:
+        return
+    try:
+        duplicates.update_hash(instance, instance.__dict__.get('_decoded_upload'))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # Unreadable upload; it stays out of the index
+        if instance.phash is not None:
+            PropertyImage.objects.filter(pk=instance.pk).update(phash=None)
+            instance.phash = None
+
+
+@receiver(post_delete, sender=PropertyImage)
+def forget_photo_hash(sender, instance, **kwargs):
+    if instance.phash is not None:
+        duplicates.bump_version()
+
+
+@receiver(post_save, sender=PropertyImage)
+def update_image_derivatives(sender, instance, **kwargs):
+    """Generate resized copies of a new or replaced upload"""
+    if instance.has_derivatives and getattr(instance, '_derivatives_source', None) == instance.image.name:
+        return
+    
+    if instance.has_derivatives:
+        # The file was replaced; the old copies are removed with the old file (see admin_panel.file_refs)
+        PropertyImage.objects.filter(pk=instance.pk).update(has_derivatives=False)
+        instance.has_derivatives = False
+    instance._derivatives_source = instance.image.name
+    
+    source = instance.__dict__.pop('_decoded_upload', None)
+    if not instance.image or not images.generate_on_upload():
+        return
+    try:
+        instance.generate_derivatives(source)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # Unreadable upload; pages fall back to the original file
+        pass
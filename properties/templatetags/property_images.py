@@ -0,0 +1,33 @@
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+# Rendered width of each image slot, for the sizes attribute
+SLOT_SIZES = {
+    'admin': '200px',
+    'card': '(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw',
+    'detail': '(min-width: 1024px) 66vw, 100vw',
+}
+
+
+@register.simple_tag
+def webp_source(image, size):
+    """<source> offering the WebP copies inside a <picture>, if they exist"""
+    if not image or not image.has_derivatives:
+        return ''
+    return format_html(
+        '<source type="image/webp" srcset="{}" sizes="{}">',
+        image.derivative_srcset('webp'), SLOT_SIZES[size]
+    )
+
+
+@register.simple_tag
+def image_attrs(image, size):
+    """src, srcset and sizes attributes for an <img> showing a PropertyImage"""
+    if not image.has_derivatives:
+        return format_html('src="{}"', image.image.url)
+    return format_html(
+        'src="{}" srcset="{}" sizes="{}"',
+        image.derivative_url(size), image.derivative_srcset(), SLOT_SIZES[size]
+    )
@@ -1,3 +1,634 @@
-from django.test import TestCase
+import os
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image, ImageDraw
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from admin_panel.models import StoredFile
+from safeestate import counters, pagination
+from .forms import PropertyImageUploadForm
+from .models import Property, PropertyImage, PropertySearch, SavedSearchMatch
+from .search import keyword_search
+from . import autocomplete, duplicates, facets, geo, image_assignment, images, matching, search, search_cache
+
+
+def create_property(seller, **kwargs):
+    defaults = {
+        'title': 'Riverside Cottage',
+        'description': 'Quiet cottage near the river',
+        'price': 2500000,
+        'property_type': 'house',
+        'state': 'uttarakhand',
+        'city': 'Rishikesh',
+        'pincode': '249201',
+        'address': 'Tapovan',
+        'area': 1200,
+    }
+    defaults.update(kwargs)
+    return Property.objects.create(seller=seller, **defaults)
+
+
+class PrimaryImageTests(TestCase):
+    def setUp(self):
+        self.seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        self.property = create_property(self.seller)
+
+    def refresh(self):
+        self.property.refresh_from_db()
+        return self.property.primary_image
+
+    def test_primary_image_follows_image_changes(self):
+        first = PropertyImage.objects.create(property=self.property, image='properties/first.jpg')
+        self.assertEqual(self.refresh(), first)
+
+        second = PropertyImage.objects.create(property=self.property, image='properties/second.jpg')
+        self.assertEqual(self.refresh(), first)
+
+        second.is_primary = True
+        second.save()
+        self.assertEqual(self.refresh(), second)
+
+        second.delete()
+        self.assertEqual(self.refresh(), first)
+
+        self.property.images.all().delete()
+        self.assertIsNone(self.refresh())
+
+
+class ListingQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # A fresh tally, so no stats flush lands inside a measured request
+        search_cache.stats = search_cache.Stats()
+        self.seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+
+    def add_properties(self, count):
+        for i in range(count):
+            property_obj = create_property(self.seller, title=f'Listing {i}')
+            PropertyImage.objects.create(property=property_obj, image=f'properties/{i}.jpg', is_primary=True)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_property_list_query_count_is_constant(self):
+        url = reverse('properties:property_list')
+        self.add_properties(2)
+        small_page = self.count_queries(url)
+        self.add_properties(10)
+        full_page = self.count_queries(url)
+        self.assertEqual(small_page, full_page)
+
+    def test_my_properties_query_count_is_constant(self):
+        self.client.force_login(self.seller)
+        url = reverse('properties:my_properties')
+        self.add_properties(2)
+        small_page = self.count_queries(url)
+        self.add_properties(10)
+        full_page = self.count_queries(url)
+        self.assertEqual(small_page, full_page)
+
+
+@mock.patch.object(pagination, 'NUMBERED_PAGES_LIMIT', 2)
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        for i in range(7):
+            create_property(seller, title=f'Listing {i}')
+        # Pairs of listings share a timestamp, so pages have to break ties on the id
+        start = Property.objects.earliest('date_created').date_created
+        for i, pk in enumerate(Property.objects.order_by('pk').values_list('pk', flat=True)):
+            Property.objects.filter(pk=pk).update(date_created=start + timedelta(minutes=i // 2))
+        self.listings = Property.objects.filter(status='available').order_by('-date_created', '-pk')
+
+    def page(self, **params):
+        request = RequestFactory().get('/', params)
+        return pagination.paginate(request, self.listings, 3, 'date_created')
+
+    def test_numbered_pages_up_to_the_limit(self):
+        Property.objects.filter(pk=self.listings.last().pk).delete()
+        page_obj, total = self.page()
+        self.assertEqual(total, 6)
+        self.assertFalse(getattr(page_obj, 'is_cursor', False))
+
+        create_property(CustomUser.objects.get(), title='Seventh')
+        page_obj, total = self.page()
+        self.assertIsNone(total)
+        self.assertTrue(page_obj.is_cursor)
+
+    def test_next_and_previous_round_trip_across_ties(self):
+        expected = list(self.listings.values_list('pk', flat=True))
+        pages = [self.page()[0]]
+        while pages[-1].has_next:
+            pages.append(self.page(cursor=pages[-1].next_cursor)[0])
+        self.assertEqual([obj.pk for page_obj in pages for obj in page_obj], expected)
+        self.assertEqual([len(page_obj) for page_obj in pages], [3, 3, 1])
+
+        back = self.page(cursor=pages[-1].previous_cursor)[0]
+        self.assertEqual([obj.pk for obj in back], [obj.pk for obj in pages[1]])
+        back = self.page(cursor=back.previous_cursor)[0]
+        self.assertEqual([obj.pk for obj in back], [obj.pk for obj in pages[0]])
+        self.assertFalse(back.has_previous)
+
+    def test_tampered_cursor_starts_from_the_first_page(self):
+        first = self.page()[0]
+        for cursor in (first.next_cursor[:-1] + 'x', pagination.cursor_signer.sign_object(['sideways', '2020-01-01', 1])):
+            page_obj = self.page(cursor=cursor)[0]
+            self.assertEqual([obj.pk for obj in page_obj], [obj.pk for obj in first])
+            self.assertFalse(page_obj.has_previous)
+
+    def test_deep_page_seeks_on_the_date(self):
+        paginator = pagination.CursorPaginator(self.listings, 3, 'date_created')
+        cursor = self.page()[0].next_cursor
+        direction, queryset = paginator.seek(paginator.decode_cursor(cursor))
+        self.assertIn('date_created<', queryset.explain())
+
+
+class SearchCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        search_cache.stats = search_cache.Stats()
+        self.seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        self.listing = create_property(self.seller, state='goa', property_type='flat')
+        self.url = reverse('properties:property_list') + '?state=goa'
+
+    def test_repeated_search_is_served_from_cache(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(search_cache.get_stats(), {'hits': 1, 'misses': 1})
+
+    def test_rolled_back_change_keeps_cache(self):
+        self.client.get(self.url)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.listing.status = 'sold'
+            self.listing.save()
+            Property.objects.create(seller=self.seller)
+        self.client.get(self.url)
+        self.assertEqual(search_cache.get_stats(), {'hits': 1, 'misses': 1})
+
+    def test_serving_a_cached_page_does_not_write(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url)
+        self.assertEqual(search_cache.get_stats(), {'hits': 1, 'misses': 1})
+        self.assertFalse([query['sql'] for query in context.captured_queries if not query['sql'].startswith('SELECT')])
+
+    def test_matching_listing_change_invalidates(self):
+        self.client.get(self.url)
+        self.listing.status = 'sold'
+        self.listing.save()
+        response = self.client.get(self.url)
+        self.assertEqual(search_cache.get_stats(), {'hits': 0, 'misses': 2})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_unrelated_listing_change_keeps_cache(self):
+        self.client.get(self.url)
+        create_property(self.seller, state='kerala', property_type='house')
+        self.client.get(self.url)
+        self.assertEqual(search_cache.get_stats(), {'hits': 1, 'misses': 1})
+
+
+class KeywordSearchTests(TestCase):
+    def setUp(self):
+        seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        self.title_hit = create_property(seller, title='Hilltop Villa', description='Terrace garden')
+        self.description_hit = create_property(seller, title='Old Bungalow', description='Villa style rooms with a view')
+        self.other = create_property(seller, title='Studio flat', description='Close to the station')
+
+    def search(self, text, rank=False):
+        return list(keyword_search(Property.objects.all(), text, rank=rank).values_list('pk', flat=True))
+
+    def fts_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {search.FTS_TABLE} ORDER BY rowid')
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_prefix_match_ranked_by_weighted_bm25(self):
+        self.assertEqual(set(self.search('vill')), {self.title_hit.pk, self.description_hit.pk})
+        # A title hit outweighs the same word in the description
+        self.assertEqual(self.search('villa', rank=True), [self.title_hit.pk, self.description_hit.pk])
+        self.assertEqual(self.search('villa view', rank=True), [self.description_hit.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.other.title = 'Penthouse suite'
+        self.other.save()
+        self.assertEqual(self.search('studio'), [])
+        self.assertEqual(self.search('penthouse'), [self.other.pk])
+
+        self.other.delete()
+        self.assertEqual(self.search('penthouse'), [])
+        self.assertEqual(self.fts_rows(), [self.title_hit.pk, self.description_hit.pk])
+
+    def test_rebuild_command_restores_the_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        self.assertEqual(self.search('villa'), [])
+
+        output = StringIO()
+        call_command('rebuild_property_search_index', stdout=output)
+        self.assertIn('Indexed 3 properties.', output.getvalue())
+        self.assertEqual(self.search('villa', rank=True), [self.title_hit.pk, self.description_hit.pk])
+
+
+class GeoSearchTests(TestCase):
+    def setUp(self):
+        seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        # Pune centre, Pimpri (~15 km), Mumbai (~120 km)
+        self.centre = create_property(seller, title='Centre', latitude='18.520430', longitude='73.856744')
+        self.pimpri = create_property(seller, title='Pimpri', latitude='18.629780', longitude='73.799710')
+        self.mumbai = create_property(seller, title='Mumbai', latitude='19.076090', longitude='72.877426')
+        create_property(seller, title='Unlocated')
+
+    def search(self, radius_km):
+        results = geo.nearby(Property.objects.all(), 18.5204, 73.8567, radius_km)
+        return [pk for pk, distance in results]
+
+    def test_radius_search_matches_brute_force(self):
+        self.assertEqual(self.search(5), [self.centre.pk])
+        self.assertEqual(self.search(20), [self.centre.pk, self.pimpri.pk])
+        self.assertEqual(self.search(200), [self.centre.pk, self.pimpri.pk, self.mumbai.pk])
+
+    def test_geohash_follows_coordinates(self):
+        self.mumbai.latitude = None
+        self.mumbai.longitude = None
+        self.mumbai.save()
+        self.assertEqual(Property.objects.get(pk=self.mumbai.pk).geohash, '')
+        self.assertEqual(self.search(200), [self.centre.pk, self.pimpri.pk])
+
+    def test_property_list_sorts_by_distance(self):
+        response = self.client.get(reverse('properties:property_list'), {
+            'near_latitude': '18.5204', 'near_longitude': '73.8567', 'radius_km': '50',
+        })
+        self.assertEqual([p.title for p in response.context['page_obj']], ['Centre', 'Pimpri'])
+
+    def test_database_distance_matches_haversine(self):
+        for pk, distance in geo.nearby(Property.objects.all(), 18.5204, 73.8567, 200):
+            listing = Property.objects.get(pk=pk)
+            expected = geo.haversine_km(18.5204, 73.8567, float(listing.latitude), float(listing.longitude))
+            self.assertAlmostEqual(distance, expected, places=6)
+
+    def test_page_loads_only_its_rows(self):
+        request = RequestFactory().get('/', {'page': 2})
+        with CaptureQueriesContext(connection) as context:
+            page_obj, total = geo.nearby_page(request, Property.objects.all(), 18.5204, 73.8567, 200, 1)
+            titles = [listing.title for listing in page_obj]
+        self.assertEqual((titles, total), (['Pimpri'], 3))
+        self.assertIn('LIMIT 1 OFFSET 1', context.captured_queries[-1]['sql'])
+
+    def test_listing_at_the_search_point_shows_its_distance(self):
+        response = self.client.get(reverse('properties:property_list'), {
+            'near_latitude': '18.520430', 'near_longitude': '73.856744', 'radius_km': '5',
+        })
+        self.assertContains(response, '0.0 km away')
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        create_property(self.seller, city='Pune', state='maharashtra', pincode='411001')
+        create_property(self.seller, city='pune ', state='maharashtra', pincode='411002')
+        create_property(self.seller, city='Puducherry', state='tamil_nadu', pincode='605001')
+        autocomplete.index.build()
+
+    def lookup(self, text):
+        response = self.client.get(reverse('properties:autocomplete'), {'q': text})
+        self.assertEqual(response.status_code, 200)
+        return [result['value'] for result in response.json()['results']]
+
+    def test_spellings_collapse_and_rank_by_listing_count(self):
+        self.assertEqual(self.lookup(' PU'), ['Pune', 'Puducherry'])
+        self.assertEqual(self.lookup('4110'), ['411001', '411002'])
+        self.assertEqual(self.lookup('x'), [])
+
+    def test_new_listing_is_suggested_without_rebuild(self):
+        self.assertEqual(self.lookup('Puri'), [])
+        create_property(self.seller, city='Puri', state='odisha', pincode='752001')
+        self.assertEqual(self.lookup('Puri'), ['Puri'])
+
+    def test_edited_and_deleted_listings_are_dropped(self):
+        self.assertEqual(self.lookup('Pon'), [])
+        listing = Property.objects.get(city='Puducherry')
+        listing.city = 'Pondicherry'
+        listing.save()
+        self.assertEqual(self.lookup('Pu'), ['Pune'])
+        self.assertEqual(self.lookup('Pon'), ['Pondicherry'])
+
+        listing.delete()
+        self.assertEqual(self.lookup('Pon'), [])
+        self.assertEqual(self.lookup('6050'), [])
+
+
+class SavedSearchMatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Drop what earlier tests loaded; their version counters were rolled back
+        matching.index.build()
+        self.seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        self.buyer = CustomUser.objects.create_user('buyer', password='pass', role='buyer')
+
+    def test_matches_agree_with_brute_force(self):
+        rng = random.Random(7)
+        states = ['goa', 'kerala', 'uttarakhand']
+        types = ['house', 'flat', 'plot']
+        for i in range(60):
+            min_price = rng.choice([None, 1000000, 2000000])
+            PropertySearch.objects.create(
+                user=self.buyer, name=f'Search {i}',
+                state=rng.choice(['', *states]),
+                property_type=rng.choice(['', *types]),
+                pincode=rng.choice(['', '', '403001']),
+                city=rng.choice(['', '', 'pan']),
+                min_price=min_price,
+                max_price=rng.choice([None, 3000000 if min_price else 1500000]),
+                min_area=rng.choice([None, 800]),
+                max_area=rng.choice([None, 1500]),
+            )
+
+        total_matches = 0
+        for i in range(20):
+            listing = create_property(
+                self.seller, state=rng.choice(states), property_type=rng.choice(types),
+                pincode=rng.choice(['403001', '682001']), city=rng.choice(['Panaji', 'Kochi']),
+                price=rng.choice([900000, 1800000, 2500000]), area=rng.choice([600, 1000, 2000]),
+            )
+            expected = {
+                search.pk for search in PropertySearch.objects.all()
+                if search.state in ('', listing.state)
+                and search.property_type in ('', listing.property_type)
+                and search.pincode in ('', listing.pincode)
+                and search.city.lower() in listing.city.lower()
+                and (search.min_price is None or search.min_price <= listing.price)
+                and (search.max_price is None or search.max_price >= listing.price)
+                and (search.min_area is None or search.min_area <= listing.area)
+                and (search.max_area is None or search.max_area >= listing.area)
+            }
+            total_matches += len(expected)
+            recorded = set(listing.saved_search_matches.values_list('search_id', flat=True))
+            self.assertEqual(recorded, expected)
+        self.assertGreater(total_matches, 0)
+
+    def test_new_search_and_own_listings(self):
+        create_property(self.seller, state='goa')
+        search = PropertySearch.objects.create(user=self.buyer, name='Goa', state='goa')
+        PropertySearch.objects.create(user=self.seller, name='Mine', state='goa')
+        listing = create_property(self.seller, state='goa')
+        self.assertEqual(list(SavedSearchMatch.objects.values_list('search_id', 'property_id')), [(search.pk, listing.pk)])
+
+    def test_index_version_survives_cache_clear_and_reconcile(self):
+        create_property(self.seller, state='goa')
+        # Saved by another process: the row and the version bump arrive without this process's signals
+        PropertySearch.objects.bulk_create([PropertySearch(user=self.buyer, name='Goa', state='goa')])
+        counters.apply_deltas({matching.VERSION_COUNTER: 1})
+        cache.clear()
+        counters.reconcile()
+        listing = create_property(self.seller, state='goa')
+        self.assertEqual(listing.saved_search_matches.count(), 1)
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        create_property(seller, state='goa', property_type='flat', bedrooms=2, price=2000000)
+        create_property(seller, state='goa', property_type='house', bedrooms=6, price=8000000)
+        create_property(seller, state='kerala', property_type='flat', bedrooms=2, price=3000000)
+        create_property(seller, state='kerala', property_type='flat', bedrooms=2, price=3000000, status='sold')
+
+    def get_facets(self, data):
+        response = self.client.get(reverse('properties:property_list'), data)
+        form = response.context['search_form']
+        return facets.get_facets(form.cleaned_data, facets.base_queryset(form))
+
+    def test_counts_reflect_the_other_filters(self):
+        counts = self.get_facets({'state': 'goa'})
+        self.assertEqual(counts['state'], {'goa': 2, 'kerala': 1})
+        self.assertEqual(counts['property_type'], {'flat': 1, 'house': 1})
+        self.assertEqual(counts['bedrooms'], {2: 1, 5: 1})
+        self.assertEqual(counts['price'], {0: 1, 2: 1})
+
+        counts = self.get_facets({'property_type': 'flat', 'min_price': '2500000'})
+        self.assertEqual(counts['state'], {'kerala': 1})
+        self.assertEqual(counts['property_type'], {'flat': 1, 'house': 1})
+        # The price facet ignores the selected price range
+        self.assertEqual(counts['price'], {0: 1, 1: 1})
+
+    def test_facet_counts_are_cached_until_a_listing_changes(self):
+        self.get_facets({'state': 'goa'})
+        with CaptureQueriesContext(connection) as context:
+            self.get_facets({'state': 'kerala'})
+        self.assertFalse(any('GROUP BY' in query['sql'] for query in context.captured_queries))
+
+        Property.objects.filter(state='kerala').first().save()
+        with CaptureQueriesContext(connection) as context:
+            self.get_facets({'state': 'kerala'})
+        self.assertTrue(any('GROUP BY' in query['sql'] for query in context.captured_queries))
+
+
+def make_upload(name='photo.jpg', size=(1600, 1200)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        self.property = create_property(seller)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_upload_creates_every_size_and_format(self):
+        image = PropertyImage.objects.create(property=self.property, image=make_upload())
+        self.assertTrue(PropertyImage.objects.get(pk=image.pk).has_derivatives)
+        for size, box in images.DERIVATIVE_SIZES.items():
+            for fmt in images.DERIVATIVE_FORMATS:
+                with image.image.storage.open(images.derivative_name(image.image.name, size, fmt)) as handle:
+                    self.assertEqual(Image.open(handle).size, box)
+        self.assertIn('480w', image.derivative_srcset('webp'))
+
+        response = self.client.get(reverse('properties:property_list'))
+        self.assertContains(response, 'type="image/webp"')
+
+    @override_settings(PROPERTY_IMAGE_DERIVATIVES_ON_UPLOAD=False)
+    def test_backfill_command(self):
+        image = PropertyImage.objects.create(property=self.property, image=make_upload())
+        PropertyImage.objects.create(property=self.property, image='properties/missing.jpg')
+        self.assertEqual(image.derivative_url('card'), image.image.url)
+
+        call_command('generate_image_derivatives', workers=2, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(list(PropertyImage.objects.filter(has_derivatives=True)), [image])
+
+
+class UploadNormalizationTests(TestCase):
+    def test_large_rotated_photo_is_bounded_and_stripped(self):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        exif[0x010F] = 'PhoneMaker'
+        Image.new('RGB', (4000, 3000), 'teal').save(buffer, 'JPEG', exif=exif)
+
+        with override_settings(PROPERTY_IMAGE_MAX_DIMENSION=1600, PROPERTY_IMAGE_MAX_BYTES=200_000):
+            normalized = images.normalize(SimpleUploadedFile('IMG_0001.JPEG', buffer.getvalue()))
+        self.assertEqual(normalized.name, 'IMG_0001.jpg')
+        self.assertLessEqual(normalized.size, 200_000)
+        result = Image.open(normalized)
+        self.assertEqual(result.size, (1200, 1600))
+        self.assertFalse(result.getexif())
+
+    def test_form_rejects_bombs_and_non_images(self):
+        with override_settings(PROPERTY_IMAGE_MAX_SOURCE_PIXELS=1_000_000):
+            form = PropertyImageUploadForm(files={'image': make_upload(size=(1600, 1200))})
+            self.assertIn('too large', form.errors['image'][0])
+        form = PropertyImageUploadForm(files={'image': SimpleUploadedFile('photo.jpg', b'not an image')})
+        self.assertFalse(form.is_valid())
+        form = PropertyImageUploadForm(files={'image': make_upload(size=(800, 600))})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['image'].content_type, 'image/jpeg')
+
+
+def make_photo(seed, size=(640, 480), quality=90):
+    """A distinct photo per seed, drawn at 640x480 and then scaled to size"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', (640, 480), 'white')
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(640), rng.randrange(480)
+        draw.rectangle((x, y, x + rng.randrange(40, 300), y + rng.randrange(40, 200)), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = BytesIO()
+    image.resize(size).save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+@override_settings(PROPERTY_IMAGE_DERIVATIVES_ON_UPLOAD=False)
+class DuplicatePhotoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Drop what earlier tests loaded; their version counters were rolled back
+        duplicates.index.build()
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_hash_survives_resizing_and_reencoding(self):
+        original = duplicates.dhash(Image.open(BytesIO(make_photo(1))))
+        copy = duplicates.dhash(Image.open(BytesIO(make_photo(1, size=(320, 240), quality=50))))
+        self.assertLessEqual(duplicates.distance(original, copy), duplicates.RADIUS)
+        self.assertGreater(duplicates.distance(original, duplicates.dhash(Image.open(BytesIO(make_photo(2))))), duplicates.RADIUS)
+
+    def test_hash_table_agrees_with_brute_force(self):
+        rng = random.Random(3)
+        hashes = [rng.getrandbits(64) - (1 << 63) for _ in range(2000)]
+        # Near copies of some of them
+        hashes += [value ^ (1 << rng.randrange(63)) ^ (1 << rng.randrange(63)) for value in hashes[:200]]
+        table = duplicates.HashTable()
+        for position, value in enumerate(hashes):
+            table.add(value, position)
+        for limit in (3, 6, 9):
+            for value in hashes[::50]:
+                expected = sorted(position for position, other in enumerate(hashes) if duplicates.distance(value, other) <= limit)
+                found = sorted(position for d, other, items in table.search(value, limit) for position in items)
+                self.assertEqual(found, expected)
+
+    def test_index_follows_hashes_changed_by_other_processes(self):
+        seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        image = PropertyImage.objects.create(property=create_property(seller), image=SimpleUploadedFile('villa.jpg', make_photo(1)))
+        self.assertEqual([pk for d, pk, property_id in duplicates.index.near(image.phash, 0)], [image.pk])
+
+        PropertyImage.objects.filter(pk=image.pk).update(phash=image.phash ^ 1)
+        counters.apply_deltas({duplicates.VERSION_COUNTER: 1})
+        cache.clear()
+        self.assertEqual(duplicates.index.near(image.phash, 0), [])
+
+    def test_reused_photo_is_flagged_on_upload_and_reported(self):
+        seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        copier = CustomUser.objects.create_user('copier', password='pass', role='seller')
+        CustomUser.objects.create_user('admin', password='pass', role='admin')
+        original = create_property(seller, title='Original Villa')
+        PropertyImage.objects.create(property=original, image=SimpleUploadedFile('villa.jpg', make_photo(1)))
+        PropertyImage.objects.create(property=create_property(seller, title='Other House'), image=SimpleUploadedFile('house.jpg', make_photo(2)))
+        copied = create_property(copier, title='Copied Villa')
+
+        self.client.login(username='copier', password='pass')
+        response = self.client.post(
+            reverse('properties:manage_property_images', args=[copied.pk]),
+            {'upload_image': '1', 'image': SimpleUploadedFile('mine.jpg', make_photo(1, size=(800, 600), quality=60))},
+            follow=True,
+        )
+        self.assertContains(response, 'closely matches one on another seller')
+        self.assertIsNotNone(copied.images.get().phash)
+
+        self.client.login(username='admin', password='pass')
+        response = self.client.get(reverse('admin_panel:duplicate_photos'), {'scope': 'sellers'})
+        self.assertEqual(len(response.context['report']), 1)
+        self.assertContains(response, 'Original Villa')
+        self.assertContains(response, 'Copied Villa')
+        self.assertNotContains(response, 'Other House')
+
+
+class FilenameMatcherTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, PROPERTY_IMAGE_DERIVATIVES_ON_UPLOAD=False)
+        self.override.enable()
+        seller = CustomUser.objects.create_user('seller', password='pass', role='seller')
+        self.cottage = create_property(seller)
+        self.villa = create_property(seller, title='Heritage Villa in Navi Mumbai', city='Navi Mumbai', state='maharashtra', property_type='villa')
+        self.flat = create_property(seller, title='Compact Flat in Navi Mumbai', city='Navi Mumbai', state='maharashtra', property_type='flat')
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_rare_words_and_ids_decide(self):
+        matcher = image_assignment.FilenameMatcher.from_database()
+        self.assertEqual(matcher.candidates('IMG_navimumbai_heritage_villas.JPG')[0][1], self.villa.pk)
+        self.assertEqual(matcher.candidates('riverside-cottage-tapovan.png')[0][1], self.cottage.pk)
+        self.assertEqual(matcher.candidates(f'property_{self.flat.pk}_a1b2.jpg'), [(image_assignment.ID_SCORE, self.flat.pk)])
+        self.assertEqual(matcher.candidates('DSC_0042.jpg'), [])
+
+        # The closer of two names gets the listing's single slot
+        assignments, unmatched = image_assignment.assign(matcher, ['heritage.jpg', 'heritage_villa_navi_mumbai.jpg', 'beach.jpg'])
+        self.assertEqual([(name, pk) for name, pk, score in assignments], [('heritage_villa_navi_mumbai.jpg', self.villa.pk)])
+        self.assertEqual(unmatched, ['heritage.jpg', 'beach.jpg'])
+
+    def test_command_attaches_files_in_one_pass(self):
+        folder = f'{self.media_root}/properties'
+        os.makedirs(folder)
+        for name in ('heritage_villa.jpg', 'compact_flat_navi_mumbai.jpg', 'unrelated.jpg'):
+            with open(f'{folder}/{name}', 'wb') as handle:
+                handle.write(make_photo(1))
+
+        call_command('assign_images_by_filename', stdout=StringIO())
+        self.assertEqual(self.villa.images.get().image.name, 'properties/heritage_villa.jpg')
+        self.assertTrue(self.flat.images.get().is_primary)
+        self.assertFalse(self.cottage.images.exists())
+        self.villa.refresh_from_db()
+        self.assertIsNotNone(self.villa.primary_image)
+        self.assertEqual(StoredFile.objects.get(name='properties/heritage_villa.jpg').ref_count, 1)
+
+        # Files already in use are skipped on a second run
+        call_command('assign_images_by_filename', stdout=StringIO())
+        self.assertEqual(PropertyImage.objects.count(), 2)
@@ -5,6 +5,7 @@ app_name = 'properties'
 
 urlpatterns = [
     path('', views.property_list, name='property_list'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
     path('<int:pk>/', views.property_detail, name='property_detail'),
     path('add/', views.add_property, name='add_property'),
     path('<int:pk>/edit/', views.edit_property, name='edit_property'),
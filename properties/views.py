@@ -1,64 +1,74 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.http import JsonResponse
 from django.utils import timezone
+from safeestate import counters
 from .models import Property, PropertyImage, VisitRequest
 from .forms import (
     PropertyForm, PropertyImageUploadForm, PropertySearchForm,
     VisitRequestForm, VisitResponseForm
 )
+from .search import keyword_search
+from . import autocomplete as autocomplete_index, duplicates, facets, geo, search_cache
 
 def property_list(request):
-    properties = Property.objects.filter(status='available').order_by('-date_created')
+    properties = Property.objects.filter(status='available').select_related('primary_image').order_by('-date_created')
+    facet_queryset = Property.objects.filter(status='available')
     search_form = PropertySearchForm()
+    ranked = False
+    filtered = False
+    cleaned_data = {}
     
     # Handle search
     if request.GET:
         search_form = PropertySearchForm(request.GET)
         if search_form.is_valid():
-            filters = Q(status='available')
+            cleaned_data = search_form.cleaned_data
+            filters = search_form.build_filters()
+            filtered = any(search_form.cleaned_data.get(name) for name in search_form.fields if name != 'sort')
+            properties = Property.objects.filter(filters).select_related('primary_image').order_by('-date_created')
+            facet_queryset = facets.base_queryset(search_form)
             
-            if search_form.cleaned_data.get('property_type'):
-                filters &= Q(property_type=search_form.cleaned_data['property_type'])
-            
-            if search_form.cleaned_data.get('state'):
-                filters &= Q(state=search_form.cleaned_data['state'])
-            
-            if search_form.cleaned_data.get('city'):
-                filters &= Q(city__icontains=search_form.cleaned_data['city'])
-            
-            if search_form.cleaned_data.get('pincode'):
-                filters &= Q(pincode=search_form.cleaned_data['pincode'])
-            
-            if search_form.cleaned_data.get('min_price'):
-                filters &= Q(price__gte=search_form.cleaned_data['min_price'])
-            
-            if search_form.cleaned_data.get('max_price'):
-                filters &= Q(price__lte=search_form.cleaned_data['max_price'])
-            
-            if search_form.cleaned_data.get('min_area'):
-                filters &= Q(area__gte=search_form.cleaned_data['min_area'])
-            
-            if search_form.cleaned_data.get('max_area'):
-                filters &= Q(area__lte=search_form.cleaned_data['max_area'])
-            
-            properties = Property.objects.filter(filters).order_by('-date_created')
+            if search_form.cleaned_data.get('q'):
+                ranked = search_form.cleaned_data.get('sort') == 'relevance'
+                properties = keyword_search(properties, search_form.cleaned_data['q'], rank=ranked)
+                facet_queryset = keyword_search(facet_queryset, search_form.cleaned_data['q'])
+    
+    # Pagination (keyset for large result sets, relevance ranking needs numbered pages)
+    if cleaned_data.get('near_latitude') is not None:
+        # Radius search, nearest first
+        latitude, longitude = cleaned_data['near_latitude'], cleaned_data['near_longitude']
+        radius_km = float(cleaned_data['radius_km'])
+        page_obj, total_properties = geo.nearby_page(request, properties, latitude, longitude, radius_km, 12)
+        facet_queryset = facet_queryset.filter(pk__in=geo.within(facet_queryset, latitude, longitude, radius_km))
+    else:
+        page_obj, total_properties = search_cache.get_page(request, cleaned_data, properties, 12, 'date_created', keyset=not ranked)
+    if total_properties is None and not filtered:
+        total_properties = counters.get_value('properties:status:available')
     
-    # Pagination
-    paginator = Paginator(properties, 12)  # Show 12 properties per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Sidebar counts for each filter option
+    facet_counts = facets.get_facets(cleaned_data, facet_queryset)
+    facets.label_choices(search_form, facet_counts)
     
     context = {
         'page_obj': page_obj,
         'search_form': search_form,
-        'total_properties': properties.count(),
+        'total_properties': total_properties,
+        'price_options': facets.price_options(request, facet_counts),
     }
     
     return render(request, 'properties/property_list.html', context)
 
+def autocomplete(request):
+    """Suggest cities (or pincodes for numeric input) for the search form"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), 20)
+    except ValueError:
+        limit = 8
+    results = autocomplete_index.index.lookup(request.GET.get('q', ''), limit)
+    return JsonResponse({'results': results})
+
 def property_detail(request, pk):
     property_obj = get_object_or_404(Property, pk=pk)
     visit_requests = None
@@ -74,6 +84,15 @@ def property_detail(request, pk):
     
     return render(request, 'properties/property_detail.html', context)
 
+def warn_if_reused(request, image):
+    """Tell the seller when the photo they uploaded is already on another seller's listing"""
+    if duplicates.reused_elsewhere(image).exists():
+        messages.warning(
+            request,
+            'This photo closely matches one on another seller\'s listing. '
+            'Please upload your own photos; listings with copied photos are reviewed by our team.'
+        )
+
 @login_required
 def add_property(request):
     if request.user.role != 'seller':
@@ -94,13 +113,14 @@ def add_property(request):
             property_obj.seller = request.user
             property_obj.save()
             
-            # Handle single image upload
-            if request.FILES.get('image'):
-                PropertyImage.objects.create(
+            # Handle single image upload (already normalized by the form)
+            if image_form.cleaned_data.get('image'):
+                image = PropertyImage.objects.create(
                     property=property_obj,
-                    image=request.FILES['image'],
+                    image=image_form.cleaned_data['image'],
                     is_primary=True
                 )
+                warn_if_reused(request, image)
             
             messages.success(request, 'Property listed successfully!')
             return redirect('properties:property_detail', pk=property_obj.pk)
@@ -146,7 +166,7 @@ def my_properties(request):
         messages.error(request, 'Only sellers can view their properties.')
         return redirect('properties:property_list')
     
-    properties = Property.objects.filter(seller=request.user).order_by('-date_created')
+    properties = Property.objects.filter(seller=request.user).select_related('primary_image').order_by('-date_created')
     
     context = {
         'properties': properties,
@@ -232,7 +252,7 @@ def my_visit_requests(request):
         messages.error(request, 'Only buyers can view their visit requests.')
         return redirect('properties:property_list')
     
-    visit_requests = VisitRequest.objects.filter(buyer=request.user).order_by('-date_requested')
+    visit_requests = VisitRequest.objects.filter(buyer=request.user).select_related('property__primary_image').order_by('-date_requested')
     
     context = {
         'visit_requests': visit_requests,
@@ -252,20 +272,24 @@ def manage_property_images(request, pk):
     if request.method == 'POST':
         # Handle image upload
         if 'upload_image' in request.POST:
-            if request.FILES.get('image'):
+            image_form = PropertyImageUploadForm(request.POST, request.FILES)
+            if image_form.is_valid():
                 # Remove existing images first
                 property_obj.images.all().delete()
                 
                 # Create new image
-                PropertyImage.objects.create(
+                image = PropertyImage.objects.create(
                     property=property_obj,
-                    image=request.FILES['image'],
+                    image=image_form.cleaned_data['image'],
                     caption=request.POST.get('caption', ''),
                     is_primary=True
                 )
                 messages.success(request, 'Property image updated successfully!')
-            else:
+                warn_if_reused(request, image)
+            elif not request.FILES.get('image'):
                 messages.error(request, 'Please select an image file.')
+            else:
+                messages.error(request, image_form.errors['image'][0])
         
         # Handle image deletion
         elif 'delete_image' in request.POST:
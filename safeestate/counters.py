@@ -0,0 +1,159 @@
+"""
+Maintained counters for listing totals and dashboard statistics.
+
+Each counter is a row in admin_panel.Counter named like
+``properties:status:available`` or ``users:role:seller``. Signal handlers
+apply deltas whenever a Property, CustomUser or SellerKYC is created,
+deleted or changes one of the counted fields, so views can read every
+total they need with a single query instead of one COUNT(*) each.
+Bulk ``QuerySet.update()`` calls bypass signals; run the
+``reconcile_counters`` management command to recompute everything.
+
+Counted models inherit CountedModelMixin, which runs save() and delete()
+in a transaction, so the row change and its deltas commit together or
+not at all. Without it a save under autocommit is committed before the
+post_save handler runs, and a failed delta would leave the totals off.
+
+Other counters, such as the version numbers that in-process indexes use
+to notice changes made by other processes (see increment()), are kept in
+the same table and left alone by reconcile().
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_init, post_save, post_delete
+
+# model label -> (counter prefix, counted fields)
+COUNTED_FIELDS = {
+    'properties.property': ('properties', {'status': 'status', 'state': 'state', 'property_type': 'type'}),
+    'accounts.customuser': ('users', {'role': 'role'}),
+    'accounts.sellerkyc': ('kycs', {'status': 'status'}),
+}
+
+
+def counter_names(prefix, field_names, values):
+    """Return the counter names a row with the given field values contributes to"""
+    return [prefix] + [f'{prefix}:{field_names[field]}:{value}' for field, value in values.items()]
+
+
+def counter_model():
+    # Looked up rather than imported, so listing code can read totals without importing the admin app
+    return apps.get_model('admin_panel', 'Counter')
+
+
+def get_values(names):
+    """Return {name: value} for the given counters, read in one query"""
+    values = dict.fromkeys(names, 0)
+    values.update(counter_model().objects.filter(name__in=names).values_list('name', 'value'))
+    return values
+
+
+def get_value(name):
+    return get_values([name])[name]
+
+
+def apply_deltas(deltas):
+    """Add each delta to its counter atomically, creating missing counters"""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    Counter = counter_model()
+    with transaction.atomic():
+        existing = set(Counter.objects.filter(name__in=deltas).values_list('name', flat=True))
+        missing = [name for name in deltas if name not in existing]
+        if missing:
+            Counter.objects.bulk_create([Counter(name=name) for name in missing], ignore_conflicts=True)
+        for name, delta in deltas.items():
+            Counter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def increment(name):
+    """Add one to a counter and return its new value, as seen by the current transaction"""
+    with transaction.atomic():
+        apply_deltas({name: 1})
+        return get_value(name)
+
+
+class CountedModelMixin:
+    """Save and delete in one transaction with the counter deltas the signal handlers apply"""
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            return super().delete(*args, **kwargs)
+
+
+def _snapshot(instance, fields):
+    # Deferred fields are skipped so loading with only() does not trigger extra queries
+    deferred = instance.get_deferred_fields()
+    return {field: getattr(instance, field) for field in fields if field not in deferred}
+
+
+def _remember_values(sender, instance, **kwargs):
+    _, fields = COUNTED_FIELDS[sender._meta.label_lower]
+    instance._counter_values = _snapshot(instance, fields)
+
+
+def _count_save(sender, instance, created, **kwargs):
+    prefix, fields = COUNTED_FIELDS[sender._meta.label_lower]
+    current = _snapshot(instance, fields)
+    previous = getattr(instance, '_counter_values', None)
+    deltas = {}
+
+    if created:
+        for name in counter_names(prefix, fields, current):
+            deltas[name] = deltas.get(name, 0) + 1
+    elif previous:
+        changed = [field for field in previous if current.get(field, previous[field]) != previous[field]]
+        for name in counter_names(prefix, fields, {field: previous[field] for field in changed})[1:]:
+            deltas[name] = deltas.get(name, 0) - 1
+        for name in counter_names(prefix, fields, {field: current[field] for field in changed})[1:]:
+            deltas[name] = deltas.get(name, 0) + 1
+
+    apply_deltas(deltas)
+    instance._counter_values = current
+
+
+def _count_delete(sender, instance, **kwargs):
+    prefix, fields = COUNTED_FIELDS[sender._meta.label_lower]
+    # Prefer the values as loaded from the database over unsaved edits
+    previous = getattr(instance, '_counter_values', None) or {}
+    values = {field: previous[field] if field in previous else getattr(instance, field) for field in fields}
+    apply_deltas({name: -1 for name in counter_names(prefix, fields, values)})
+
+
+def compute_counts(models):
+    """Recompute every counter from scratch; ``models`` maps labels in COUNTED_FIELDS to model classes"""
+    counts = {}
+    for label, (prefix, fields) in COUNTED_FIELDS.items():
+        model = models[label]
+        counts[prefix] = model.objects.count()
+        for field, short_name in fields.items():
+            rows = model.objects.order_by().values(field).annotate(total=Count('pk'))
+            for row in rows:
+                counts[f'{prefix}:{short_name}:{row[field]}'] = row['total']
+    return counts
+
+
+def reconcile():
+    """Rewrite the counter table from the source tables and return the number of counters"""
+    Counter = counter_model()
+    counts = compute_counts({label: apps.get_model(label) for label in COUNTED_FIELDS})
+    counted = Q()
+    for prefix, fields in COUNTED_FIELDS.values():
+        counted |= Q(name=prefix) | Q(name__startswith=f'{prefix}:')
+    with transaction.atomic():
+        Counter.objects.filter(counted).delete()
+        Counter.objects.bulk_create([Counter(name=name, value=value) for name, value in counts.items()])
+    return len(counts)
+
+
+def connect_signals():
+    for label in COUNTED_FIELDS:
+        model = apps.get_model(label)
+        post_init.connect(_remember_values, sender=model, dispatch_uid=f'counters_init_{label}')
+        post_save.connect(_count_save, sender=model, dispatch_uid=f'counters_save_{label}')
+        post_delete.connect(_count_delete, sender=model, dispatch_uid=f'counters_delete_{label}')
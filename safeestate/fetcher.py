@@ -0,0 +1,125 @@
+"""
+Shared HTTP fetcher for downloading listing images.
+
+One pooled requests.Session is reused for every download. fetch_many()
+fetches distinct URLs on a bounded thread pool while limiting how many
+requests hit the same host at once; transient failures (connection
+errors, 429 and 5xx responses) are retried with exponential backoff by
+urllib3. Successful downloads are kept in an on-disk cache keyed by the
+URL's SHA-256, so a URL is only downloaded once across calls and
+processes.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+def default_cache_dir():
+    return getattr(
+        settings, 'IMAGE_FETCH_CACHE_DIR',
+        os.path.join(tempfile.gettempdir(), 'safeestate-image-cache'),
+    )
+
+
+class ImageFetcher:
+    def __init__(self, max_workers=8, per_host=4, retries=3, backoff=0.5, timeout=10, cache_dir=None):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+
+        retry = Retry(
+            total=retries, backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504), allowed_methods=('GET',),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._host_locks = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_locks:
+                self._host_locks[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_locks[host]
+
+    def _cache_path(self, url):
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def _read_cache(self, url):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(url), 'rb') as handle:
+                return handle.read()
+        except OSError:
+            return None
+
+    def _write_cache(self, url, content):
+        if not self.cache_dir:
+            return
+        path = self._cache_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(content)
+        os.replace(temp_path, path)
+
+    def fetch(self, url):
+        """Return the body of url, from the cache when it was downloaded before"""
+        content = self._read_cache(url)
+        if content is not None:
+            return content
+        with self._host_slot(url):
+            response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        self._write_cache(url, response.content)
+        return response.content
+
+    def _fetch_result(self, url):
+        try:
+            return url, self.fetch(url)
+        except (requests.RequestException, OSError) as error:
+            return url, error
+
+    def fetch_many(self, urls):
+        """
+        Fetch every distinct URL concurrently and return {url: bytes or exception};
+        a failed download does not stop the others.
+        """
+        distinct = list(dict.fromkeys(urls))
+        if not distinct:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(distinct))) as executor:
+            return dict(executor.map(self._fetch_result, distinct))
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    """Return the process-wide fetcher so its connection pool is shared"""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = ImageFetcher()
+        return _fetcher
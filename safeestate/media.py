@@ -0,0 +1,171 @@
+"""
+Serving of user-uploaded media with access control.
+
+Every request under MEDIA_URL goes through serve_media(). KYC documents
+are only returned to the seller they belong to and to admins; everything
+else is public. Once a request is allowed, the transfer is handed to the
+front proxy when MEDIA_ACCEL is configured:
+
+* ``'nginx'``: an ``X-Accel-Redirect`` to MEDIA_ACCEL_PREFIX + path, which
+  must be an ``internal`` location aliased to MEDIA_ROOT;
+* ``'sendfile'``: an ``X-Sendfile`` header with the absolute path
+  (Apache mod_xsendfile, lighttpd).
+
+Without it the file is streamed by Django, with ETag/Last-Modified
+validation, single byte ranges and Cache-Control set per kind of file.
+Content-addressed uploads (see safeestate.storage) never change, so they
+are cached as immutable for a year.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import FileField, Q
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .storage import is_content_name
+
+PROTECTED_PREFIX = 'kyc/'
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+PUBLIC_CACHE = 'public, max-age=86400'
+PRIVATE_CACHE = 'private, no-cache'
+STREAM_BLOCK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def can_view(user, path):
+    """Whether the user may download the media file at path"""
+    if not path.startswith(PROTECTED_PREFIX):
+        return True
+    if not user.is_authenticated:
+        return False
+    if user.role == 'admin' or user.is_superuser:
+        return True
+
+    from accounts.models import SellerKYC
+
+    documents = Q()
+    for field in SellerKYC._meta.concrete_fields:
+        if isinstance(field, FileField):
+            documents |= Q(**{field.name: path})
+    return SellerKYC.objects.filter(documents, seller=user).exists()
+
+
+def cache_control(path):
+    if path.startswith(PROTECTED_PREFIX):
+        return PRIVATE_CACHE
+    if is_content_name(path):
+        return IMMUTABLE_CACHE
+    return PUBLIC_CACHE
+
+
+def parse_range(header, size):
+    """Return (start, end) inclusive for a single satisfiable byte range, None to send everything, or False"""
+    match = RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        # Malformed or multiple ranges: ignoring the header is allowed
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or (last and int(last) < start):
+            return False
+    else:
+        length = int(last)
+        if length == 0:
+            return False
+        start, end = max(size - length, 0), size - 1
+    return start, end
+
+
+def read_range(handle, start, length):
+    try:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(STREAM_BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+@require_safe
+def serve_media(request, path):
+    """Check access to a media file, then let the proxy or Django send it"""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Media file not found')
+    path = os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+    if not can_view(request.user, path):
+        # Do not reveal whether the document exists
+        raise Http404('Media file not found')
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Media file not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found')
+
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    last_modified = int(stat.st_mtime)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    def finish(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = cache_control(path)
+        response['X-Content-Type-Options'] = 'nosniff'
+        if path.startswith(PROTECTED_PREFIX):
+            patch_vary_headers(response, ('Cookie',))
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return finish(not_modified)
+
+    accel = getattr(settings, 'MEDIA_ACCEL', None)
+    if accel == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix + quote(path)
+        return finish(response)
+    if accel == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+        return finish(response)
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range', etag) in (etag, http_date(last_modified)):
+        byte_range = parse_range(range_header, stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return finish(response)
+
+    handle = open(full_path, 'rb')
+    if byte_range is None:
+        # FileResponse lets the WSGI server use sendfile() when it can
+        response = FileResponse(handle, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(read_range(handle, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    return finish(response)
@@ -0,0 +1,184 @@
+"""
+Pagination helpers shared by the listing views.
+
+Small result sets keep Django's numbered Paginator. Larger ones switch to
+keyset (cursor) pagination on ``(<date field>, id)``: each page is fetched
+with a ``WHERE (date, id) < (last_date, last_id) ... LIMIT n`` query, so a
+deep page costs the same as the first one and no ``COUNT(*)`` is issued.
+Cursors are signed tokens so clients cannot craft arbitrary lookups.
+"""
+from django.core import signing
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+CURSOR_SALT = 'safeestate.pagination.cursor'
+
+# Untimestamped so the same position always yields the same cursor
+cursor_signer = signing.Signer(salt=CURSOR_SALT)
+
+# Result sets up to this many pages keep the numbered page UI
+NUMBERED_PAGES_LIMIT = 10
+
+
+class CursorPage:
+    """A page of results addressed by opaque next/previous cursors"""
+    is_cursor = True
+    count_floor = 0
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor, query_params):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._query_params = query_params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _querystring(self, cursor):
+        params = self._query_params.copy()
+        params.pop('page', None)
+        params['cursor'] = cursor
+        return params.urlencode()
+
+    @property
+    def next_querystring(self):
+        return self._querystring(self.next_cursor) if self.has_next else ''
+
+    @property
+    def previous_querystring(self):
+        return self._querystring(self.previous_cursor) if self.has_previous else ''
+
+
+class CursorPaginator:
+    """Keyset paginator over a queryset ordered by ``-<field>, -pk``"""
+
+    def __init__(self, queryset, per_page, field):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+        self.model_field = queryset.model._meta.get_field(field)
+
+    def encode_cursor(self, direction, obj):
+        value = self.model_field.value_to_string(obj)
+        return cursor_signer.sign_object([direction, value, obj.pk], compress=True)
+
+    def decode_cursor(self, cursor):
+        """Return (direction, value, pk) or None for a missing or tampered cursor"""
+        if not cursor:
+            return None
+        try:
+            direction, value, pk = cursor_signer.unsign_object(cursor)
+            if direction not in ('next', 'prev'):
+                return None
+            return direction, self.model_field.to_python(value), pk
+        except (signing.BadSignature, ValueError, TypeError):
+            return None
+
+    def seek(self, decoded):
+        """Return (direction, queryset) for the rows past a decoded cursor, or from the start for None"""
+        field = self.field
+        if decoded is None:
+            return 'next', self.queryset.order_by(f'-{field}', '-pk')
+
+        direction, value, pk = decoded
+        # The redundant bound on the field alone is what lets SQLite seek the
+        # (..., field) index; it cannot turn the OR below into a range.
+        if direction == 'next':
+            return direction, self.queryset.filter(
+                Q(**{f'{field}__lte': value}),
+                Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}),
+            ).order_by(f'-{field}', '-pk')
+        return direction, self.queryset.filter(
+            Q(**{f'{field}__gte': value}),
+            Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk}),
+        ).order_by(field, 'pk')
+
+    def get_page(self, cursor, query_params):
+        decoded = self.decode_cursor(cursor)
+        direction, queryset = self.seek(decoded)
+
+        # Fetch one extra row to learn whether another page follows
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'prev':
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, decoded is not None
+
+        next_cursor = self.encode_cursor('next', rows[-1]) if rows and has_next else None
+        previous_cursor = self.encode_cursor('prev', rows[0]) if rows and has_previous else None
+
+        return CursorPage(rows, has_next, has_previous, next_cursor, previous_cursor, query_params)
+
+
+def paginate(request, queryset, per_page, field, keyset=True):
+    """
+    Paginate a queryset for a listing view.
+
+    Returns ``(page_obj, total_count)``. The numbered Paginator is used for
+    result sets of at most NUMBERED_PAGES_LIMIT pages (the total is then
+    known for free); larger sets use keyset pagination on ``field`` and the
+    total is None. Pass ``keyset=False`` for orderings other than
+    ``-<field>`` (e.g. relevance), which always use numbered pages.
+    """
+    cursor = request.GET.get('cursor')
+
+    if keyset and not cursor:
+        limit = per_page * NUMBERED_PAGES_LIMIT
+        probe = len(queryset.values_list('pk', flat=True)[:limit + 1])
+        if probe <= limit:
+            paginator = Paginator(queryset, per_page)
+            paginator.count = probe
+            return paginator.get_page(request.GET.get('page')), probe
+
+    if keyset:
+        paginator = CursorPaginator(queryset, per_page, field)
+        page_obj = paginator.get_page(cursor, request.GET)
+        page_obj.count_floor = per_page * NUMBERED_PAGES_LIMIT
+        return page_obj, None
+
+    paginator = Paginator(queryset, per_page)
+    return paginator.get_page(request.GET.get('page')), paginator.count
+
+
+def page_state(page_obj, total_count):
+    """Return a small picklable description of a page: its mode, primary keys and navigation"""
+    state = {'pks': [obj.pk for obj in page_obj], 'total': total_count}
+    if getattr(page_obj, 'is_cursor', False):
+        state.update(cursor=True, has_next=page_obj.has_next, has_previous=page_obj.has_previous)
+    else:
+        state.update(cursor=False, number=page_obj.number)
+    return state
+
+
+def restore_page(state, queryset, request, per_page, field):
+    """Rebuild a page described by page_state(), loading its rows by primary key in one query"""
+    rows = queryset.in_bulk(state['pks'])
+    object_list = [rows[pk] for pk in state['pks'] if pk in rows]
+
+    if not state['cursor']:
+        paginator = Paginator(queryset, per_page)
+        paginator.count = state['total']
+        return Page(object_list, state['number'], paginator), state['total']
+
+    paginator = CursorPaginator(queryset, per_page, field)
+    has_next, has_previous = state['has_next'], state['has_previous']
+    next_cursor = paginator.encode_cursor('next', object_list[-1]) if object_list and has_next else None
+    previous_cursor = paginator.encode_cursor('prev', object_list[0]) if object_list and has_previous else None
+    page_obj = CursorPage(object_list, has_next, has_previous, next_cursor, previous_cursor, request.GET)
+    page_obj.count_floor = per_page * NUMBERED_PAGES_LIMIT
+    return page_obj, state['total']
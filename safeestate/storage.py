@@ -0,0 +1,187 @@
+"""
+Content-addressed media storage.
+
+Uploads are stored under their SHA-256 digest, keeping the upload_to
+folder and the extension: ``properties/4f/4f0c...e1.jpg``. Saving bytes
+that are already stored returns the existing name instead of writing a
+second copy, so any number of rows can point at one file. Which files
+are still in use is tracked by admin_panel.file_refs; before an existing
+file is handed out again the file_reused signal lets it claim the name,
+so a release of the same bytes committing meanwhile cannot delete it.
+
+ContentAddressedUploadHandler applies the same naming while a request is
+being parsed: each uploaded file is hashed as its chunks arrive and
+written straight into the storage folder, then renamed to its final name,
+so large uploads are neither buffered in memory nor copied a second time.
+"""
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.dispatch import Signal
+
+CHUNK_SIZE = 64 * 1024
+
+# Sent with ``name`` and ``storage`` before a stored file is reused for new bytes
+file_reused = Signal()
+
+
+def sha256_of(content):
+    """Return the hex SHA-256 of a file object, leaving it rewound"""
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in iter(lambda: content.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def content_name(name, digest):
+    """Return the content-addressed name for a file uploaded as ``name``"""
+    folder = posixpath.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return posixpath.join(folder, digest[:2], f'{digest}{extension}')
+
+
+def is_content_name(name):
+    stem = os.path.splitext(posixpath.basename(name))[0]
+    folder = posixpath.basename(posixpath.dirname(name))
+    return len(stem) == 64 and folder == stem[:2]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def reuse(self, name):
+        """Claim a stored file for new bytes; False if it is not there and has to be written"""
+        if not self.exists(name):
+            return False
+        file_reused.send(sender=self.__class__, name=name, storage=self)
+        # Touching the file checks that a release which got in before the claim has
+        # not deleted it meanwhile, and makes it recent for collect_orphaned_media
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _save(self, name, content):
+        target = content_name(name, sha256_of(content))
+        if self.reuse(target):
+            return target
+        saved = super()._save(target, content)
+        if saved != target:
+            # Another process stored the same bytes first
+            self.delete(saved)
+        return target
+
+    def save_exact(self, name, content):
+        """Store content under ``name`` itself, e.g. for files derived from a stored one"""
+        return super()._save(name, content)
+
+    def adopt(self, path, name, digest):
+        """
+        Move a finished file at ``path``, on the same filesystem, into storage
+        as the content-addressed name for ``name``; return that name.
+        """
+        name = content_name(self.generate_filename(name), digest)
+        target = self.path(name)
+        if self.reuse(name):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+            if self.file_permissions_mode is not None:
+                os.chmod(target, self.file_permissions_mode)
+        return name
+
+
+class StoredUpload(UploadedFile):
+    """
+    Upload already saved by ContentAddressedUploadHandler; ``stored_name``
+    is its storage name. The stored file is only opened if it is read.
+    """
+    def __init__(self, stored_name, path, *args, **kwargs):
+        self._file = None
+        self.path = path
+        super().__init__(None, *args, **kwargs)
+        self.stored_name = stored_name
+
+    @property
+    def file(self):
+        if self._file is None:
+            self._file = open(self.path, 'rb')
+        return self._file
+
+    @file.setter
+    def file(self, value):
+        self._file = value
+
+    @property
+    def closed(self):
+        return self._file is None or self._file.closed
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class ContentAddressedUploadHandler(FileUploadHandler):
+    """
+    Stream files of the given form field into ``folder`` of a
+    ContentAddressedStorage; other fields and non-image files are left to
+    the next handler.
+    """
+    def __init__(self, request=None, storage=None, folder='', field_name=None, content_types=('image/',)):
+        super().__init__(request)
+        self.storage = storage
+        self.folder = folder
+        self.accept_field = field_name
+        self.content_types = content_types
+        self.handle = None
+
+    def new_file(self, field_name, file_name, content_type, *args, **kwargs):
+        super().new_file(field_name, file_name, content_type, *args, **kwargs)
+        self.activated = (
+            (self.accept_field is None or field_name == self.accept_field)
+            and (content_type or '').startswith(self.content_types)
+        )
+        if not self.activated:
+            return
+        directory = self.storage.path(self.folder)
+        os.makedirs(directory, exist_ok=True)
+        self.temp_path = os.path.join(directory, f'.{uuid.uuid4().hex}.part')
+        # Created like FileSystemStorage creates files, so the final permissions match
+        fd = os.open(self.temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        self.handle = os.fdopen(fd, 'wb')
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.activated:
+            return raw_data
+        self.handle.write(raw_data)
+        self.digest.update(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.activated:
+            return None
+        self.handle.close()
+        self.handle = None
+
+        name = self.storage.adopt(self.temp_path, posixpath.join(self.folder, self.file_name), self.digest.hexdigest())
+        path = self.storage.path(name)
+        return StoredUpload(
+            name, path, name=self.file_name, content_type=self.content_type,
+            size=file_size, charset=self.charset, content_type_extra=self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+            os.remove(self.temp_path)